@@ -8,6 +8,7 @@ from .core import config, agent, action
 from .core.action import Action
 from .core.agent import Agent, Scripted
 from .core.env import Env
+from .core.vec_env import VecEnv
 from .core.terrain import MapGenerator, Terrain
 
 MOTD = rf'''      ___           ___           ___           ___
@@ -22,7 +23,7 @@ MOTD = rf'''      ___           ___           ___           ___
     \  \:\        \  \:\        \  \:\        \  \::/     maintained at MIT in
      \__\/         \__\/         \__\/         \__\/      Phillip Isola's lab '''
 
-__all__ = ['Env', 'config', 'agent', 'Agent', 'Scripted', 'MapGenerator', 'Terrain',
+__all__ = ['Env', 'VecEnv', 'config', 'agent', 'Agent', 'Scripted', 'MapGenerator', 'Terrain',
         'action', 'Action', 'material', 'spawn',
         'Overlay', 'OverlayRegistry']
 
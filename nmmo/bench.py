@@ -0,0 +1,238 @@
+# pylint: disable=bad-builtin
+import argparse
+import itertools
+import json
+import multiprocessing as mp
+import platform
+import sys
+from time import perf_counter
+from typing import Dict, List
+
+import numpy as np
+import psutil
+
+import nmmo
+from nmmo.core import config as cfg
+from nmmo.systems.skill import Melee
+from nmmo.task import base_predicates as bp
+from nmmo.task.task_api import make_same_task
+
+"""
+Benchmark runner, which sweeps the map size, population, enabled game systems,
+PROVIDE_ACTION_TARGETS and the number of tasks per agent:
+
+  python -m nmmo.bench --maps small medium --players 1 64 --output bench.json
+
+Each case runs in a fresh process, so that its peak RSS is its own, and reports
+the steps/sec, the mean reset time and the per-phase breakdown of
+Env.perf_stats() as JSON. Agents take uniformly random flat actions.
+
+A previous output can be passed as --baseline. Cases with the same name are
+compared, and the exit code is 1 if any case regressed by more than --tolerance.
+"""
+
+MAPS = {
+  'small': cfg.Small,
+  'medium': cfg.Medium,
+  'large': cfg.Large,
+}
+
+SYSTEMS = {
+  'base': (),
+  'minimal': (cfg.Terrain, cfg.Resource, cfg.Combat),
+  'npc': (cfg.Terrain, cfg.Resource, cfg.Combat, cfg.NPC),
+  'all': (cfg.AllGameSystems,),
+}
+
+# Agent i gets the first i tasks, cycling if there are more tasks than predicates
+TASKS = [
+  (bp.StayAlive, {}),
+  (bp.CountEvent, {'event': 'EAT_FOOD', 'N': 10}),
+  (bp.FullyArmed, {'combat_style': Melee, 'level': 3, 'num_agent': 1}),
+]
+
+# metric -> True if higher is better
+METRICS = {
+  'steps_per_sec': True,
+  'reset_ms': False,
+  'peak_rss_mb': False,
+}
+
+def case_name(case: Dict) -> str:
+  return (f"{case['map']}_{case['systems']}_p{case['players']}"
+          f"_at{int(case['action_targets'])}_t{case['tasks']}")
+
+def make_config(case: Dict, maps_dir: str):
+  systems = (MAPS[case['map']], *SYSTEMS[case['systems']])
+  config = type(case_name(case), systems, {})()
+  config.PATH_MAPS = f"{maps_dir}/{case['map']}"
+  config.MAP_FORCE_GENERATION = False
+  config.MAP_N = 1
+  config.PLAYER_N = case['players']
+  config.PROVIDE_ACTION_TARGETS = case['action_targets']
+  config.ALLOW_MULTI_TASKS_PER_AGENT = case['tasks'] > 1
+  config.IMMORTAL = True # keep the population constant
+  config.HORIZON = case['steps'] + 1
+  config.PERF_STATS_WINDOW = case['steps']
+  return config
+
+def make_tasks(agents: List[int], num_tasks: int):
+  tasks = []
+  for pred_cls, pred_kwargs in itertools.islice(itertools.cycle(TASKS), num_tasks):
+    tasks += make_same_task(pred_cls, agents, pred_kwargs=pred_kwargs)
+  return tasks
+
+def run_case(case: Dict, maps_dir: str = 'maps/bench') -> Dict:
+  '''Runs a single case in the current process
+
+  Returns:
+    A dict of the case, its name, the metrics and the per-phase breakdown
+  '''
+  config = make_config(case, maps_dir)
+  env = nmmo.Env(config, seed=case['seed'])
+  def make_task_fn():
+    return make_tasks(env.possible_agents, case['tasks'])
+  env.reset(seed=case['seed'], make_task_fn=make_task_fn) # generates the map, if needed
+
+  start = perf_counter()
+  for i in range(case['resets']):
+    env.reset(seed=case['seed'] + i, make_task_fn=make_task_fn)
+  reset_ms = (perf_counter() - start) / case['resets'] * 1000
+
+  # sample the actions ahead, so that sampling is not timed
+  space = env.flat_action_space
+  rng = np.random.default_rng(case['seed'])
+  actions = rng.integers(0, space.nvec, size=(case['steps'], config.PLAYER_N, len(space.nvec)))
+
+  start = perf_counter()
+  for step_actions in actions:
+    env.step(step_actions)
+  elapsed = perf_counter() - start
+
+  return {
+    'name': case_name(case),
+    **case,
+    'steps_per_sec': case['steps'] / elapsed,
+    'reset_ms': reset_ms,
+    'peak_rss_mb': peak_rss_mb(),
+    'phases': env.perf_stats(),
+  }
+
+def peak_rss_mb() -> float:
+  try:
+    import resource # pylint: disable=import-outside-toplevel
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on linux, bytes on macos
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10
+  except ImportError:
+    # no peak on windows, so fall back to the current rss
+    return psutil.Process().memory_info().rss / 2**20
+
+def run_isolated(case: Dict, maps_dir: str) -> Dict:
+  '''Runs a case in a fresh process, for an independent peak RSS'''
+  with mp.get_context('spawn').Pool(1) as pool:
+    return pool.apply(run_case, (case, maps_dir))
+
+def compare(results: Dict, baseline: Dict, tolerance: float) -> List[Dict]:
+  '''Compares the metrics of the cases found in both results and baseline
+
+  Returns:
+    A list of {'name', 'metric', 'baseline', 'value', 'change', 'regressed'},
+    where change is the relative change, positive when the value got worse
+  '''
+  baseline_cases = {case['name']: case for case in baseline['cases']}
+  diffs = []
+  for case in results['cases']:
+    base_case = baseline_cases.get(case['name'])
+    if base_case is None:
+      continue
+    for metric, higher_is_better in METRICS.items():
+      if metric not in base_case or not base_case[metric]:
+        continue
+      change = (case[metric] - base_case[metric]) / base_case[metric]
+      if higher_is_better:
+        change = -change
+      diffs.append({
+        'name': case['name'],
+        'metric': metric,
+        'baseline': base_case[metric],
+        'value': case[metric],
+        'change': change,
+        'regressed': change > tolerance,
+      })
+  return diffs
+
+def parse_args(argv=None):
+  def bool_arg(val):
+    return val.lower() in ('1', 'true', 'on', 'yes')
+
+  parser = argparse.ArgumentParser(prog='python -m nmmo.bench',
+                                   description='Neural MMO performance benchmarks')
+  parser.add_argument('--maps', nargs='+', choices=list(MAPS), default=['small', 'medium'])
+  parser.add_argument('--players', nargs='+', type=int, default=[1, 64])
+  parser.add_argument('--systems', nargs='+', choices=list(SYSTEMS), default=['base', 'all'])
+  parser.add_argument('--action-targets', nargs='+', type=bool_arg, default=[True, False],
+                      help='values of PROVIDE_ACTION_TARGETS, e.g. 1 0')
+  parser.add_argument('--tasks', nargs='+', type=int, default=[0, 1],
+                      help='numbers of tasks per agent')
+  parser.add_argument('--steps', type=int, default=128, help='timed steps per case')
+  parser.add_argument('--resets', type=int, default=3, help='timed resets per case')
+  parser.add_argument('--seed', type=int, default=0)
+  parser.add_argument('--maps-dir', default='maps/bench',
+                      help='where the benchmark maps are generated and reused')
+  parser.add_argument('--output', help='write the results to this json file, instead of stdout')
+  parser.add_argument('--baseline', help='json results of a previous run to compare against')
+  parser.add_argument('--tolerance', type=float, default=0.1,
+                      help='relative change that counts as a regression')
+  parser.add_argument('--in-process', action='store_true',
+                      help='run all cases in this process. Faster, but peak RSS is cumulative')
+  return parser.parse_args(argv)
+
+def main(argv=None) -> int:
+  args = parse_args(argv)
+  run = run_case if args.in_process else run_isolated
+
+  results = {
+    'nmmo_version': nmmo.__version__,
+    'python': platform.python_version(),
+    'platform': platform.platform(),
+    'cases': [],
+  }
+  for map_size, players, systems, action_targets, tasks in itertools.product(
+      args.maps, args.players, args.systems, args.action_targets, args.tasks):
+    case = {
+      'map': map_size,
+      'players': players,
+      'systems': systems,
+      'action_targets': action_targets,
+      'tasks': tasks,
+      'steps': args.steps,
+      'resets': args.resets,
+      'seed': args.seed,
+    }
+    result = run(case, args.maps_dir)
+    results['cases'].append(result)
+    print(f"{result['name']}: {result['steps_per_sec']:.1f} steps/sec, "
+          f"reset {result['reset_ms']:.1f} ms, peak rss {result['peak_rss_mb']:.0f} MB",
+          file=sys.stderr)
+
+  if args.output:
+    with open(args.output, 'w', encoding='utf-8') as f:
+      json.dump(results, f, indent=2)
+  else:
+    print(json.dumps(results, indent=2))
+
+  if args.baseline is None:
+    return 0
+
+  with open(args.baseline, 'r', encoding='utf-8') as f:
+    baseline = json.load(f)
+  diffs = compare(results, baseline, args.tolerance)
+  for diff in diffs:
+    flag = 'REGRESSED' if diff['regressed'] else 'ok'
+    print(f"{diff['name']} {diff['metric']}: {diff['baseline']:.2f} -> {diff['value']:.2f} "
+          f"({diff['value'] / diff['baseline'] - 1:+.1%}) {flag}", file=sys.stderr)
+  return 1 if any(diff['regressed'] for diff in diffs) else 0
+
+if __name__ == '__main__':
+  sys.exit(main())
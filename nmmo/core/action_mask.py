@@ -0,0 +1,314 @@
+"""
+Batched action targets for all agents at once.
+
+The masks are computed from the stacked [num_agents, ...] observation arrays
+of BATCHED_OBS mode in a single pass, and are bit-identical to the ones
+from Observation._make_action_targets(). A row is treated as a dummy obs,
+as in Observation, when the agent is not found among its visible entities.
+"""
+
+import numpy as np
+
+import nmmo.systems.item as item_system
+from nmmo.core import action
+from nmmo.entity.entity import EntityState
+from nmmo.lib import material
+from nmmo.systems.item import ItemState
+
+EntityAttr = EntityState.State.attr_name_to_col
+ItemAttr = ItemState.State.attr_name_to_col
+
+AMMO_TYPE_IDS = [ammo.ITEM_TYPE_ID for ammo in
+                 [item_system.Whetstone, item_system.Arrow, item_system.Runes]]
+
+# see Observation._item_skill()
+GENERAL_ITEM_TYPES = [item_system.Hat, item_system.Top, item_system.Bottom,
+                      item_system.Ration, item_system.Potion]
+SKILL_ITEM_TYPES = {
+  "melee_level": [item_system.Spear, item_system.Whetstone],
+  "range_level": [item_system.Bow, item_system.Arrow],
+  "mage_level": [item_system.Wand, item_system.Runes],
+  "fishing_level": [item_system.Rod],
+  "herbalism_level": [item_system.Gloves],
+  "prospecting_level": [item_system.Pickaxe],
+  "carving_level": [item_system.Axe],
+  "alchemy_level": [item_system.Chisel],
+}
+NO_SKILL = np.iinfo(np.int32).min
+
+
+class AgentBatch:
+  '''Per-agent quantities shared by the masks'''
+  def __init__(self, config, tick, obs, entity_dist=None):
+    self.config = config
+    self.agent_id = np.asarray(obs["AgentId"]).astype(np.int32)
+    self.tiles = obs["Tile"]
+    self.entities = obs["Entity"].astype(np.int32)
+    self.ent_ids = self.entities[:,:,EntityAttr["id"]]
+    self.ent_valid = self.ent_ids != 0
+    self.ent_len = self.ent_valid.sum(axis=1)
+
+    # locate each agent in its own entity obs
+    is_me = (self.ent_ids == self.agent_id[:,None]) & (self.agent_id[:,None] != 0)
+    self.dummy = ~is_me.any(axis=1)
+    self.agent = self.entities[np.arange(len(self.agent_id)), is_me.argmax(axis=1)]
+    self.agent[self.dummy] = 0
+
+    # l-inf distance of the entities to the agent, unless precomputed by Visibility
+    self.ent_dist = entity_dist
+    if self.ent_dist is None:
+      self.ent_dist = np.maximum(
+        np.abs(self.entities[:,:,EntityAttr["row"]] - self.attr("row")[:,None]),
+        np.abs(self.entities[:,:,EntityAttr["col"]] - self.attr("col")[:,None]))
+
+    self.in_combat = np.zeros(len(self.agent_id), dtype=bool)
+    if config.COMBAT_SYSTEM_ENABLED:
+      latest_combat_tick = self.agent[:,EntityAttr["latest_combat_tick"]]
+      self.in_combat = ~self.dummy & (latest_combat_tick != 0) & \
+        ((tick - latest_combat_tick) < config.COMBAT_STATUS_DURATION)
+
+    self.inventory = None
+    self.inv_len = np.zeros(len(self.agent_id), dtype=np.int64)
+    if config.ITEM_SYSTEM_ENABLED:
+      self.inventory = obs["Inventory"].astype(np.int32)
+      self.inv_valid = self.inventory[:,:,ItemAttr["id"]] != 0
+      self.inv_len = self.inv_valid.sum(axis=1)
+
+    if config.EXCHANGE_SYSTEM_ENABLED:
+      # the market can be shared by all agents, i.e., [rows, cols]
+      self.market = obs["Market"].astype(np.int32)
+      if self.market.ndim == 2:
+        self.market = self.market[None]
+      self.mkt_valid = self.market[:,:,ItemAttr["id"]] != 0
+      self.mkt_len = self.mkt_valid.sum(axis=1)
+
+  def attr(self, name):
+    return self.agent[:,EntityAttr[name]]
+
+  def same_tile_players(self):
+    same_tile = self.ent_dist == 0
+    player = self.entities[:,:,EntityAttr["npc_type"]] == 0
+    not_me = self.ent_ids != self.agent_id[:,None]
+    return same_tile & player & not_me & self.ent_valid
+
+
+def make_action_targets(config, tick, obs, entity_dist=None):
+  '''Compute the action targets of all agents
+
+  Args:
+    config: env config
+    tick: current tick
+    obs: dict of stacked [num_agents, ...] observation arrays.
+      The Market can also be a single [rows, cols] array shared by all agents
+    entity_dist: optional [num_agents, PLAYER_N_OBS] l-inf distances of the
+      entities in obs to each agent, e.g. from Visibility.distance_matrix()
+
+  Returns:
+    nested dict of [num_agents, ...] int8 masks, as in ActionTargets,
+    for the actions in config.ACTION_TARGETS_HEADS
+  '''
+  batch = AgentBatch(config, tick, obs, entity_dist)
+  def ones(length):
+    return np.ones((len(batch.agent_id), length), dtype=np.int8)
+
+  heads = {}
+  heads["Move"] = lambda: {
+    "Direction": _move_mask(batch)
+  }
+
+  if config.COMBAT_SYSTEM_ENABLED:
+    heads["Attack"] = lambda: {
+      "Style": ones(3),
+      "Target": _attack_mask(batch)
+    }
+
+  if config.ITEM_SYSTEM_ENABLED:
+    heads["Use"] = lambda: {
+      "InventoryItem": _use_mask(batch)
+    }
+    heads["Give"] = lambda: {
+      "InventoryItem": _sell_mask(batch),
+      "Target": _give_target_mask(batch)
+    }
+    heads["Destroy"] = lambda: {
+      "InventoryItem": _destroy_mask(batch)
+    }
+
+  if config.EXCHANGE_SYSTEM_ENABLED:
+    heads["Sell"] = lambda: {
+      "InventoryItem": _sell_mask(batch),
+      "Price": ones(config.PRICE_N_OBS)
+    }
+    heads["Buy"] = lambda: {
+      "MarketItem": _buy_mask(batch)
+    }
+    heads["GiveGold"] = lambda: {
+      "Price": _give_gold_mask(batch),
+      "Target": _give_gold_target_mask(batch)
+    }
+
+  if config.COMMUNICATION_SYSTEM_ENABLED:
+    heads["Comm"] = lambda: {
+      "Token": ones(config.COMMUNICATION_NUM_TOKENS)
+    }
+
+  # only compute the masks of the requested actions
+  return {atn: make_masks() for atn, make_masks in heads.items()
+          if config.ACTION_TARGETS_HEADS is None or atn in config.ACTION_TARGETS_HEADS}
+
+
+def _empty_mask(batch, length):
+  mask = np.zeros((len(batch.agent_id), length + int(batch.config.PROVIDE_NOOP_ACTION_TARGET)),
+                  dtype=np.int8)
+  if batch.config.PROVIDE_NOOP_ACTION_TARGET:
+    mask[:,-1] = 1
+  return mask
+
+def _set_targets(mask, active, targets):
+  # targets cover the leading columns of the mask, and are all False outside the obs
+  mask[active,:targets.shape[1]] = targets[active]
+
+def _move_mask(batch):
+  config = batch.config
+  center = config.PLAYER_VISION_RADIUS
+  tile_dim = config.PLAYER_VISION_DIAMETER
+  mat_map = batch.tiles[:,:,2].reshape(-1, tile_dim, tile_dim)
+  row, col = batch.attr("row"), batch.attr("col")
+
+  mask = np.zeros((len(batch.agent_id), len(action.Direction.edges)), dtype=np.int8)
+  for idx, direction in enumerate(action.Direction.edges): # pylint: disable=not-an-iterable
+    r_delta, c_delta = direction.delta
+    in_map = (0 <= row + r_delta) & (row + r_delta < config.MAP_SIZE) & \
+             (0 <= col + c_delta) & (col + c_delta < config.MAP_SIZE)
+    mat = np.where(in_map, mat_map[:,center+r_delta,center+c_delta], material.Void.index)
+    mask[:,idx] = np.isin(mat, list(material.Habitable.indices))
+
+  mask[batch.dummy] = 0
+  mask[batch.dummy,-1] = 1 # for no-op
+  return mask
+
+def _attack_mask(batch):
+  config = batch.config
+  assert config.COMBAT_MELEE_REACH == config.COMBAT_RANGE_REACH
+  assert config.COMBAT_MELEE_REACH == config.COMBAT_MAGE_REACH
+
+  mask = _empty_mask(batch, config.PLAYER_N_OBS)
+  within_range = batch.ent_dist <= config.COMBAT_MELEE_REACH
+
+  # NOTE: CANNOT attack players during immunity
+  immune = batch.attr("time_alive") < config.COMBAT_SPAWN_IMMUNITY
+  no_spawn_immunity = ~(immune[:,None] & (batch.ent_ids > 0))
+  not_me = batch.ent_ids != batch.attr("id")[:,None]
+
+  targets = within_range & not_me & no_spawn_immunity & batch.ent_valid
+  active = ~batch.dummy
+  _set_targets(mask, active, targets)
+
+  # mask the no-op option if there is at least one target. As in Observation,
+  # this clears the last column even when there is no no-op option
+  mask[active & targets.any(axis=1),-1] = 0
+  return mask
+
+def _item_skill_levels(batch):
+  # [num_agents, max type id + 1] lookup of the level limit for each item type
+  type_ids = [item.ITEM_TYPE_ID for item in GENERAL_ITEM_TYPES] + \
+    [item.ITEM_TYPE_ID for items in SKILL_ITEM_TYPES.values() for item in items]
+  skill_lut = np.full((len(batch.agent_id), max(type_ids) + 1), NO_SKILL, dtype=np.int32)
+
+  level = np.maximum(1, np.max([batch.attr(skill) for skill in SKILL_ITEM_TYPES], axis=0))
+  for item in GENERAL_ITEM_TYPES:
+    skill_lut[:,item.ITEM_TYPE_ID] = level
+  for skill, items in SKILL_ITEM_TYPES.items():
+    for item in items:
+      skill_lut[:,item.ITEM_TYPE_ID] = batch.attr(skill)
+  return skill_lut
+
+def _inventory_active(batch):
+  return ~batch.dummy & ~batch.in_combat & (batch.inv_len > 0)
+
+def _use_mask(batch):
+  mask = _empty_mask(batch, batch.config.INVENTORY_N_OBS)
+  skill_lut = _item_skill_levels(batch)
+  item_type = batch.inventory[:,:,ItemAttr["type_id"]]
+  known_type = (item_type >= 0) & (item_type < skill_lut.shape[1])
+  level_limit = np.take_along_axis(skill_lut, np.where(known_type, item_type, 0), axis=1)
+
+  not_listed = batch.inventory[:,:,ItemAttr["listed_price"]] == 0
+  level_satisfied = known_type & (batch.inventory[:,:,ItemAttr["level"]] <= level_limit)
+
+  targets = not_listed & level_satisfied & batch.inv_valid
+  _set_targets(mask, _inventory_active(batch), targets)
+  return mask
+
+def _destroy_mask(batch):
+  mask = _empty_mask(batch, batch.config.INVENTORY_N_OBS)
+  not_equipped = batch.inventory[:,:,ItemAttr["equipped"]] == 0
+  _set_targets(mask, _inventory_active(batch), not_equipped & batch.inv_valid)
+  return mask
+
+def _sell_mask(batch):
+  mask = _empty_mask(batch, batch.config.INVENTORY_N_OBS)
+  if not batch.config.EXCHANGE_SYSTEM_ENABLED:
+    return mask
+
+  not_equipped = batch.inventory[:,:,ItemAttr["equipped"]] == 0
+  not_listed = batch.inventory[:,:,ItemAttr["listed_price"]] == 0
+  targets = not_equipped & not_listed & batch.inv_valid
+  _set_targets(mask, _inventory_active(batch), targets)
+  return mask
+
+def _give_target_mask(batch):
+  mask = _empty_mask(batch, batch.config.PLAYER_N_OBS)
+  active = ~batch.dummy & ~batch.in_combat & (batch.inv_len > 0)
+  _set_targets(mask, active, batch.same_tile_players())
+  return mask
+
+def _give_gold_target_mask(batch):
+  mask = _empty_mask(batch, batch.config.PLAYER_N_OBS)
+  active = ~batch.dummy & ~batch.in_combat & (batch.attr("gold") != 0)
+  _set_targets(mask, active, batch.same_tile_players())
+  return mask
+
+def _give_gold_mask(batch):
+  # NOTE that action.Price starts from Discrete_1, and the first option is always allowed
+  price_idx = np.arange(batch.config.PRICE_N_OBS)
+  active = ~batch.dummy & ~batch.in_combat
+  gold = np.where(active, batch.attr("gold"), 0)
+  mask = (price_idx[None,:] < gold[:,None]).astype(np.int8)
+  mask[:,0] = 1
+  return mask
+
+def _buy_mask(batch):
+  config = batch.config
+  mask = _empty_mask(batch, config.MARKET_N_OBS)
+  active = ~batch.dummy & ~batch.in_combat & (batch.mkt_len > 0)
+
+  not_mine = batch.market[:,:,ItemAttr["owner_id"]] != batch.agent_id[:,None]
+
+  # if the inventory is full, one can only buy existing ammo stack
+  full = batch.inv_len >= config.ITEM_INVENTORY_CAPACITY
+  if np.any(active & full):
+    ammo_listings = _existing_ammo_listings(batch, full)
+    active &= ~full | ammo_listings.any(axis=1)
+    not_mine &= ~full[:,None] | ammo_listings
+
+  enough_gold = batch.market[:,:,ItemAttr["listed_price"]] <= batch.attr("gold")[:,None]
+  _set_targets(mask, active, not_mine & enough_gold & batch.mkt_valid)
+  return mask
+
+def _existing_ammo_listings(batch, full):
+  '''Market listings of the ammo stacks in the inventory, for the agents
+     with a full inventory. Other rows are all False'''
+  num_agents = len(batch.agent_id)
+  listings = np.zeros((num_agents, batch.market.shape[1]), dtype=bool)
+  inventory = batch.inventory[full]
+  market = np.broadcast_to(batch.market, (num_agents,) + batch.market.shape[1:])[full]
+  inv_type = inventory[:,:,ItemAttr["type_id"]]
+  is_ammo = np.isin(inv_type, AMMO_TYPE_IDS) & batch.inv_valid[full]
+
+  # [agent, market, inventory]
+  same_sig = (market[:,:,None,ItemAttr["type_id"]] == inv_type[:,None,:]) & \
+             (market[:,:,None,ItemAttr["level"]] == inventory[:,None,:,ItemAttr["level"]])
+  not_mine = market[:,:,ItemAttr["owner_id"]] != batch.agent_id[full][:,None]
+  listings[full] = np.any(same_sig & is_ammo[:,None,:], axis=2) & not_mine
+  return listings
@@ -150,6 +150,35 @@ class Config(Template):
   PROVIDE_NOOP_ACTION_TARGET   = True
   '''Provide a no-op option for each action'''
 
+  ACTION_TARGETS_HEADS         = None
+  '''Names of the actions to provide targets for, e.g. ['Move', 'Attack'].
+  None provides the targets for all enabled actions'''
+
+  REUSE_OBS_BUFFERS            = False
+  '''Write the gym observations into preallocated arrays owned by the Env
+
+  The arrays are overwritten in place by every reset() and step(),
+  so copy them if they should outlive the next call'''
+
+  BATCHED_OBS                  = False
+  '''Return a single dict of [PLAYER_N, ...] arrays from reset() and step()
+  instead of per-agent dicts, along with [PLAYER_N] rewards and dones.
+  Agent agent_id is in row agent_id - 1. The AgentId entry is 0 for the rows
+  of agents absent from the current tick, which are otherwise zeroed out.
+  Implies REUSE_OBS_BUFFERS'''
+
+  FAST_RESET                   = False
+  '''Reuse the world across resets: the map files are cached in memory,
+  only the tiles that changed are reset, and the serialized attributes of the
+  previous entities are recycled. The episodes are identical to a cold reset,
+  but the entities of the previous episode must not be used after reset()'''
+
+  SHARED_MEMORY_NAME           = None
+  '''Keep the datastore tables in shared memory segments named after this,
+  which must be unique on the host, so that other processes can read the live
+  world with nmmo.datastore.shared_memory.SharedMemoryReader. The segments are
+  removed by env.close(). None keeps the tables in the process memory'''
+
   PLAYERS                      = [Agent]
   '''Player classes from which to spawn'''
 
@@ -182,6 +211,10 @@ class Config(Template):
   LOG_FILE                     = None
   '''Where to write logs (defaults to console)'''
 
+  PERF_STATS_WINDOW            = 1024
+  '''Number of recent ticks over which env.perf_stats() reports the wall time
+  of each phase of step(). 0 disables the timing'''
+
 
   ############################################################################
   ### Player Parameters
@@ -1,23 +1,26 @@
 import functools
-from typing import Any, Dict, List, Callable
+from time import perf_counter
+from typing import Any, Dict, List, Callable, Union
 from collections import defaultdict
 from copy import copy, deepcopy
-import dill
 
 import gym
 import numpy as np
 from pettingzoo.utils.env import AgentID, ParallelEnv
 
 import nmmo
-from nmmo.core import realm
+from nmmo.core import action, action_mask, realm
 from nmmo.core.config import Default
-from nmmo.core.observation import Observation
+from nmmo.core.observation import Observation, fill_rows
 from nmmo.core.tile import Tile
+from nmmo.core.visibility import Visibility
 from nmmo.entity.entity import Entity
 from nmmo.systems.item import Item
 from nmmo.task import task_api, task_spec
 from nmmo.task.game_state import GameStateGenerator
-from nmmo.lib import seeding
+from nmmo.task.predicate_api import PredicateGraph
+from nmmo.lib import seeding, utils
+from nmmo.lib.snapshot import ObjectSnapshot
 
 class Env(ParallelEnv):
   # Environment wrapper for Neural MMO using the Parallel PettingZoo API
@@ -35,7 +38,10 @@ class Env(ParallelEnv):
     self.config = config
     self.realm = realm.Realm(config, self._np_random)
     self.obs = None
+    self._visibility = None # the entities seen by each agent, shared by obs and tasks
     self._dummy_obs = None
+    self._obs_buffers = None
+    self._agent_obs_buffers = None
 
     self.possible_agents = list(range(1, config.PLAYER_N + 1))
     self._agents = None
@@ -48,15 +54,14 @@ class Env(ParallelEnv):
     # Default task: rewards 1 each turn agent is alive
     self.tasks = task_api.nmmo_default_task(self.possible_agents)
     self.agent_task_map = None
+    self._predicate_graph = None
     self._dummy_task_embedding = np.zeros(self.config.TASK_EMBED_DIM, dtype=np.float16)
 
     # curriculum file path, if provided, should exist
     self.curriculum_file_path = config.CURRICULUM_FILE_PATH
     if self.curriculum_file_path is not None:
-      # try to open the file to check if it exists
-      with open(self.curriculum_file_path, 'rb') as f:
-        curriculum = dill.load(f) # pylint: disable=unused-variable
-      f.close()
+      # load the file to check it, which also caches the curriculum for reset()
+      task_spec.load_curriculum(self.curriculum_file_path)
 
   @functools.cached_property
   def _obs_space(self):
@@ -86,7 +91,11 @@ class Env(ParallelEnv):
 
     if self.config.PROVIDE_ACTION_TARGETS:
       mask_spec = deepcopy(self._atn_space)
-      for atn_str in mask_spec:
+      for atn_str in list(mask_spec):
+        if self.config.ACTION_TARGETS_HEADS is not None and \
+           atn_str not in self.config.ACTION_TARGETS_HEADS:
+          del mask_spec.spaces[atn_str]
+          continue
         for arg_str in mask_spec[atn_str]:
           mask_spec[atn_str][arg_str] = mask_box(self._atn_space[atn_str][arg_str].n)
       obs_space["ActionTargets"] = mask_spec
@@ -144,6 +153,20 @@ class Env(ParallelEnv):
         observation space (such as targeting)'''
     return self._atn_space
 
+  @functools.cached_property
+  def flat_action_heads(self):
+    '''(action, argument) names of the columns of the flat actions,
+       following the order of action_space()'''
+    return [(atn_str, arg_str) for atn_str, args in self._atn_space.items()
+            for arg_str in args]
+
+  @functools.cached_property
+  def flat_action_space(self):
+    '''Action space of a single agent's row of the flat actions.
+       See flat_action_heads for the columns and step() for the layout'''
+    return gym.spaces.MultiDiscrete(
+      [self._atn_space[atn_str][arg_str].n for atn_str, arg_str in self.flat_action_heads])
+
   ############################################################################
   # Core API
 
@@ -162,6 +185,7 @@ class Env(ParallelEnv):
 
     Returns:
         observations, as documented by _compute_observations()
+        With config.BATCHED_OBS, a single dict of [PLAYER_N, ...] arrays
 
     Notes:
         Neural MMO simulates a persistent world. Ideally, you should reset
@@ -192,8 +216,12 @@ class Env(ParallelEnv):
       for task in self.tasks:
         task.reset()
     self.agent_task_map = self._map_task_to_agent()
+    self._predicate_graph = PredicateGraph([task.eval_fn for task in self.tasks],
+                                           self.realm.datastore)
 
     self._dummy_obs = self._make_dummy_obs()
+    if self.config.REUSE_OBS_BUFFERS or self.config.BATCHED_OBS:
+      self._make_obs_buffers()
     self.obs = self._compute_observations()
     self._gamestate_generator = GameStateGenerator(self.realm, self.config)
     if self.game_state is not None:
@@ -202,16 +230,76 @@ class Env(ParallelEnv):
 
     self._reset_required = False
 
-    return {a: o.to_gym() for a,o in self.obs.items()}
+    return self._to_gym_obs()
 
-  def _sample_training_tasks(self):
-    with open(self.curriculum_file_path, 'rb') as f:
-      # curriculum file may have been changed, so read the file when sampling
-      curriculum = dill.load(f) # a list of TaskSpec
+  def save_state(self):
+    '''Snapshot the current state, to fork rollouts with load_state()
+
+    Returns:
+        A dict holding copies of the datastore tables and id allocators,
+        the RNG state, the tile depletion, the event log, and a detached copy
+        of the entity, item, exchange and task objects.
 
-    sampling_weights = [spec.sampling_weight for spec in curriculum]
-    sampled_spec = self._np_random.choice(curriculum, size=len(self.possible_agents),
-                                          p=sampling_weights/np.sum(sampling_weights))
+        The state can only be loaded into this env, but it can be loaded any
+        number of times. Loading it and stepping with the same actions
+        reproduces the same trajectory
+    '''
+    assert not self._reset_required, 'save_state() called before reset'
+    state = self.realm.save_state()
+    state['objects'] = ObjectSnapshot({
+      'realm': (self.realm.players, self.realm.npcs, self.realm.items, self.realm.exchange),
+      'agents': self._agents,
+      'dead_agents': self._dead_agents,
+      'dead_this_tick': self._dead_this_tick,
+      'scripted_agents': self.scripted_agents,
+      'tasks': self.tasks,
+      'agent_task_map': self.agent_task_map,
+      # observations are not modified, so the scripted agents can share them
+    }, self._shared_state_objects(), ref_types=(Observation,))
+    state['gamestate_generator'] = self._gamestate_generator
+    state['rng'] = self._np_random.get_state()
+    return state
+
+  def load_state(self, state):
+    '''Restore the state from save_state(), and recompute the observations'''
+    # the rng object is replaced by reset(seed=...), so only its state is restored
+    self._np_random.set_state(state['rng'])
+    self._gamestate_generator = state['gamestate_generator']
+    # the event table may not extend the indexed one, e.g. when loading a later state
+    self._gamestate_generator.reset_event_index()
+    # restoring the objects also restores the positions of the current entities
+    self.realm.map.clear_entities()
+    objects = state['objects'].restore(self._shared_state_objects())
+
+    self.realm.load_state(state, *objects['realm'])
+    self._agents = objects['agents']
+    self._dead_agents = objects['dead_agents']
+    self._dead_this_tick = objects['dead_this_tick']
+    self.scripted_agents = objects['scripted_agents']
+    self.tasks = objects['tasks']
+    self.agent_task_map = objects['agent_task_map']
+    # the restored tasks are copies
+    self._predicate_graph = PredicateGraph([task.eval_fn for task in self.tasks],
+                                           self.realm.datastore)
+    if self.game_state is not None:
+      self.game_state.clear_cache()
+      self.game_state = None
+
+    self.obs = self._compute_observations()
+    self._reset_required = False
+
+  def _shared_state_objects(self):
+    '''Objects referenced by, but not copied into the saved states.
+       The order must not change between save_state() and load_state()'''
+    return [self, self.config, self._np_random, self.realm, self.realm.datastore,
+            self.realm.map, self.realm.map.tiles, self.realm.event_log,
+            self.realm.log_helper, self._gamestate_generator,
+            self._gamestate_generator.config, *self.realm.datastore.tables]
+
+  def _sample_training_tasks(self):
+    # the curriculum file may have been changed, but it is only read again then
+    curriculum = task_spec.load_curriculum(self.curriculum_file_path)
+    sampled_spec = curriculum.sample(self._np_random, len(self.possible_agents))
 
     return task_spec.make_task_from_spec(self.possible_agents, sampled_spec)
 
@@ -237,7 +325,7 @@ class Env(ParallelEnv):
 
     return agent_task_map
 
-  def step(self, actions: Dict[int, Dict[str, Dict[str, Any]]]):
+  def step(self, actions: Union[Dict[int, Dict[str, Dict[str, Any]]], np.ndarray]):
     '''Simulates one game tick or timestep
 
     Args:
@@ -269,6 +357,12 @@ class Env(ParallelEnv):
           Perform this conditional processing to make batched action
           computation easier.
 
+          Alternatively, actions can be an int array of [PLAYER_N, len(flat_action_heads)],
+          where agent_id is in row agent_id - 1, and each column holds the value of
+          an action argument, as in flat_action_space. An action is a no-op for
+          the agent if any of its arguments is negative. Rows of absent agents,
+          and of scripted agents, are ignored
+
     Returns:
         (dict, dict, dict, None):
 
@@ -328,15 +422,33 @@ class Env(ParallelEnv):
               }
 
           Provided for conformity with PettingZoo
+
+        With config.BATCHED_OBS, observations is a single dict of
+        [PLAYER_N, ...] arrays, and rewards and dones are [PLAYER_N] arrays,
+        where agent_id is in row agent_id - 1. The AgentId entry of the
+        observations indexes the agents present in the current tick (0 if absent)
     '''
     assert not self._reset_required, 'step() called before reset'
+    perf = self.realm.perf
+    perf.start_tick()
+    step_start = start = perf_counter()
+
+    flat_actions = None
+    if isinstance(actions, np.ndarray):
+      flat_actions, actions = actions, {}
+
     # Add in scripted agents' actions, if any
     if self.scripted_agents:
       actions = self._compute_scripted_agent_actions(actions)
+    start = perf.lap('scripted_actions', start)
 
     # Drop invalid actions of BOTH neural and scripted agents
     #   we don't need _deserialize_scripted_actions() anymore
     actions = self._validate_actions(actions)
+    if flat_actions is not None:
+      actions = self._validate_flat_actions(flat_actions, actions)
+    perf.lap('validate_actions', start)
+
     # Execute actions
     self._dead_this_tick = self.realm.step(actions)
     # the list of "current" agents, both alive and dead_this_tick
@@ -354,13 +466,27 @@ class Env(ParallelEnv):
 
     # Store the observations, since actions reference them
     self.obs = self._compute_observations()
-    gym_obs = {a: o.to_gym() for a,o in self.obs.items()}
+    gym_obs = self._to_gym_obs()
 
     rewards, infos = self._compute_rewards()
+    if self.config.BATCHED_OBS:
+      rewards, dones = self._batch_rewards_dones(rewards, dones)
+
+    perf.lap('step', step_start)
+    perf.end_tick()
 
     # NOTE: all obs, rewards, dones, infos have data for each agent in self.agents
     return gym_obs, rewards, dones, infos
 
+  def perf_stats(self):
+    '''Wall time per tick of the phases of step(), over the last
+       config.PERF_STATS_WINDOW ticks. The 'step' phase is the total
+
+    Returns:
+        A dict of {phase: {'mean': ms, 'p50': ms, 'p99': ms, 'max': ms}}
+    '''
+    return self.realm.perf.stats()
+
   def _validate_actions(self, actions: Dict[int, Dict[str, Dict[str, Any]]]):
     '''Deserialize action arg values and validate actions
        For now, it does a basic validation (e.g., value is not none).
@@ -400,6 +526,63 @@ class Env(ParallelEnv):
 
     return validated_actions
 
+  def _validate_flat_actions(self, actions: np.ndarray, scripted_actions: Dict):
+    '''Deserialize and validate the flat actions in bulk, see step(), and merge
+       them with the validated actions of the scripted agents.
+       Returns the same dict as _validate_actions()'''
+    heads = self.flat_action_heads
+    assert actions.shape == (self.config.PLAYER_N, len(heads)), \
+      f'Expected flat actions of shape {(self.config.PLAYER_N, len(heads))}'
+
+    # drop the no-ops and deserialize the fixed arguments, e.g. Direction, in bulk,
+    #   clipping them like deserialize_fixed_arg(). The pointer arguments,
+    #   e.g. Target, are resolved against each agent's obs
+    values = actions.astype(np.int64)
+    atn_specs = []
+    col = 0
+    for atn_str, args in self._atn_space.items():
+      specs = []
+      active = np.ones(len(values), dtype=bool)
+      for arg_str in args:
+        arg = self._str_atn_map[arg_str]
+        active &= values[:, col] >= 0
+        if arg.argType is action.Fixed:
+          edges = np.empty(len(arg.edges), dtype=object)
+          edges[:] = arg.edges
+          fixed_objs = edges[np.clip(values[:, col], 0, len(edges) - 1)].tolist()
+          specs.append((arg, None, fixed_objs))
+        else:
+          specs.append((arg, values[:, col].tolist(), None))
+        col += 1
+      atn_specs.append((self._str_atn_map[atn_str], specs, active.tolist()))
+
+    validated_actions = {}
+    for ent_id, entity in self.realm.players.items():
+      if ent_id in scripted_actions:
+        validated_actions[ent_id] = scripted_actions[ent_id]
+        continue
+      if ent_id in self.scripted_agents or not entity.alive:
+        continue
+      row = ent_id - 1
+      obs = self.obs[ent_id]
+      agent_actions = validated_actions[ent_id] = {}
+      for atn, specs, active in atn_specs:
+        if not active[row]:
+          continue
+        deserialized_action = {}
+        for arg, pointers, fixed_objs in specs:
+          if fixed_objs is not None:
+            obj = fixed_objs[row]
+          else:
+            obj = arg.deserialize(self.realm, entity, pointers[row], obs)
+            if obj is None:
+              break
+          deserialized_action[arg] = obj
+        else:
+          agent_actions[atn] = deserialized_action
+
+    return validated_actions
+
   def _compute_scripted_agent_actions(self, actions: Dict[int, Dict[str, Dict[str, Any]]]):
     '''Compute actions for scripted agents and add them into the action dict'''
     dead_agents = set()
@@ -420,8 +603,12 @@ class Env(ParallelEnv):
     dummy_entities = np.zeros((0, len(Entity.State.attr_name_to_col)), dtype=np.int16)
     dummy_inventory = np.zeros((0, len(Item.State.attr_name_to_col)), dtype=np.int16)
     dummy_market = np.zeros((0, len(Item.State.attr_name_to_col)), dtype=np.int16)
-    return Observation(self.config, self.realm.tick, 0, self._dummy_task_embedding,
-                       dummy_tiles, dummy_entities, dummy_inventory, dummy_market)
+    dummy_obs = Observation(self.config, self.realm.tick, 0, self._dummy_task_embedding,
+                            dummy_tiles, dummy_entities, dummy_inventory, dummy_market)
+    if self.config.PROVIDE_ACTION_TARGETS:
+      # the dead agents share the same read-only masks
+      dummy_obs.action_targets.freeze()
+    return dummy_obs
 
   def _compute_observations(self):
     # Clean up unnecessary observations, which cause memory leaks
@@ -432,8 +619,19 @@ class Env(ParallelEnv):
         del agent_obs
       self.obs = None
 
+    start = perf_counter()
     obs = {}
     market = Item.Query.for_sale(self.realm.datastore)
+    batch = self._obs_buffers if self.config.BATCHED_OBS else None
+    if batch is not None:
+      batch["CurrentTick"][:] = self.realm.tick
+      if self.config.EXCHANGE_SYSTEM_ENABLED:
+        # the market is the same for all agents. NOTE: the Observations keep
+        #   the query result, since the rows of absent agents are cleared
+        fill_rows(batch["Market"][0], market[:self.config.MARKET_N_OBS])
+        batch["Market"][1:] = batch["Market"][0]
+
+    self._visibility = Visibility.from_realm(self.realm)
 
     # get tile map, to bypass the expensive tile window query
     tile_map = Tile.Query.get_map(self.realm.datastore, self.config.MAP_SIZE)
@@ -447,16 +645,14 @@ class Env(ParallelEnv):
         dummy_obs.current_tick = self.realm.tick
         dummy_obs.agent_id = agent_id
         obs[agent_id] = dummy_obs
+        if batch is not None:
+          dummy_obs.to_gym(self._agent_obs_buffers[agent_id])
       else:
         agent = self.realm.players.get(agent_id)
         agent_r = agent.row.val
         agent_c = agent.col.val
 
-        visible_entities = Entity.Query.window(
-            self.realm.datastore,
-            agent_r, agent_c,
-            radius
-        )
+        visible_entities = self._visibility.visible_entities(agent_id)
         visible_tiles = tile_map[agent_r-radius:agent_r+radius+1,
                                  agent_c-radius:agent_c+radius+1,:].reshape(tile_obs_size)
 
@@ -470,10 +666,103 @@ class Env(ParallelEnv):
         task_embedding = self._dummy_task_embedding
         if agent_id in self.agent_task_map:
           task_embedding = self.agent_task_map[agent_id][0].embedding # NOTE: first task only
+        if batch is not None:
+          # write straight into the batch, and let the Observation view the rows
+          slot = agent_id - 1
+          batch["AgentId"][slot] = agent_id
+          batch["Task"][slot] = task_embedding
+          visible_tiles = fill_rows(batch["Tile"][slot], visible_tiles)
+          visible_entities = fill_rows(batch["Entity"][slot],
+                                       visible_entities[:self.config.PLAYER_N_OBS])
+          if self.config.ITEM_SYSTEM_ENABLED:
+            inventory = fill_rows(batch["Inventory"][slot],
+                                  inventory[:self.config.INVENTORY_N_OBS])
+
         obs[agent_id] = Observation(self.config, self.realm.tick, agent_id, task_embedding,
-                                    visible_tiles, visible_entities, inventory, market)
+                                    visible_tiles, visible_entities, inventory, market,
+                                    self._visibility.visible_distance(agent_id))
+
+    start = self.realm.perf.lap('observations', start)
+    if batch is not None:
+      if self.config.PROVIDE_ACTION_TARGETS:
+        self._fill_batch_action_targets(batch, market)
+        start = self.realm.perf.lap('action_targets', start)
+      self._clear_batch_rows(batch)
+      self.realm.perf.lap('observations', start)
     return obs
 
+  def _fill_batch_action_targets(self, batch, market):
+    # all masks for all agents in one pass over the stacked obs
+    batch_obs = {key: val for key, val in batch.items() if key != "ActionTargets"}
+    if self.config.EXCHANGE_SYSTEM_ENABLED:
+      batch_obs["Market"] = market[:self.config.MARKET_N_OBS]
+    entity_dist = self._visibility.distance_matrix(self.possible_agents, self.config.PLAYER_N_OBS)
+    masks = action_mask.make_action_targets(self.config, self.realm.tick, batch_obs, entity_dist)
+    for atn, args in masks.items():
+      for arg, mask in args.items():
+        batch["ActionTargets"][atn][arg][:] = mask
+
+  def _clear_batch_rows(self, batch):
+    '''Zero out the rows of the agents absent from the current tick'''
+    current = set(self.agents)
+    absent = [agent_id - 1 for agent_id in self.possible_agents if agent_id not in current]
+    if not absent:
+      return
+    def clear(buffers):
+      for buf in buffers.values():
+        if isinstance(buf, dict):
+          clear(buf)
+        else:
+          buf[absent] = 0
+    clear(batch)
+
+  def _to_gym_obs(self):
+    if self.config.BATCHED_OBS:
+      # already written by _compute_observations()
+      return self._obs_buffers
+
+    start = perf_counter()
+    if self.config.PROVIDE_ACTION_TARGETS:
+      for agent_obs in self.obs.values():
+        agent_obs.action_targets.compute()
+      start = self.realm.perf.lap('action_targets', start)
+
+    if not self.config.REUSE_OBS_BUFFERS:
+      gym_obs = {a: o.to_gym() for a,o in self.obs.items()}
+    else:
+      gym_obs = {a: o.to_gym(self._agent_obs_buffers[a]) for a,o in self.obs.items()}
+    self.realm.perf.lap('gym_obs', start)
+    return gym_obs
+
+  def _make_obs_buffers(self, buffers=None):
+    '''Allocate one stacked buffer for all agents, where agent_id is in row
+       agent_id - 1, and the per-agent views into it, keyed by agent id
+
+    Args:
+      buffers: optional dict of [PLAYER_N, ...] arrays laid out as the observation
+        space, e.g. carved from shared memory, to use instead of a new allocation
+    '''
+    if buffers is None:
+      if self._obs_buffers is not None:
+        return
+      buffers = utils.space_buffers(self._obs_space, (len(self.possible_agents),))
+    self._obs_buffers = buffers
+    def view(buffers, idx):
+      # NOTE: buf[idx, ...] is a view even for the 0-d scalar entries
+      return {key: view(buf, idx) if isinstance(buf, dict) else buf[idx, ...]
+              for key, buf in buffers.items()}
+    self._agent_obs_buffers = {agent_id: view(self._obs_buffers, agent_id - 1)
+                               for agent_id in self.possible_agents}
+
+  def _batch_rewards_dones(self, rewards, dones):
+    batch_rewards = np.zeros(len(self.possible_agents), dtype=np.float32)
+    batch_dones = np.zeros(len(self.possible_agents), dtype=bool)
+    for agent_id, reward in rewards.items():
+      batch_rewards[agent_id - 1] = reward
+    for agent_id, done in dones.items():
+      batch_dones[agent_id - 1] = done
+    return batch_rewards, batch_dones
+
   def _compute_rewards(self):
     '''Computes the reward for the specified agent
 
@@ -500,9 +789,18 @@ class Env(ParallelEnv):
       self.game_state = None
 
     # Compute Rewards and infos
-    self.game_state = self._gamestate_generator.generate(self.realm, self.obs)
-    for task in self.tasks:
-      if agents.intersection(task.assignee): # evaluate only if the agents are current
+    start = perf_counter()
+    self.game_state = self._gamestate_generator.generate(self.realm, self.obs, self._visibility)
+    start = self.realm.perf.lap('game_state', start)
+    # evaluate only if the agents are current
+    is_current = [bool(agents.intersection(task.assignee)) for task in self.tasks]
+    # each predicate is evaluated once, and the same predicate of many agents at once,
+    #   e.g. StayAlive by default. The completed tasks, which give no more reward, are skipped
+    self._predicate_graph.evaluate(
+      [task.eval_fn for task, current in zip(self.tasks, is_current)
+       if current and task.needs_eval], self.game_state)
+    for task, current in zip(self.tasks, is_current):
+      if current:
         task_rewards, task_infos = task.compute_rewards(self.game_state)
         for agent_id, reward in task_rewards.items():
           if agent_id in agents:
@@ -510,6 +808,7 @@ class Env(ParallelEnv):
             infos[agent_id]['task'][task.name] = task_infos[agent_id] # include progress, etc.
       else:
         task.close()  # To prevent memory leak
+    self.realm.perf.lap('tasks', start)
 
     # Make sure the dead agents return the rewards of -1
     for agent_id in self._dead_this_tick:
@@ -531,7 +830,8 @@ class Env(ParallelEnv):
     return self._agents
 
   def close(self):
-    '''For conformity with the PettingZoo API only; rendering is external'''
+    '''Releases the datastore, e.g. its shared memory. Rendering is external'''
+    self.realm.datastore.close()
 
   def seed(self, seed=None):
     '''Reseeds the environment. reset() must be called after seed(), and before step().
@@ -3,7 +3,7 @@ import logging
 import numpy as np
 from ordered_set import OrderedSet
 
-from nmmo.core.tile import Tile
+from nmmo.core.tile import Tile, TileState
 from nmmo.lib import material
 
 
@@ -17,8 +17,13 @@ class Map:
     self._repr  = None
     self.realm  = realm
     self.update_list = None
+    self.map_id = None
     self.pathfinding_cache = {} # Avoid recalculating A*, paths don't move
 
+    # with config.FAST_RESET, the map files and the currently loaded materials
+    self._map_cache = {}
+    self._material_ids = None
+
     sz          = config.MAP_SIZE
     self.tiles  = np.zeros((sz, sz), dtype=object)
     self.habitable_tiles = np.zeros((sz,sz))
@@ -50,30 +55,111 @@ class Map:
   def reset(self, map_id, np_random):
     '''Reuse the current tile objects to load a new map'''
     config = self.config
+
+    if config.FAST_RESET:
+      self._fast_reset(map_id, np_random)
+    else:
+      map_file = self._load_map(map_id)
+      materials = {mat.index: mat for mat in material.All}
+      r, c = 0, 0
+      for r, row in enumerate(map_file):
+        for c, idx in enumerate(row):
+          mat  = materials[idx]
+          tile = self.tiles[r, c]
+          tile.reset(mat, config, np_random)
+          self.habitable_tiles[r, c] = tile.habitable
+
+      assert c == config.MAP_SIZE - 1
+      assert r == config.MAP_SIZE - 1
+
     self.update_list = OrderedSet() # critical for determinism
+    self.map_id = map_id
+    self._repr = None
 
-    path_map_suffix = config.PATH_MAP_SUFFIX.format(map_id)
-    f_path = os.path.join(config.PATH_CWD, config.PATH_MAPS, path_map_suffix)
+  def _load_map(self, map_id):
+    path_map_suffix = self.config.PATH_MAP_SUFFIX.format(map_id)
+    f_path = os.path.join(self.config.PATH_CWD, self.config.PATH_MAPS, path_map_suffix)
 
     try:
-      map_file = np.load(f_path)
+      return np.load(f_path)
     except FileNotFoundError:
       logging.error('Maps not found')
       raise
 
-    materials = {mat.index: mat for mat in material.All}
-    r, c = 0, 0
-    for r, row in enumerate(map_file):
-      for c, idx in enumerate(row):
-        mat  = materials[idx]
-        tile = self.tiles[r, c]
-        tile.reset(mat, config, np_random)
-        self.habitable_tiles[r, c] = tile.habitable
-
-    assert c == config.MAP_SIZE - 1
-    assert r == config.MAP_SIZE - 1
+  def _fast_reset(self, map_id, np_random):
+    '''Reset only the tiles that differ from the cached map file.
+       Must be called before the entities are reset'''
+    config = self.config
+    if map_id not in self._map_cache:
+      self._map_cache[map_id] = self._load_map(map_id)
+    map_file = self._map_cache[map_id]
+    assert map_file.shape == (config.MAP_SIZE, config.MAP_SIZE)
+
+    # tiles keep a reference to the rng, which is replaced on every reset
+    for tile in self.tiles.flat:
+      tile._np_random = np_random # pylint: disable=protected-access
+
+    if self._material_ids is None:
+      changed = np.ones(map_file.shape, dtype=bool)
+    else:
+      # the material_id of depleted tiles differs from the base material,
+      # except for water, but depleted tiles are also in the update list
+      tile_map = TileState.Query.get_map(self.realm.datastore, config.MAP_SIZE)
+      changed = (map_file != self._material_ids) | \
+        (tile_map[:, :, TileState.State.attr_name_to_col['material_id']] != map_file)
+      for tile in self.update_list:
+        changed[tile.pos] = True
+      for group in (self.realm.players, self.realm.npcs):
+        for ent in group.values():
+          changed[ent.pos] = True
 
-    self._repr = None
+    materials = {mat.index: mat for mat in material.All}
+    for r, c in zip(*np.nonzero(changed)):
+      self.tiles[r, c].reset(materials[map_file[r, c]], config, np_random)
+    self.habitable_tiles[:] = np.isin(map_file, list(material.Habitable.indices))
+    self._material_ids = map_file
+
+  def save_state(self):
+    '''Snapshot the tile depletion and the order of entities on tiles'''
+    occupied = {ent.pos for group in (self.realm.players, self.realm.npcs)
+                for ent in group.values()}
+    return {
+      'map_id': self.map_id,
+      'update_list': [(tile.pos, tile.depleted) for tile in self.update_list],
+      'entities': {pos: list(self.tiles[pos].entities) for pos in occupied},
+    }
+
+  def clear_entities(self):
+    '''Remove the current entities from their tiles'''
+    for group in (self.realm.players, self.realm.npcs):
+      for ent in group.values():
+        self.tiles[ent.pos].entities = {}
+
+  def load_state(self, state, entities, np_random):
+    '''Restore the tiles from save_state(), where entities maps ent_id to
+       the restored entity objects. The datastore must be restored already,
+       and the previous entities removed with clear_entities()'''
+    if state['map_id'] != self.map_id:
+      self.reset(state['map_id'], np_random)
+    # depleted tiles are always in the update list, so only these can differ
+    touched = list(self.update_list)
+    for tile in touched:
+      tile.depleted = False
+      tile.state = tile.material
+    self.update_list = OrderedSet()
+    for pos, depleted in state['update_list']:
+      tile = self.tiles[pos]
+      tile.depleted = depleted
+      if depleted:
+        tile.state = tile.material.deplete(self.config)
+      self.update_list.add(tile)
+      touched.append(tile)
+    for tile in touched:
+      # sync the cached value of the attribute with the datastore
+      tile.material_id.update(tile.state.index)
+
+    for pos, ent_ids in state['entities'].items():
+      self.tiles[pos].entities = {ent_id: entities[ent_id] for ent_id in ent_ids}
 
   def step(self):
     '''Evaluate updatable tiles'''
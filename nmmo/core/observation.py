@@ -1,3 +1,4 @@
+from collections.abc import Mapping
 from functools import lru_cache, cached_property
 
 import numpy as np
@@ -7,7 +8,22 @@ from nmmo.entity.entity import EntityState
 from nmmo.systems.item import ItemState
 import nmmo.systems.item as item_system
 from nmmo.core import action
-from nmmo.lib import material, utils
+from nmmo.lib import material
+
+
+def fill_rows(buffer, values):
+  '''Copy values into the leading rows of buffer, zero out the rest,
+     and return the view of the copied rows.
+
+     Values wider than the buffer, e.g. the int32 gold and exp columns of the
+     Entity table, saturate to the buffer dtype instead of wrapping around'''
+  num_rows = values.shape[0]
+  if values.dtype != buffer.dtype and np.issubdtype(buffer.dtype, np.integer):
+    info = np.iinfo(buffer.dtype)
+    values = np.clip(values, info.min, info.max)
+  buffer[:num_rows] = values
+  buffer[num_rows:] = 0
+  return buffer[:num_rows]
 
 
 class BasicObs:
@@ -37,6 +53,37 @@ class InventoryObs(BasicObs):
     return idx[0] if len(idx) else None
 
 
+class ActionTargets(Mapping):
+  '''Maps each action name to its {arg name: mask} dict.
+     The masks of an action are only computed when first accessed'''
+  def __init__(self, heads):
+    self._heads = heads
+    self._masks = {}
+
+  def __getitem__(self, atn):
+    if atn not in self._masks:
+      self._masks[atn] = self._heads[atn]()
+    return self._masks[atn]
+
+  def __iter__(self):
+    return iter(self._heads)
+
+  def __len__(self):
+    return len(self._heads)
+
+  def compute(self):
+    '''Compute the masks of all actions'''
+    for atn, head in self._heads.items():
+      if atn not in self._masks:
+        self._masks[atn] = head()
+
+  def freeze(self):
+    '''Compute all masks and make them read-only, so they can be shared'''
+    for args in self.values():
+      for mask in args.values():
+        mask.setflags(write=False)
+
+
 class Observation:
   def __init__(self,
     config,
@@ -46,7 +93,8 @@ class Observation:
     tiles,
     entities,
     inventory,
-    market) -> None:
+    market,
+    entity_dist=None) -> None:
 
     self.config = config
     self.current_tick = current_tick
@@ -56,6 +104,8 @@ class Observation:
     self.tiles = tiles[0:config.MAP_N_OBS]
     self.entities = BasicObs(entities[0:config.PLAYER_N_OBS],
                               EntityState.State.attr_name_to_col["id"])
+    # l-inf distance of the entities to the agent, if precomputed. See Visibility
+    self._entity_dist = entity_dist
 
     self.dummy_obs = self.agent() is None
     if config.COMBAT_SYSTEM_ENABLED and not self.dummy_obs:
@@ -117,11 +167,21 @@ class Observation:
   def agent(self):
     return self.entity(self.agent_id)
 
+  def entity_dist(self):
+    '''l-inf distance of the visible entities to the agent'''
+    if self._entity_dist is None:
+      agent = self.agent()
+      self._entity_dist = np.maximum(
+        np.abs(self.entities.values[:,EntityState.State.attr_name_to_col["row"]] - agent.row),
+        np.abs(self.entities.values[:,EntityState.State.attr_name_to_col["col"]] - agent.col))
+    return self._entity_dist
+
   def clear_cache(self):
     # clear the cache, so that this object can be garbage collected
     self.agent.cache_clear()
     self.entity.cache_clear()
     self.tile.cache_clear()
+    self.__dict__.pop("action_targets", None)
 
   def get_empty_obs(self):
     gym_obs = {
@@ -139,8 +199,16 @@ class Observation:
                                     self.market.values.shape[1]), dtype=np.int16)
     return gym_obs
 
-  def to_gym(self):
-    '''Convert the observation to a format that can be used by OpenAI Gym'''
+  def to_gym(self, out=None):
+    '''Convert the observation to a format that can be used by OpenAI Gym
+
+    Args:
+        out: optional dict of preallocated arrays, laid out as the observation
+          space. If provided, it is overwritten in place and returned
+    '''
+    if out is not None:
+      return self._fill_gym_obs(out)
+
     gym_obs = self.get_empty_obs()
     if self.dummy_obs:
       # return empty obs for the dead agents
@@ -151,7 +219,7 @@ class Observation:
 
     # NOTE: assume that all len(self.tiles) == self.config.MAP_N_OBS
     gym_obs['Tile'] = self.tiles
-    gym_obs['Entity'][:self.entities.values.shape[0],:] = self.entities.values
+    fill_rows(gym_obs['Entity'], self.entities.values)
 
     if self.config.ITEM_SYSTEM_ENABLED:
       gym_obs["Inventory"][:self.inventory.values.shape[0],:] = self.inventory.values
@@ -164,51 +232,86 @@ class Observation:
 
     return gym_obs
 
+  def _fill_gym_obs(self, gym_obs):
+    gym_obs["CurrentTick"][...] = self.current_tick
+    gym_obs["AgentId"][...] = self.agent_id
+    gym_obs["Task"][:] = self.task_embedding
+
+    # NOTE: the dummy obs has no rows, so the tiles are zeroed out as well
+    fill_rows(gym_obs["Tile"], self.tiles)
+    fill_rows(gym_obs["Entity"], self.entities.values)
+    if self.config.ITEM_SYSTEM_ENABLED:
+      fill_rows(gym_obs["Inventory"], self.inventory.values)
+    if self.config.EXCHANGE_SYSTEM_ENABLED:
+      fill_rows(gym_obs["Market"], self.market.values)
+
+    if self.config.PROVIDE_ACTION_TARGETS:
+      self.fill_action_targets(gym_obs["ActionTargets"])
+
+    return gym_obs
+
+  def fill_action_targets(self, masks):
+    '''Write the action targets into a nested dict of preallocated masks'''
+    for atn, args in self.action_targets.items():
+      for arg, mask in args.items():
+        masks[atn][arg][:] = mask
+
+  @cached_property
+  def action_targets(self):
+    '''Action targets by action name, each computed on first access'''
+    return ActionTargets(self._action_target_heads())
+
   def _make_action_targets(self):
-    masks = {}
-    masks["Move"] = {
+    return dict(self.action_targets.items())
+
+  def _action_target_heads(self):
+    heads = {}
+    heads["Move"] = lambda: {
       "Direction": self._make_move_mask()
     }
 
     if self.config.COMBAT_SYSTEM_ENABLED:
       # Test below. see tests/core/test_observation_tile.py, test_action_target_consts()
       # assert len(action.Style.edges) == 3
-      masks["Attack"] = {
+      heads["Attack"] = lambda: {
         "Style": np.ones(3, dtype=np.int8),
         "Target": self._make_attack_mask()
       }
 
     if self.config.ITEM_SYSTEM_ENABLED:
-      masks["Use"] = {
+      heads["Use"] = lambda: {
         "InventoryItem": self._make_use_mask()
       }
-      masks["Give"] = {
+      heads["Give"] = lambda: {
         "InventoryItem": self._make_sell_mask(),
         "Target": self._make_give_target_mask()
       }
-      masks["Destroy"] = {
+      heads["Destroy"] = lambda: {
         "InventoryItem": self._make_destroy_item_mask()
       }
 
     if self.config.EXCHANGE_SYSTEM_ENABLED:
-      masks["Sell"] = {
+      heads["Sell"] = lambda: {
         "InventoryItem": self._make_sell_mask(),
         "Price": np.ones(self.config.PRICE_N_OBS, dtype=np.int8)
       }
-      masks["Buy"] = {
+      heads["Buy"] = lambda: {
         "MarketItem": self._make_buy_mask()
       }
-      masks["GiveGold"] = {
+      heads["GiveGold"] = lambda: {
         "Price": self._make_give_gold_mask(),  # reusing Price
         "Target": self._make_give_gold_target_mask()
       }
 
     if self.config.COMMUNICATION_SYSTEM_ENABLED:
-      masks["Comm"] = {
+      heads["Comm"] = lambda: {
         "Token":np.ones(self.config.COMMUNICATION_NUM_TOKENS, dtype=np.int8)
       }
 
-    return masks
+    if self.config.ACTION_TARGETS_HEADS is not None:
+      heads = {atn: make_masks for atn, make_masks in heads.items()
+               if atn in self.config.ACTION_TARGETS_HEADS}
+    return heads
 
   def _make_move_mask(self):
     if self.dummy_obs:
@@ -236,10 +339,7 @@ class Observation:
       return attack_mask
 
     agent = self.agent()
-    within_range = np.maximum( # calculating the l-inf dist
-        np.abs(self.entities.values[:,EntityState.State.attr_name_to_col["row"]] - agent.row),
-        np.abs(self.entities.values[:,EntityState.State.attr_name_to_col["col"]] - agent.col)
-      ) <= self.config.COMBAT_MELEE_REACH
+    within_range = self.entity_dist() <= self.config.COMBAT_MELEE_REACH
 
     immunity = self.config.COMBAT_SPAWN_IMMUNITY
     if agent.time_alive < immunity:
@@ -336,10 +436,7 @@ class Observation:
        or self.inventory.len == 0:
       return give_mask
 
-    agent = self.agent()
-    entities_pos = self.entities.values[:,[EntityState.State.attr_name_to_col["row"],
-                                           EntityState.State.attr_name_to_col["col"]]]
-    same_tile = utils.linf(entities_pos, (agent.row, agent.col)) == 0
+    same_tile = self.entity_dist() == 0
     not_me = self.entities.ids != self.agent_id
     player = (self.entities.values[:,EntityState.State.attr_name_to_col["npc_type"]] == 0)
 
@@ -355,10 +452,7 @@ class Observation:
        or int(self.agent().gold) == 0:
       return give_mask
 
-    agent = self.agent()
-    entities_pos = self.entities.values[:,[EntityState.State.attr_name_to_col["row"],
-                                           EntityState.State.attr_name_to_col["col"]]]
-    same_tile = utils.linf(entities_pos, (agent.row, agent.col)) == 0
+    same_tile = self.entity_dist() == 0
     not_me = self.entities.ids != self.agent_id
     player = (self.entities.values[:,EntityState.State.attr_name_to_col["npc_type"]] == 0)
 
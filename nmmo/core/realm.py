@@ -2,6 +2,7 @@ from __future__ import annotations
 
 import logging
 from collections import defaultdict
+from time import perf_counter
 from typing import Dict
 
 import nmmo
@@ -12,9 +13,11 @@ from nmmo.core.action import Action, Buy
 from nmmo.entity.entity import EntityState
 from nmmo.entity.entity_manager import NPCManager, PlayerManager
 from nmmo.datastore.numpy_datastore import NumpyDatastore
+from nmmo.datastore.shared_memory import SharedMemoryDatastore
 from nmmo.systems.exchange import Exchange
 from nmmo.systems.item import Item, ItemState
 from nmmo.lib.event_log import EventLogger, EventState
+from nmmo.lib.perf_stats import PerfStats
 from nmmo.render.replay_helper import ReplayHelper
 
 def prioritized(entities: Dict, merged: Dict):
@@ -42,9 +45,17 @@ class Realm:
     #   To ensure determinism, provide seed to env.reset()
     config.MAP_GENERATOR(config).generate_all_maps(self._np_random)
 
-    self.datastore = NumpyDatastore()
+    if config.SHARED_MEMORY_NAME is not None:
+      self.datastore = SharedMemoryDatastore(config.SHARED_MEMORY_NAME)
+    else:
+      self.datastore = NumpyDatastore()
     for s in [TileState, EntityState, ItemState, EventState]:
-      self.datastore.register_object_type(s._name, s.State.num_attributes)
+      self.datastore.register_object_type(s._name, s.State.num_attributes, s.State.dtypes)
+    # the id lookups and the inventory queries of the observations
+    EntityState.State.table(self.datastore).enable_index(EntityState.State.attr_name_to_col["id"])
+    item_table = ItemState.State.table(self.datastore)
+    item_table.enable_index(ItemState.State.attr_name_to_col["id"])
+    item_table.enable_index(ItemState.State.attr_name_to_col["owner_id"])
 
     self.tick = None # to use as a "reset" checker
     self.exchange = None
@@ -58,6 +69,8 @@ class Realm:
     # Entity handlers
     self.players = PlayerManager(self, self._np_random)
     self.npcs = NPCManager(self, self._np_random)
+    # attributes of the previous entities, recycled by reset() with config.FAST_RESET
+    self.entity_pool = []
 
     # Global item registry
     self.items = {}
@@ -65,6 +78,14 @@ class Realm:
     # Replay helper
     self._replay_helper = None
 
+    # Wall time of the phases of each tick, see Env.perf_stats()
+    self.perf = PerfStats(config.PERF_STATS_WINDOW)
+    priority_actions = defaultdict(list)
+    for atn in Action.edges(config):
+      priority_actions[atn.priority].append(atn.__name__)
+    self._priority_phase = {priority: "action:" + "/".join(sorted(names))
+                            for priority, names in priority_actions.items()}
+
     # Initialize actions
     nmmo.Action.init(config)
 
@@ -75,6 +96,7 @@ class Realm:
         idx: Map index to load
     """
     self._np_random = np_random
+    self.datastore.begin_write(0)
     self.log_helper.reset()
     self.event_log.reset()
 
@@ -97,6 +119,7 @@ class Realm:
 
     self.players.spawn()
     self.npcs.spawn()
+    self.entity_pool.clear()
 
     # Global item exchange
     self.exchange = Exchange(self)
@@ -107,6 +130,32 @@ class Realm:
 
     if self._replay_helper is not None:
       self._replay_helper.reset()
+    self.datastore.end_write(self.tick)
+
+  def save_state(self):
+    """Snapshot the world arrays. See Env.save_state()
+
+    NOTE: The players, npcs, items and exchange are not included,
+      and must be saved by the caller
+    """
+    return {
+      "tick": self.tick,
+      "datastore": self.datastore.save_state(),
+      "map": self.map.save_state(),
+      "event_log": self.event_log.save_state(),
+      "item_instance_id": Item.INSTANCE_ID,
+    }
+
+  def load_state(self, state, players, npcs, items, exchange):
+    """Restore the world state from save_state() and the saved objects"""
+    self.tick = state["tick"]
+    self.datastore.begin_write(self.tick)
+    self.datastore.load_state(state["datastore"])
+    self.map.load_state(state["map"], {**players.entities, **npcs.entities}, self._np_random)
+    self.players, self.npcs, self.items, self.exchange = players, npcs, items, exchange
+    self.event_log.load_state(state["event_log"])
+    Item.INSTANCE_ID = state["item_instance_id"]
+    self.datastore.end_write(self.tick)
 
   def packet(self):
     """Client packet"""
@@ -149,8 +198,12 @@ class Realm:
     Returns:
         dead: List of dead agents
     """
+    self.datastore.begin_write(self.tick + 1)
+
     # Prioritize actions
+    start = perf_counter()
     npc_actions = self.npcs.actions(self)
+    start = self.perf.lap("npc_actions", start)
     merged = defaultdict(list)
     prioritized(actions, merged)
     prioritized(npc_actions, merged)
@@ -158,6 +211,7 @@ class Realm:
     # Update entities and perform actions
     self.players.update(actions)
     self.npcs.update(npc_actions)
+    start = self.perf.lap("entity_update", start)
 
     # Execute actions -- CHECK ME the below priority
     #  - 10: Use - equip ammo, restore HP, etc.
@@ -181,18 +235,24 @@ class Realm:
         ent = self.entity(ent_id)
         if ent.alive:
           atn.call(self, ent, *args)
+      start = self.perf.lap(self._priority_phase.get(priority, f"action:{priority}"), start)
     dead = self.players.cull()
     self.npcs.cull()
+    start = self.perf.lap("cull", start)
 
     # Update map
     self.map.step()
+    start = self.perf.lap("map", start)
     self.exchange.step(self.tick)
+    start = self.perf.lap("exchange", start)
     self.log_helper.update(dead)
     self.event_log.update()
     if self._replay_helper is not None:
       self._replay_helper.update()
+    self.perf.lap("logging", start)
 
     self.tick += 1
+    self.datastore.end_write(self.tick)
 
     return dead
 
@@ -0,0 +1,284 @@
+from copy import copy
+import multiprocessing as mp
+from multiprocessing import resource_tracker, shared_memory
+import traceback
+from typing import Any, Dict, List
+
+import numpy as np
+
+from nmmo.core.env import Env
+from nmmo.lib import utils
+
+"""
+VecEnv hosts many Env instances in a pool of worker processes.
+
+Each worker steps its share of the envs, which write their observations
+straight into numpy arrays backed by a single multiprocessing.shared_memory
+segment (see Env REUSE_OBS_BUFFERS), next to the rewards and dones. The arrays are laid out as
+[env, agent, ...], where agent is the slot agent_id - 1, so the learner
+reads a whole batch without any pickling. Only the (small) action dicts and
+infos travel through the pipes.
+
+Envs are reset automatically once they reach config.HORIZON or once all
+their agents are dead. In that case, the returned obs are the first obs of
+the new episode, while dones and rewards are those of the terminal step.
+"""
+
+class _BufferCarver:
+  '''Hands out aligned numpy arrays from a flat buffer.
+     With buf=None, it only measures the required size.'''
+  ALIGN = 64
+
+  def __init__(self, buf=None):
+    self.buf = buf
+    self.size = 0
+
+  def __call__(self, shape, dtype):
+    dtype = np.dtype(dtype)
+    self.size = -(-self.size // self.ALIGN) * self.ALIGN
+    arr = None
+    if self.buf is not None:
+      arr = np.ndarray(shape, dtype=dtype, buffer=self.buf, offset=self.size)
+    self.size += int(np.prod(shape)) * dtype.itemsize
+    return arr
+
+def _make_buffers(obs_space, num_envs, num_agents, alloc):
+  batch = (num_envs, num_agents)
+  return {
+    'obs': utils.space_buffers(obs_space, batch, alloc),
+    'rewards': alloc(batch, np.float32),
+    'dones': alloc(batch, bool),
+    'mask': alloc(batch, bool), # True for the agents present in the obs
+  }
+
+def _env_view(buffers, env_idx):
+  return {key: _env_view(buf, env_idx) if isinstance(buf, dict) else buf[env_idx]
+          for key, buf in buffers.items()}
+
+def _clear_agent(dst, idx):
+  for val in dst.values():
+    if isinstance(val, dict):
+      _clear_agent(val, idx)
+    else:
+      val[idx] = 0
+
+def _write_env(buffers, env_idx, num_agents, obs, rewards=None, dones=None):
+  # NOTE: the env already wrote the obs of the present agents in place
+  for slot in range(num_agents):
+    agent_id = slot + 1
+    idx = (env_idx, slot)
+    present = agent_id in obs
+    if not present:
+      _clear_agent(buffers['obs'], idx)
+    buffers['mask'][idx] = present
+    buffers['rewards'][idx] = rewards.get(agent_id, 0) if rewards else 0
+    buffers['dones'][idx] = dones.get(agent_id, False) if dones else False
+
+def _step_env(env, actions, buffers, env_idx, num_agents):
+  obs, rewards, dones, infos = env.step(actions)
+  if env.realm.tick >= env.config.HORIZON or len(env.realm.players) == 0:
+    # autoreset: keep the terminal rewards and dones, return the new obs
+    obs = env.reset()
+  _write_env(buffers, env_idx, num_agents, obs, rewards, dones)
+  return infos
+
+def _env_config(config, env_idx):
+  '''Config of env env_idx, which writes its per-agent obs into the buffers handed
+     out by the worker, and whose datastore segments, if any, get their own names'''
+  env_config = copy(config)
+  env_config.REUSE_OBS_BUFFERS = True
+  # VecEnv does the batching, and _write_env expects the obs keyed by agent id
+  env_config.BATCHED_OBS = False
+  if config.SHARED_MEMORY_NAME is not None:
+    env_config.SHARED_MEMORY_NAME = f"{config.SHARED_MEMORY_NAME}_{env_idx}"
+  return env_config
+
+def _worker(remote, parent_remote, config, env_indices, seeds, num_envs):
+  parent_remote.close()
+  shm = None
+  envs = []
+  try:
+    envs = [Env(_env_config(config, env_idx), seed) for env_idx, seed in zip(env_indices, seeds)]
+    num_agents = config.PLAYER_N
+    obs_space = envs[0].observation_space(1)
+    remote.send(('ok', obs_space))
+
+    while True:
+      cmd, data = remote.recv()
+      if cmd == 'attach':
+        shm = shared_memory.SharedMemory(name=data)
+        # the parent owns the segment, so the worker must not unlink it on exit
+        resource_tracker.unregister(shm._name, 'shared_memory') # pylint: disable=protected-access
+        buffers = _make_buffers(obs_space, num_envs, num_agents, _BufferCarver(shm.buf))
+        for env_idx, env in zip(env_indices, envs):
+          env._make_obs_buffers(_env_view(buffers['obs'], env_idx)) # pylint: disable=protected-access
+        remote.send(('ok', None))
+
+      elif cmd == 'reset':
+        for env_idx, env, seed in zip(env_indices, envs, data):
+          _write_env(buffers, env_idx, num_agents, env.reset(seed=seed))
+        remote.send(('ok', None))
+
+      elif cmd == 'step':
+        infos = [_step_env(env, actions, buffers, env_idx, num_agents)
+                 for env_idx, env, actions in zip(env_indices, envs, data)]
+        remote.send(('ok', infos))
+
+      elif cmd == 'close':
+        remote.send(('ok', None))
+        break
+
+      else:
+        raise ValueError(f'Unknown command: {cmd}')
+
+  except KeyboardInterrupt:
+    pass
+  except Exception: # pylint: disable=broad-except
+    remote.send(('error', traceback.format_exc()))
+  finally:
+    # drop the array views, including those of the envs, before releasing the segment
+    buffers = None
+    for env in envs:
+      env.close()
+      env._obs_buffers = env._agent_obs_buffers = None # pylint: disable=protected-access
+    if shm is not None:
+      shm.close()
+    remote.close()
+
+class VecEnv:
+  '''Runs num_envs Env instances in num_workers processes
+
+  Args:
+    config: config shared by all envs. With config.SHARED_MEMORY_NAME,
+      the datastore of env i is named SHARED_MEMORY_NAME_i
+    num_envs: number of envs to host
+    num_workers: number of worker processes. Defaults to num_envs
+    seed: if provided, env i is seeded with seed + i
+    start_method: multiprocessing start method, e.g. 'fork' or 'spawn'
+
+  Attributes:
+    obs: nested dict of [num_envs, PLAYER_N, ...] arrays, following
+      the layout of Env.observation_space(). Agent agent_id is in slot agent_id - 1
+    rewards, dones: [num_envs, PLAYER_N] arrays of the last step
+    mask: [num_envs, PLAYER_N] bool array, True for the agents present in obs
+
+  NOTE: All arrays live in shared memory and are overwritten in place by
+    every reset() and step(). Copy them if they should outlive the next call.
+  '''
+  def __init__(self, config, num_envs: int, num_workers: int = None,
+               seed: int = None, start_method: str = None):
+    num_workers = num_workers or num_envs
+    assert 0 < num_workers <= num_envs, 'num_workers must be in [1, num_envs]'
+    self.config = config
+    self.num_envs = num_envs
+    self.num_agents = config.PLAYER_N
+    self._closed = False
+    self._shm = None
+    self._buffers = None
+
+    ctx = mp.get_context(start_method)
+    self._env_indices = np.array_split(np.arange(num_envs), num_workers)
+    self._remotes = []
+    self._processes = []
+    for env_indices in self._env_indices:
+      env_indices = env_indices.tolist()
+      seeds = [None if seed is None else seed + i for i in env_indices]
+      remote, work_remote = ctx.Pipe()
+      process = ctx.Process(target=_worker, daemon=True,
+                            args=(work_remote, remote, config, env_indices, seeds, num_envs))
+      process.start()
+      work_remote.close()
+      self._remotes.append(remote)
+      self._processes.append(process)
+      # NOTE: Env creation (re)generates the maps on disk,
+      #   so the workers are brought up one at a time
+      obs_space = self._receive(remote)
+
+    # the obs space only depends on the config, so any worker's space will do
+    size_carver = _BufferCarver()
+    _make_buffers(obs_space, num_envs, self.num_agents, size_carver)
+    self._shm = shared_memory.SharedMemory(create=True, size=max(size_carver.size, 1))
+    self._buffers = _make_buffers(obs_space, num_envs, self.num_agents,
+                                  _BufferCarver(self._shm.buf))
+    for remote in self._remotes:
+      remote.send(('attach', self._shm.name))
+    for remote in self._remotes:
+      self._receive(remote)
+
+  @property
+  def obs(self) -> Dict:
+    return self._buffers['obs']
+
+  @property
+  def rewards(self) -> np.ndarray:
+    return self._buffers['rewards']
+
+  @property
+  def dones(self) -> np.ndarray:
+    return self._buffers['dones']
+
+  @property
+  def mask(self) -> np.ndarray:
+    return self._buffers['mask']
+
+  def _receive(self, remote):
+    status, data = remote.recv()
+    if status == 'error':
+      self.close()
+      raise RuntimeError(f'VecEnv worker failed:\n{data}')
+    return data
+
+  def reset(self, seed: int = None):
+    '''Resets all envs. If provided, env i is reseeded with seed + i
+
+    Returns:
+      obs, as documented in the class attributes
+    '''
+    for remote, env_indices in zip(self._remotes, self._env_indices):
+      seeds = [None if seed is None else seed + int(i) for i in env_indices]
+      remote.send(('reset', seeds))
+    for remote in self._remotes:
+      self._receive(remote)
+    return self.obs
+
+  def step(self, actions: List[Dict[int, Dict[str, Dict[str, Any]]]] = None):
+    '''Steps all envs
+
+    Args:
+      actions: a list with one Env.step() action dict per env, or None for no-ops
+
+    Returns:
+      (obs, rewards, dones, infos), where infos is a list of per-env info dicts
+    '''
+    if actions is None:
+      actions = [{} for _ in range(self.num_envs)]
+    assert len(actions) == self.num_envs, 'Must provide actions for each env'
+
+    for remote, env_indices in zip(self._remotes, self._env_indices):
+      remote.send(('step', [actions[i] for i in env_indices]))
+    infos = []
+    for remote in self._remotes:
+      infos += self._receive(remote)
+    return self.obs, self.rewards, self.dones, infos
+
+  def close(self):
+    if self._closed:
+      return
+    self._closed = True
+    for remote, process in zip(self._remotes, self._processes):
+      if process.is_alive():
+        try:
+          remote.send(('close', None))
+          remote.recv()
+        except (BrokenPipeError, EOFError):
+          pass
+      process.join(timeout=5)
+      remote.close()
+    self._buffers = None
+    if self._shm is not None:
+      self._shm.close()
+      self._shm.unlink()
+
+  def __del__(self):
+    if not getattr(self, '_closed', True):
+      self.close()
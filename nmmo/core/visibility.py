@@ -0,0 +1,122 @@
+from typing import List, Set
+
+import numpy as np
+
+from nmmo.entity.entity import EntityState
+
+"""
+Visibility finds the entities seen by each agent, once per tick, so that the
+observations, the action target masks and the task predicates all share it.
+
+The entities are sorted into cells as wide as the vision window, so each agent
+only checks the entities in the (at most) 2x2 cells overlapping its window.
+The result is a CSR neighbor list: the visible entities of the i-th agent are
+entities[indices[indptr[i]:indptr[i+1]]], in the order of the Entity table,
+i.e. the same rows as Entity.Query.window(), truncated to the first
+max_visible rows, as in the entity obs. distance holds the l-inf distance of
+each of these entities to the agent.
+"""
+
+EntityAttr = EntityState.State.attr_name_to_col
+
+class Visibility:
+  def __init__(self, entities: np.ndarray, agent_ids: List[int],
+               radius: int, max_visible: int):
+    '''
+    Args:
+      entities: rows of the live entities, e.g. Entity.Query.table()
+      agent_ids: ids of the agents, which must be in entities
+      radius: vision radius
+      max_visible: max number of visible entities per agent
+    '''
+    self.entities = entities
+    self.agent_ids = list(agent_ids)
+    self._agent_idx = {agent_id: i for i, agent_id in enumerate(self.agent_ids)}
+    self._visible_ids = {}
+
+    num_agents = len(self.agent_ids)
+    ent_r = entities[:, EntityAttr["row"]].astype(np.int64)
+    ent_c = entities[:, EntityAttr["col"]].astype(np.int64)
+    ent_row = {ent_id: i for i, ent_id in enumerate(entities[:, EntityAttr["id"]].tolist())}
+    agent_rows = np.array([ent_row[agent_id] for agent_id in self.agent_ids], dtype=np.int64)
+    agent_r, agent_c = ent_r[agent_rows], ent_c[agent_rows]
+
+    # sort the entities by cell. The extra, empty column of cells catches the
+    #   keys of the windows that cross the left or right edge
+    cell = 2*radius + 1
+    stride = (int(ent_c.max()) // cell + 2) if len(entities) else 1
+    keys = (ent_r // cell) * stride + ent_c // cell
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+
+    # candidate entities in the cells overlapping each window
+    r_lo, r_hi = (agent_r - radius) // cell, (agent_r + radius) // cell
+    c_lo, c_hi = (agent_c - radius) // cell, (agent_c + radius) // cell
+    starts, counts = [], []
+    for r_delta in (0, 1):
+      for c_delta in (0, 1):
+        key = (r_lo + r_delta) * stride + c_lo + c_delta
+        start = np.searchsorted(sorted_keys, key, side="left")
+        end = np.searchsorted(sorted_keys, key, side="right")
+        in_window = (r_lo + r_delta <= r_hi) & (c_lo + c_delta <= c_hi)
+        starts.append(start)
+        counts.append(np.where(in_window, end - start, 0))
+    starts, counts = np.concatenate(starts), np.concatenate(counts)
+    owner = np.repeat(np.tile(np.arange(num_agents), 4), counts)
+    offsets = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+    candidates = order[offsets]
+
+    distance = np.maximum(np.abs(ent_r[candidates] - agent_r[owner]),
+                          np.abs(ent_c[candidates] - agent_c[owner]))
+    visible = distance <= radius
+    candidates, owner, distance = candidates[visible], owner[visible], distance[visible]
+
+    # group by agent in the table order, and keep the first max_visible
+    by_agent = np.lexsort((candidates, owner))
+    candidates, owner, distance = candidates[by_agent], owner[by_agent], distance[by_agent]
+    first = np.searchsorted(owner, np.arange(num_agents))
+    self._rank = np.arange(len(owner)) - first[owner]
+    keep = self._rank < max_visible
+    self._rank, self._owner = self._rank[keep], owner[keep]
+    self.indices, self.distance = candidates[keep], distance[keep]
+    self.indptr = np.zeros(num_agents + 1, dtype=np.int64)
+    np.cumsum(np.bincount(self._owner, minlength=num_agents), out=self.indptr[1:])
+
+  @staticmethod
+  def from_realm(realm):
+    config = realm.config
+    return Visibility(EntityState.Query.table(realm.datastore), list(realm.players),
+                      config.PLAYER_VISION_RADIUS, config.PLAYER_N_OBS)
+
+  def _slice(self, agent_id):
+    idx = self._agent_idx.get(agent_id)
+    if idx is None:
+      return slice(0, 0)
+    return slice(self.indptr[idx], self.indptr[idx+1])
+
+  def visible_entities(self, agent_id: int) -> np.ndarray:
+    '''Entity rows seen by the agent. Empty if the agent is not present'''
+    return self.entities[self.indices[self._slice(agent_id)]]
+
+  def visible_distance(self, agent_id: int) -> np.ndarray:
+    '''l-inf distance of visible_entities() to the agent'''
+    return self.distance[self._slice(agent_id)]
+
+  def visible_ids(self, agent_id: int) -> Set[int]:
+    '''Ids of the entities seen by the agent'''
+    if agent_id not in self._visible_ids:
+      self._visible_ids[agent_id] = set(
+        self.entities[self.indices[self._slice(agent_id)], EntityAttr["id"]].tolist())
+    return self._visible_ids[agent_id]
+
+  def distance_matrix(self, agent_ids, num_cols: int) -> np.ndarray:
+    '''[len(agent_ids), num_cols] array, whose i-th row holds the
+       visible_distance() of agent_ids[i], zero padded'''
+    out = np.zeros((len(agent_ids), num_cols), dtype=np.int64)
+    slot = {agent_id: i for i, agent_id in enumerate(agent_ids)}
+    rows = np.array([slot.get(agent_id, -1) for agent_id in self.agent_ids], dtype=np.int64)
+    if len(self._owner):
+      pair_rows = rows[self._owner]
+      present = (pair_rows >= 0) & (self._rank < num_cols)
+      out[pair_rows[present], self._rank[present]] = self.distance[present]
+    return out
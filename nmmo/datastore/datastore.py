@@ -26,6 +26,8 @@ class DataTable:
   def __init__(self, num_columns: int):
     self._num_columns = num_columns
     self._id_allocator = IdAllocator(100)
+    # tick of the world being written, which stamps the changes, see delta_since()
+    self.write_tick = 0
 
   def reset(self):
     self._id_allocator = IdAllocator(100)
@@ -36,6 +38,12 @@ class DataTable:
   def get(self, ids: List[id]):
     raise NotImplementedError
 
+  def view(self):
+    raise NotImplementedError
+
+  def get_index(self, col: int) -> Dict:
+    raise NotImplementedError
+
   def where_in(self, col: int, values: List):
     raise NotImplementedError
 
@@ -54,9 +62,24 @@ class DataTable:
   def add_row(self) -> int:
     raise NotImplementedError
 
+  def add_rows(self, num_rows: int) -> List[int]:
+    raise NotImplementedError
+
+  def remove_rows(self, row_ids: List[int]):
+    raise NotImplementedError
+
   def is_empty(self) -> bool:
     raise NotImplementedError
 
+  def delta_since(self, tick: int):
+    raise NotImplementedError
+
+  def save_state(self):
+    raise NotImplementedError
+
+  def load_state(self, state):
+    raise NotImplementedError
+
 class DatastoreRecord:
   def __init__(self, datastore, table: DataTable, row_id: int) -> None:
     self.datastore = datastore
@@ -76,9 +99,9 @@ class Datastore:
   def __init__(self) -> None:
     self._tables: Dict[str, DataTable] = {}
 
-  def register_object_type(self, object_type: str, num_colums: int):
+  def register_object_type(self, object_type: str, num_colums: int, dtypes: List = None):
     if object_type not in self._tables:
-      self._tables[object_type] = self._create_table(num_colums)
+      self._tables[object_type] = self._create_table(num_colums, dtypes)
 
   def create_record(self, object_type: str) -> DatastoreRecord:
     table = self._tables[object_type]
@@ -88,5 +111,30 @@ class Datastore:
   def table(self, object_type: str) -> DataTable:
     return self._tables[object_type]
 
-  def _create_table(self, num_columns: int) -> DataTable:
+  @property
+  def tables(self) -> List[DataTable]:
+    return list(self._tables.values())
+
+  def save_state(self) -> Dict:
+    return {name: table.save_state() for name, table in self._tables.items()}
+
+  def load_state(self, state: Dict):
+    for name, table_state in state.items():
+      self._tables[name].load_state(table_state)
+
+  def begin_write(self, tick: int):
+    '''Called before the env modifies the tables to the world at tick'''
+    for table in self._tables.values():
+      table.write_tick = tick
+
+  def end_write(self, tick: int):
+    '''Called once the tables hold the world at tick'''
+    # any later change is part of the next tick
+    for table in self._tables.values():
+      table.write_tick = tick + 1
+
+  def close(self):
+    '''Release the resources held by the tables'''
+
+  def _create_table(self, num_columns: int, dtypes: List = None) -> DataTable:
     raise NotImplementedError
@@ -1,21 +1,57 @@
-from ordered_set import OrderedSet
+from collections import deque
+from typing import Iterable, List
 
 class IdAllocator:
+  '''Hands out the free row ids in first-in, first-out order: the initial
+     ids in increasing order, then the removed ids in the order of removal.
+
+     The free ids are kept in a deque, with a set for the membership checks,
+     so that all operations are O(1) per id
+  '''
   def __init__(self, max_id):
     # Key 0 is reserved as padding
     self.max_id = 1
-    self.free = OrderedSet()
+    self.free = deque()
+    self._free_set = set()
     self.expand(max_id)
 
   def full(self):
     return len(self.free) == 0
 
   def remove(self, row_id):
-    self.free.add(row_id)
+    if row_id not in self._free_set:
+      self._free_set.add(row_id)
+      self.free.append(row_id)
+
+  def free_many(self, row_ids: Iterable[int]):
+    for row_id in row_ids:
+      self.remove(row_id)
 
   def allocate(self):
-    return self.free.pop(0)
+    if not self.free:
+      raise KeyError('No free ids')
+    row_id = self.free.popleft()
+    self._free_set.remove(row_id)
+    return row_id
+
+  def allocate_many(self, num_ids: int) -> List[int]:
+    if num_ids > len(self.free):
+      raise KeyError(f'Cannot allocate {num_ids} ids, only {len(self.free)} are free')
+    popleft = self.free.popleft
+    row_ids = [popleft() for _ in range(num_ids)]
+    self._free_set.difference_update(row_ids)
+    return row_ids
 
   def expand(self, max_id):
-    self.free.update(range(self.max_id, max_id))
-    self.max_id = max_id
+    new_ids = range(self.max_id, max_id)
+    self.free.extend(new_ids)
+    self._free_set.update(new_ids)
+    self.max_id = max(self.max_id, max_id)
+
+  def save_state(self):
+    return self.max_id, list(self.free)
+
+  def load_state(self, state):
+    self.max_id, free = state
+    self.free = deque(free)
+    self._free_set = set(free)
@@ -1,38 +1,150 @@
-from typing import List
+from typing import Dict, List
 
 import numpy as np
 
 from nmmo.datastore.datastore import Datastore, DataTable
 
 
+def saturation_bounds(dtype):
+  '''Range of the values that a column of dtype can hold'''
+  dtype = np.dtype(dtype)
+  if np.issubdtype(dtype, np.integer):
+    info = np.iinfo(dtype)
+    return int(info.min), int(info.max)
+  return -np.inf, np.inf
+
 class NumpyTable(DataTable):
-  def __init__(self, num_columns: int, initial_size: int, dtype=np.int16):
+  def __init__(self, num_columns: int, initial_size: int, dtype=np.int16,
+               col_dtypes: List = None):
+    '''All columns are stored in ONE array of their widest dtype, see storage_dtype,
+       so that the rows stay plain arrays. A single wide column thus widens the whole
+       table, and narrow columns take no less memory. The col_dtypes only set the
+       range each column saturates to on writes.
+
+       Args:
+         dtype: dtype of all columns, if col_dtypes is not given
+         col_dtypes: optional per-column value dtypes, i.e. saturation ranges
+    '''
     super().__init__(num_columns)
-    self._dtype  = dtype
+    if col_dtypes is None:
+      col_dtypes = [dtype] * num_columns
+    assert len(col_dtypes) == num_columns, "col_dtypes must have one dtype per column"
+    self.col_dtypes = [np.dtype(col_dtype) for col_dtype in col_dtypes]
+    self._dtype = np.result_type(*self.col_dtypes)
+    self._bounds = [saturation_bounds(col_dtype) for col_dtype in self.col_dtypes]
     self._initial_size = initial_size
     self._max_rows = 0
-    self._data = np.zeros((0, self._num_columns), dtype=self._dtype)
+    self._data = self._alloc(0)
+    # write_tick of the last change of each row, -1 for the free rows,
+    #   and write_tick of the removal of each free row, -1 for the others, see delta_since()
+    self._modified = np.zeros(0, dtype=np.int64)
+    self._removed = np.zeros(0, dtype=np.int64)
     self._expand(self._initial_size)
 
+    # optional hash indexes, see enable_index()
+    self._indexes = {} # col -> {value: row ids}
+
   def reset(self):
     super().reset() # resetting _id_allocator
     self._max_rows = 0
-    self._data = np.zeros((0, self._num_columns), dtype=self._dtype)
+    self._data = self._alloc(0)
+    self._modified = np.zeros(0, dtype=np.int64)
+    self._removed = np.zeros(0, dtype=np.int64)
     self._expand(self._initial_size)
+    self._rebuild_indexes()
+
+  def enable_index(self, col: int):
+    '''Map each nonzero value of the column to its row ids, so that
+       where_eq() and where_in() on the column only touch the matching rows.
+
+       The index is updated incrementally by update() and remove_row()
+    '''
+    self._indexes[col] = {}
+    self._rebuild_indexes()
+
+  def _rebuild_indexes(self):
+    for col, index in self._indexes.items():
+      index.clear()
+      values = self._data[:, col]
+      for row_id in np.flatnonzero(values).tolist():
+        self._index_value(index, values[row_id].item(), row_id)
+
+  @staticmethod
+  def _index_value(index, value, row_id: int):
+    if value in index:
+      index[value].add(row_id)
+    else:
+      index[value] = {row_id}
+
+  @staticmethod
+  def _unindex_value(index, value, row_id: int):
+    rows = index[value]
+    rows.discard(row_id)
+    if not rows:
+      del index[value]
 
   def update(self, row_id: int, col: int, value):
+    low, high = self._bounds[col]
+    if value > high:
+      value = high
+    elif value < low:
+      value = low
+    self._modified[row_id] = self.write_tick
+
+    if col in self._indexes:
+      self._update_indexed(row_id, col, value)
+    else:
+      self._data[row_id, col] = value
+
+  def _update_indexed(self, row_id: int, col: int, value):
+    old_value = self._data[row_id, col].item()
     self._data[row_id, col] = value
+    new_value = self._data[row_id, col].item() # after the cast to the table dtype
+    if old_value != new_value:
+      index = self._indexes[col]
+      if old_value != 0:
+        self._unindex_value(index, old_value, row_id)
+      if new_value != 0:
+        self._index_value(index, new_value, row_id)
+
+  @property
+  def storage_dtype(self) -> np.dtype:
+    '''dtype of the table array, shared by all columns'''
+    return self._dtype
 
   def get(self, ids: List[int]):
     return self._data[ids]
 
+  def view(self) -> np.ndarray:
+    '''Read-only view of all rows, including the padding row 0 and the free
+       rows, which are zeroed. It follows the updates, until the table is
+       reallocated by an expansion, reset() or load_state()'''
+    data = self._data.view()
+    data.flags.writeable = False
+    return data
+
+  def get_index(self, col: int) -> Dict:
+    '''The live {value: row ids} hash index of the column, see enable_index().
+       It must not be modified'''
+    return self._indexes[col]
+
   def where_eq(self, col: int, value):
+    index = self._indexes.get(col)
+    if index is not None and value != 0:
+      # in row id order, as the full scan
+      return self._data[sorted(index.get(value, ()))]
     return self._data[self._data[:,col] == value]
 
   def where_neq(self, col: int, value):
     return self._data[self._data[:,col] != value]
 
   def where_in(self, col: int, values: List):
+    index = self._indexes.get(col)
+    if index is not None and 0 not in values:
+      row_ids = set()
+      for value in values:
+        row_ids.update(index.get(value, ()))
+      return self._data[sorted(row_ids)]
     return self._data[np.isin(self._data[:,col], values)]
 
   def window(self, row_idx: int, col_idx: int, row: int, col: int, radius: int):
@@ -45,20 +157,92 @@ class NumpyTable(DataTable):
     if self._id_allocator.full():
       self._expand(self._max_rows * 2)
     row_id = self._id_allocator.allocate()
+    self._modified[row_id] = self.write_tick
+    self._removed[row_id] = -1
     return row_id
 
   def remove_row(self, row_id: int) -> int:
     self._id_allocator.remove(row_id)
+    for col, index in self._indexes.items():
+      value = self._data[row_id, col].item()
+      if value != 0:
+        self._unindex_value(index, value, row_id)
     self._data[row_id] = 0
+    self._modified[row_id] = -1
+    self._removed[row_id] = self.write_tick
+
+  def add_rows(self, num_rows: int) -> List[int]:
+    '''Allocate num_rows rows at once, in the same order as add_row()'''
+    num_free = len(self._id_allocator.free)
+    if num_free < num_rows:
+      self._expand(max(self._max_rows * 2, self._max_rows + num_rows - num_free))
+    row_ids = self._id_allocator.allocate_many(num_rows)
+    self._modified[row_ids] = self.write_tick
+    self._removed[row_ids] = -1
+    return row_ids
+
+  def remove_rows(self, row_ids: List[int]):
+    '''Free the rows at once, as remove_row() for each of them'''
+    row_ids = list(row_ids)
+    self._id_allocator.free_many(row_ids)
+    for col, index in self._indexes.items():
+      for row_id, value in zip(row_ids, self._data[row_ids, col].tolist()):
+        if value != 0:
+          self._unindex_value(index, value, row_id)
+    self._data[row_ids] = 0
+    self._modified[row_ids] = -1
+    self._removed[row_ids] = self.write_tick
+
+  def _alloc(self, num_rows: int) -> np.ndarray:
+    '''Zeroed array for num_rows rows, which becomes _data'''
+    return np.zeros((num_rows, self._num_columns), dtype=self._dtype)
 
   def _expand(self, max_rows: int):
     assert max_rows > self._max_rows
-    data = np.zeros((max_rows, self._num_columns), dtype=self._dtype)
+    data = self._alloc(max_rows)
     data[:self._max_rows] = self._data
+    modified = np.full(max_rows, -1, dtype=np.int64)
+    modified[:self._max_rows] = self._modified
+    self._modified = modified
+    removed = np.full(max_rows, -1, dtype=np.int64)
+    removed[:self._max_rows] = self._removed
+    self._removed = removed
     self._max_rows = max_rows
     self._id_allocator.expand(max_rows)
     self._data = data
 
+  def delta_since(self, tick: int):
+    '''Changes made after the table held the world at tick, i.e. since the
+       end_write(tick) of the datastore. Applying the removals, then the rows,
+       to the table at tick gives the current table.
+
+       The ticks restart with every episode, so a consumer must take the
+       whole table again after reset() or load_state()
+
+    Returns:
+      row_ids: ids of the rows added or updated since tick
+      rows: their current values, a [len(row_ids), num_columns] array
+      removed_ids: ids of the rows removed since tick, and still free
+    '''
+    row_ids = np.flatnonzero(self._modified > tick)
+    removed_ids = np.flatnonzero(self._removed > tick)
+    return row_ids, self._data[row_ids], removed_ids
+
+  def save_state(self):
+    return (self._data.copy(), self._id_allocator.save_state(),
+            self._modified.copy(), self._removed.copy())
+
+  def load_state(self, state):
+    data, allocator_state, modified, removed = state
+    # copy, so that the same state can be loaded again
+    self._data = self._alloc(data.shape[0])
+    self._data[:] = data
+    self._modified = modified.copy()
+    self._removed = removed.copy()
+    self._max_rows = data.shape[0]
+    self._id_allocator.load_state(allocator_state)
+    self._rebuild_indexes()
+
   def is_empty(self) -> bool:
     all_data_zero = np.sum(self._data)==0
     # 0th row is reserved as padding, so # of free ids is _max_rows-1
@@ -66,5 +250,5 @@ class NumpyTable(DataTable):
     return all_data_zero and all_id_free
 
 class NumpyDatastore(Datastore):
-  def _create_table(self, num_columns: int) -> DataTable:
-    return NumpyTable(num_columns, 100)
+  def _create_table(self, num_columns: int, dtypes: List = None) -> DataTable:
+    return NumpyTable(num_columns, 100, col_dtypes=dtypes)
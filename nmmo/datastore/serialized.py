@@ -4,7 +4,11 @@ from ast import Tuple
 import math
 from types import SimpleNamespace
 from typing import Dict, List
+
+import numpy as np
+
 from nmmo.datastore.datastore import Datastore, DatastoreRecord
+from nmmo.datastore.numpy_datastore import saturation_bounds
 
 """
 This code defines classes for serializing and deserializing data
@@ -16,33 +20,55 @@ as well as enforcing minimum and maximum bounds on the value.
 
 The SerializedState class serves as a base class for creating
 serialized representations of specific types of data, using a
-list of attribute names to define the structure of the data.
+list of attribute names to define the structure of the data,
+and optional per-attribute dtypes (int16 by default), the ranges the values
+saturate to. The table stores all its columns in their widest dtype.
 The subclass method is a factory method for creating subclasses
 of SerializedState that are tailored to specific types of data.
 """
 
 class SerializedAttribute():
+  # slots, since there is one attribute per column of every entity, item and tile
+  __slots__ = ('_name', '_record', '_table', '_row_id',
+               '_column', '_min', '_max', '_val')
+
   def __init__(self,
       name: str,
       datastore_record: DatastoreRecord,
       column: int, min_val=-math.inf, max_val=math.inf) -> None:
     self._name = name
-    self.datastore_record = datastore_record
     self._column = column
     self._min = min_val
     self._max = max_val
     self._val = 0
+    self.datastore_record = datastore_record
 
   @property
   def val(self):
     return self._val
 
+  @property
+  def datastore_record(self) -> DatastoreRecord:
+    return self._record
+
+  @datastore_record.setter
+  def datastore_record(self, datastore_record: DatastoreRecord):
+    # write to the table directly, skipping DatastoreRecord.update
+    self._record = datastore_record
+    self._table = datastore_record.table
+    self._row_id = datastore_record.id
+
+  def rebind(self, datastore_record: DatastoreRecord):
+    '''Recycle the attribute for a new record, keeping the limits'''
+    self.datastore_record = datastore_record
+    self._val = 0
+
   def update(self, value):
     if value > self._max:
       value = self._max
     elif value < self._min:
       value = self._min
-    self.datastore_record.update(self._column, value)
+    self._table.update(self._row_id, self._column, value)
     self._val = value
 
   @property
@@ -85,29 +111,49 @@ class SerializedAttribute():
 
 class SerializedState():
   @staticmethod
-  def subclass(name: str, attributes: List[str]):
+  def subclass(name: str, attributes: List[str], dtypes: Dict[str, type] = None):
+    dtypes = dtypes or {}
+    assert set(dtypes) <= set(attributes), f"Unknown attributes in dtypes: {dtypes}"
+    col_dtypes = [np.dtype(dtypes.get(a, np.int16)) for a in attributes]
+    # the values each column can hold, so that the attributes clamp as the table does
+    col_bounds = [saturation_bounds(dt) for dt in col_dtypes]
+
     class Subclass(SerializedState):
       _name = name
       State = SimpleNamespace(
         attr_name_to_col = {a: i for i, a in enumerate(attributes)},
         num_attributes = len(attributes),
+        dtypes = col_dtypes,
         table = lambda ds: ds.table(name)
       )
 
       def __init__(self, datastore: Datastore,
-                   limits: Dict[str, Tuple[float, float]] = None):
+                   limits: Dict[str, Tuple[float, float]] = None,
+                   recycled: Dict[str, SerializedAttribute] = None):
 
         limits = limits or {}
         self.datastore_record = datastore.create_record(name)
 
+        if recycled is not None:
+          # reuse the attributes of a deleted object, which had the same limits
+          for attr in recycled.values():
+            attr.rebind(self.datastore_record)
+          self.__dict__.update(recycled)
+          return
+
         for attr, col in self.State.attr_name_to_col.items():
+          min_val, max_val = limits.get(attr, (-math.inf, math.inf))
+          col_min, col_max = col_bounds[col]
           try:
             setattr(self, attr,
               SerializedAttribute(attr, self.datastore_record, col,
-                *limits.get(attr, (-math.inf, math.inf))))
+                max(min_val, col_min), min(max_val, col_max)))
           except Exception as exc:
             raise RuntimeError('Failed to set attribute' + attr) from exc
 
+      def serialized_attributes(self) -> Dict[str, SerializedAttribute]:
+        return {attr: getattr(self, attr) for attr in self.State.attr_name_to_col}
+
       @classmethod
       def parse_array(cls, data) -> SimpleNamespace:
         # Takes in a data array and returns a SimpleNamespace object with
@@ -0,0 +1,230 @@
+from multiprocessing import resource_tracker, shared_memory
+from time import sleep
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from nmmo.datastore.numpy_datastore import NumpyDatastore, NumpyTable
+
+"""
+SharedMemoryDatastore keeps the tables in named shared memory segments, so that
+other processes (renderers, metrics collectors, learners) can read the live
+world without pickling or copying it through the env process.
+
+For a datastore named `name`, the segments are
+  name: the datastore header, [seq, tick], both int64
+  name_<object type>: the table header, [generation, num rows, num columns, dtype]
+  name_<object type>_<generation>: the table rows, a C-ordered [num rows, num columns] array
+
+A table gets a new data segment, and its header a new generation, whenever it is
+reallocated by an expansion, a reset or a load. The old segment is unlinked.
+
+The seq counter is a seqlock: it is odd while the env writes (the whole reset()
+or step()) and even in between, when tick is the tick of the world in the tables.
+SharedMemoryReader copies the tables out, and retries if seq changed meanwhile.
+"""
+
+SEQ, TICK = range(2)
+GENERATION, NUM_ROWS, NUM_COLUMNS, DTYPE = range(4)
+
+def _create(name: str, size: int) -> shared_memory.SharedMemory:
+  return shared_memory.SharedMemory(name, create=True, size=size)
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+  # the readers must not unlink the segments on exit, so they are not tracked.
+  #   Unregistering them afterwards instead would also untrack the segments of
+  #   the env, when the reader shares its resource tracker
+  try:
+    # pylint: disable=unexpected-keyword-arg
+    return shared_memory.SharedMemory(name, track=False) # python >= 3.13
+  except TypeError:
+    pass
+  register = resource_tracker.register
+  resource_tracker.register = lambda name, rtype: None
+  try:
+    return shared_memory.SharedMemory(name)
+  finally:
+    resource_tracker.register = register
+
+def _view(shm: shared_memory.SharedMemory, shape, dtype) -> np.ndarray:
+  # unlike np.ndarray(buffer=...), frombuffer() holds the buffer, so that
+  #   closing the segment raises BufferError while any array views it
+  return np.frombuffer(shm.buf, dtype=dtype, count=int(np.prod(shape))).reshape(shape)
+
+class SharedNumpyTable(NumpyTable):
+  def __init__(self, name: str, num_columns: int, initial_size: int, col_dtypes: List = None):
+    self._name = name
+    self._header_shm = _create(name, 4 * 8)
+    self._header = _view(self._header_shm, 4, np.int64)
+    self._header[:] = 0
+    self._segment = None # holds _data, if it has rows
+    self._retired = [] # unlinked segments, closed once _data no longer views them
+    super().__init__(num_columns, initial_size, col_dtypes=col_dtypes)
+
+  def _alloc(self, num_rows: int) -> np.ndarray:
+    if num_rows == 0:
+      # zero-sized segments are not allowed. The table is only empty inside reset()
+      return super()._alloc(0)
+
+    generation = int(self._header[GENERATION]) + 1
+    segment = _create(f"{self._name}_{generation}",
+                      num_rows * self._num_columns * self._dtype.itemsize)
+    data = _view(segment, (num_rows, self._num_columns), self._dtype)
+    data[:] = 0
+    if self._segment is not None:
+      self._segment.unlink()
+      self._retired.append(self._segment)
+    self._segment = segment
+    self._close_retired()
+
+    self._header[NUM_ROWS] = num_rows
+    self._header[NUM_COLUMNS] = self._num_columns
+    self._header[DTYPE] = ord(self._dtype.char)
+    self._header[GENERATION] = generation
+    return data
+
+  def _close_retired(self):
+    retired, self._retired = self._retired, []
+    for segment in retired:
+      try:
+        segment.close()
+      except BufferError:
+        # arrays still view the segment, e.g. the _data being copied by _expand()
+        self._retired.append(segment)
+
+  def close(self):
+    '''Unlink the segments. The table must not be used afterwards'''
+    self._data = self._alloc(0)
+    if self._segment is not None:
+      self._segment.unlink()
+      self._retired.append(self._segment)
+      self._segment = None
+    self._close_retired()
+    self._header = None
+    self._header_shm.close()
+    self._header_shm.unlink()
+
+class SharedMemoryDatastore(NumpyDatastore):
+  '''NumpyDatastore whose tables can be read by other processes, see SharedMemoryReader
+
+  Args:
+    name: prefix of the shared memory segment names, unique on the host
+  '''
+  def __init__(self, name: str) -> None:
+    super().__init__()
+    self.name = name
+    self._header_shm = _create(name, 2 * 8)
+    self._header = _view(self._header_shm, 2, np.int64)
+    self._header[SEQ] = 1 # odd, until the first end_write()
+    self._header[TICK] = 0
+
+  def register_object_type(self, object_type: str, num_colums: int, dtypes: List = None):
+    # the segments are named after the object type
+    if object_type not in self._tables:
+      self._tables[object_type] = SharedNumpyTable(
+        f"{self.name}_{object_type}", num_colums, 100, col_dtypes=dtypes)
+
+  def begin_write(self, tick: int):
+    super().begin_write(tick)
+    if self._header[SEQ] % 2 == 0:
+      self._header[SEQ] += 1
+
+  def end_write(self, tick: int):
+    super().end_write(tick)
+    if self._header[SEQ] % 2 == 1:
+      self._header[TICK] = tick
+      self._header[SEQ] += 1
+
+  def close(self):
+    for table in self.tables:
+      table.close()
+    self._header = None
+    self._header_shm.close()
+    self._header_shm.unlink()
+
+class SharedMemoryReader:
+  '''Reads the tables of a SharedMemoryDatastore from another process
+
+  Args:
+    name: name of the SharedMemoryDatastore
+    object_types: tables to read, e.g. ["Entity", "Item"]
+  '''
+  def __init__(self, name: str, object_types: List[str]):
+    self._header_shm = _attach(name)
+    self._header = _view(self._header_shm, 2, np.int64)
+    self._tables = {}
+    for object_type in object_types:
+      table_header_shm = _attach(f"{name}_{object_type}")
+      self._tables[object_type] = {
+        "name": f"{name}_{object_type}",
+        "header_shm": table_header_shm,
+        "header": _view(table_header_shm, 4, np.int64),
+        "generation": None,
+        "segment": None,
+        "data": None,
+      }
+
+  def _remap(self, table: Dict) -> bool:
+    '''Map the current data segment of the table. False if it was just replaced'''
+    header = table["header"]
+    generation = int(header[GENERATION])
+    if generation == table["generation"]:
+      return True
+    try:
+      segment = _attach(f"{table['name']}_{generation}")
+    except FileNotFoundError:
+      return False
+    try:
+      data = _view(segment, (int(header[NUM_ROWS]), int(header[NUM_COLUMNS])),
+                   np.dtype(chr(header[DTYPE])))
+    except (TypeError, ValueError):
+      # the header is being rewritten
+      segment.close()
+      return False
+    data.flags.writeable = False
+    if table["segment"] is not None:
+      table["data"] = None
+      table["segment"].close()
+    table.update(generation=generation, segment=segment, data=data)
+    return True
+
+  def read(self, timeout: float = None) -> Tuple[int, Dict[str, np.ndarray]]:
+    '''Copy out the tables, all from the same tick
+
+    Args:
+      timeout: seconds to wait for the env to finish writing, None to wait forever
+
+    Returns:
+      tick, {object type: copy of the whole table, including the free rows}
+    '''
+    waited = 0.0
+    while True:
+      seq = int(self._header[SEQ])
+      if seq % 2 == 0 and all(self._remap(table) for table in self._tables.values()):
+        tick = int(self._header[TICK])
+        tables = {object_type: table["data"].copy()
+                  for object_type, table in self._tables.items()}
+        if int(self._header[SEQ]) == seq:
+          return tick, tables
+        # the mappings may come from a header that was being rewritten
+        for table in self._tables.values():
+          table["generation"] = None
+      if timeout is not None and waited > timeout:
+        raise TimeoutError("The tables are being written")
+      sleep(0.0005)
+      waited += 0.0005
+
+  @property
+  def tick(self) -> int:
+    '''Tick of the last completed write'''
+    return int(self._header[TICK])
+
+  def close(self):
+    for table in self._tables.values():
+      table["data"] = None
+      table["header"] = None
+      if table["segment"] is not None:
+        table["segment"].close()
+      table["header_shm"].close()
+    self._header = None
+    self._header_shm.close()
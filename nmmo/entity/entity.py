@@ -51,7 +51,14 @@ EntityState = SerializedState.subclass(
     "carving_exp",
     "alchemy_level",
     "alchemy_exp",
-  ])
+  ],
+  # gold and exp keep growing over long episodes, which int16 cannot hold.
+  #   NOTE: this widens the storage of the whole Entity table to int32
+  dtypes={
+    "gold": np.int32,
+    **{f"{skill}_exp": np.int32 for skill in [
+      "melee", "range", "mage", "fishing", "herbalism", "prospecting", "carving", "alchemy"]},
+  })
 
 EntityState.Limits = lambda config: {
   **{
@@ -242,7 +249,11 @@ class History:
 # pylint: disable=no-member
 class Entity(EntityState):
   def __init__(self, realm, pos, entity_id, name):
-    super().__init__(realm.datastore, EntityState.Limits(realm.config))
+    if realm.entity_pool:
+      # see Config.FAST_RESET
+      super().__init__(realm.datastore, recycled=realm.entity_pool.pop())
+    else:
+      super().__init__(realm.datastore, EntityState.Limits(realm.config))
 
     self.realm = realm
     self.config: Config = realm.config
@@ -49,6 +49,8 @@ class EntityGroup(Mapping):
         for item in list(ent.inventory.items):
           item.destroy()
       ent.datastore_record.delete()
+      if self.config.FAST_RESET:
+        self.realm.entity_pool.append(ent.serialized_attributes())
 
     self.entities = {}
     self.dead_this_tick = {}
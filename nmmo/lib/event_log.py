@@ -1,5 +1,5 @@
 from types import SimpleNamespace
-from typing import List
+from typing import Dict, Iterable, List, Tuple
 from copy import deepcopy
 
 import numpy as np
@@ -49,6 +49,71 @@ LEVEL_COL_MAP = { 'skill': EventAttr['type'] }
 EXPLORE_COL_MAP = { 'distance': EventAttr['number'] }
 
 
+class EventTotals:
+  '''Running totals of the recorded events, by agent and event code, so that
+     the event predicates do not rescan the whole event log every tick'''
+  COUNT, NUMBER, GOLD = range(3)
+
+  def __init__(self, totals: Dict = None, counts: Dict = None):
+    # (ent_id, event code) -> {(type, level): [count, sum of number, sum of gold]}
+    self._totals: Dict[Tuple[int, int], Dict[Tuple[int, int], List[int]]] = totals or {}
+    # event code -> count of each ent_id >= 0, indexed by ent_id, see counts()
+    self._counts: Dict[int, np.ndarray] = counts or {}
+
+  def add(self, ent_id: int, event_code: int, type_id: int, level: int, number: int, gold: int):
+    if ent_id >= 0:
+      counts = self._counts.get(event_code)
+      if counts is None or ent_id >= len(counts):
+        grown = np.zeros(max(2 * ent_id + 1, 64), dtype=np.int64)
+        if counts is not None:
+          grown[:len(counts)] = counts
+        counts = self._counts[event_code] = grown
+      counts[ent_id] += 1
+
+    by_type = self._totals.setdefault((ent_id, event_code), {})
+    total = by_type.get((type_id, level))
+    if total is None:
+      by_type[(type_id, level)] = [1, number, gold]
+    else:
+      total[0] += 1
+      total[1] += number
+      total[2] += gold
+
+  def get(self, ent_ids: Iterable[int], event_code: int,
+          type_id: int = None, min_level: int = None) -> List[int]:
+    '''[count, sum of number, sum of gold] of the events of the agents,
+       only of type_id and of level >= min_level, if given'''
+    result = [0, 0, 0]
+    for ent_id in ent_ids:
+      for (typ, level), total in self._totals.get((ent_id, event_code), {}).items():
+        if (type_id is None or typ == type_id) and (min_level is None or level >= min_level):
+          result[0] += total[0]
+          result[1] += total[1]
+          result[2] += total[2]
+    return result
+
+  def counts(self, ent_ids: np.ndarray, event_code: int) -> np.ndarray:
+    '''Number of events of event_code of each of ent_ids, i.e. get()[COUNT]
+       of each, in one lookup'''
+    ent_ids = np.asarray(ent_ids)
+    counts = self._counts.get(event_code)
+    if counts is None:
+      return np.zeros(len(ent_ids), dtype=np.int64)
+    inside = (ent_ids >= 0) & (ent_ids < len(counts))
+    result = np.where(inside, counts[np.where(inside, ent_ids, 0)], 0)
+    for idx in np.flatnonzero(ent_ids < 0).tolist():
+      result[idx] = self.get((int(ent_ids[idx]),), event_code)[self.COUNT]
+    return result
+
+  def clear(self):
+    self._totals.clear()
+    self._counts.clear()
+
+  def copy(self):
+    return EventTotals({key: {k: list(total) for k, total in by_type.items()}
+                        for key, by_type in self._totals.items()},
+                       {code: counts.copy() for code, counts in self._counts.items()})
+
 class EventLogger(EventCode):
   def __init__(self, realm):
     self.realm = realm
@@ -60,6 +125,7 @@ class EventLogger(EventCode):
     self._data_by_tick = {}
     self._last_tick = 0
     self._empty_data = np.empty((0, len(EventAttr)))
+    self.totals = EventTotals() # updated by record()
 
     # add synonyms to the attributes
     self.attr_to_col = deepcopy(EventAttr)
@@ -70,6 +136,16 @@ class EventLogger(EventCode):
 
   def reset(self):
     EventState.State.table(self.datastore).reset()
+    self.totals.clear()
+
+  def save_state(self):
+    # the per-tick data is never modified, so the arrays can be shared
+    return dict(self._data_by_tick), self._last_tick, self.totals.copy()
+
+  def load_state(self, state):
+    data_by_tick, self._last_tick, totals = state
+    self._data_by_tick = dict(data_by_tick)
+    self.totals = totals.copy()
 
   # define event logging
   def _create_event(self, entity: Entity, event_code: int):
@@ -83,18 +159,24 @@ class EventLogger(EventCode):
     return log
 
   def record(self, event_code: int, entity: Entity, **kwargs):
+    log = self._record(event_code, entity, **kwargs)
+    if log is not None:
+      # the values as stored, i.e. saturated to the column dtype and cast to int
+      self.totals.add(*(int(attr.val) for attr in (log.ent_id, log.event, log.type,
+                                                   log.level, log.number, log.gold)))
+
+  def _record(self, event_code: int, entity: Entity, **kwargs):
     if event_code in [EventCode.EAT_FOOD, EventCode.DRINK_WATER,
                       EventCode.GIVE_ITEM, EventCode.DESTROY_ITEM,
                       EventCode.GIVE_GOLD]:
       # Logs for these events are for counting only
-      self._create_event(entity, event_code)
-      return
+      return self._create_event(entity, event_code)
 
     if event_code == EventCode.GO_FARTHEST: # use EXPLORE_COL_MAP
       if ('distance' in kwargs and kwargs['distance'] > 0):
         log = self._create_event(entity, event_code)
         log.number.update(kwargs['distance'])
-        return
+        return log
 
     if event_code == EventCode.SCORE_HIT:
       # kwargs['combat_style'] should be Skill.CombatSkill
@@ -103,7 +185,7 @@ class EventLogger(EventCode):
         log = self._create_event(entity, event_code)
         log.type.update(kwargs['combat_style'].SKILL_ID)
         log.number.update(kwargs['damage'])
-        return
+        return log
 
     if event_code == EventCode.PLAYER_KILL:
       if ('target' in kwargs and isinstance(kwargs['target'], Entity)):
@@ -113,7 +195,7 @@ class EventLogger(EventCode):
 
         # CHECK ME: attack_level or "general" level?? need to clarify
         log.level.update(target.attack_level)
-        return
+        return log
 
     if event_code in [EventCode.CONSUME_ITEM, EventCode.HARVEST_ITEM, EventCode.EQUIP_ITEM,
                       EventCode.LOOT_ITEM]:
@@ -127,7 +209,7 @@ class EventLogger(EventCode):
         log.type.update(item.ITEM_TYPE_ID)
         log.level.update(item.level.val)
         log.number.update(item.quantity.val)
-        return
+        return log
 
     if event_code in [EventCode.LIST_ITEM, EventCode.BUY_ITEM]:
       if ('item' in kwargs and isinstance(kwargs['item'], Item)) & \
@@ -138,14 +220,14 @@ class EventLogger(EventCode):
         log.level.update(item.level.val)
         log.number.update(item.quantity.val)
         log.gold.update(kwargs['price'])
-        return
+        return log
 
     # NOTE: do we want to separate the source of income? from selling vs looting
     if event_code == EventCode.EARN_GOLD:
       if ('amount' in kwargs and kwargs['amount'] > 0):
         log = self._create_event(entity, event_code)
         log.gold.update(kwargs['amount'])
-        return
+        return log
 
     if event_code == EventCode.LEVEL_UP:
       # kwargs['skill'] should be Skill.Skill
@@ -154,7 +236,7 @@ class EventLogger(EventCode):
         log = self._create_event(entity, event_code)
         log.type.update(kwargs['skill'].SKILL_ID)
         log.level.update(kwargs['level'])
-        return
+        return log
 
     # If reached here, then something is wrong
     # CHECK ME: The below should be commented out after debugging
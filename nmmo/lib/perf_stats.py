@@ -0,0 +1,78 @@
+from time import perf_counter
+from typing import Dict
+
+import numpy as np
+
+"""
+PerfStats records the wall time of the phases of each tick, e.g. the action
+validation or the observations, into a ring buffer of the recent ticks.
+
+Phases are timed with lap(), which adds the time since the given start to the
+phase and returns the current time, to start the next phase:
+
+  start = perf.lap('validate_actions', start)
+
+The same phase can be timed several times per tick, in which case the times add
+up. Phases are only recorded between start_tick() and end_tick(), so lap() costs
+a single perf_counter() call outside of Env.step().
+"""
+
+class PerfStats:
+  def __init__(self, window: int):
+    self.window = window
+    self._phases: Dict[str, int] = {} # phase name -> column
+    self._times = np.zeros((window, 0))
+    self._tick_times = None
+    self._num_ticks = 0
+    self._active = False
+
+  def start_tick(self):
+    if self.window > 0:
+      self._tick_times = [0.0] * len(self._phases)
+      self._active = True
+
+  def end_tick(self):
+    if not self._active:
+      return
+    if self._times.shape[1] < len(self._phases):
+      self._times = np.pad(self._times, ((0, 0), (0, len(self._phases) - self._times.shape[1])))
+    row = self._times[self._num_ticks % self.window]
+    row[:] = 0
+    row[:len(self._tick_times)] = self._tick_times
+    self._num_ticks += 1
+    self._active = False
+
+  def lap(self, phase: str, start: float) -> float:
+    '''Add the time since start to the phase, and return the current time'''
+    now = perf_counter()
+    if self._active:
+      col = self._phases.get(phase)
+      if col is None:
+        col = self._phases[phase] = len(self._phases)
+      if col >= len(self._tick_times):
+        self._tick_times.extend([0.0] * (col + 1 - len(self._tick_times)))
+      self._tick_times[col] += now - start
+    return now
+
+  def stats(self) -> Dict[str, Dict[str, float]]:
+    '''Per phase statistics of the time per tick, in milliseconds,
+       over the recorded ticks in the window'''
+    num_rows = min(self._num_ticks, self.window)
+    if num_rows == 0:
+      return {}
+    times = self._times[:num_rows] * 1000
+    stats = {}
+    for phase, col in self._phases.items():
+      phase_times = times[:, col] if col < times.shape[1] else np.zeros(num_rows)
+      stats[phase] = {
+        'mean': float(phase_times.mean()),
+        'p50': float(np.percentile(phase_times, 50)),
+        'p99': float(np.percentile(phase_times, 99)),
+        'max': float(phase_times.max()),
+      }
+    return stats
+
+  @property
+  def num_ticks(self) -> int:
+    '''Number of ticks in the window'''
+    return min(self._num_ticks, self.window)
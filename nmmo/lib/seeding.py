@@ -21,6 +21,13 @@ class RandomNumberGenerator(np.random.Generator):
     self._dir_idx = (self._dir_idx + 1) & self._wrap
     return self._dir_seq[self._dir_idx]
 
+  def get_state(self):
+    return self.bit_generator.state, list(self._dir_seq), self._dir_idx
+
+  def set_state(self, state):
+    self.bit_generator.state, dir_seq, self._dir_idx = state
+    self._dir_seq = list(dir_seq)
+
 def np_random(seed: Optional[int] = None) -> Tuple[np.random.Generator, Any]:
   """Generates a random number generator from the seed and returns the Generator and seed.
 
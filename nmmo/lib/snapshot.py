@@ -0,0 +1,84 @@
+import io
+import pickle
+import types
+
+from nmmo.datastore.datastore import DatastoreRecord
+from nmmo.datastore.serialized import SerializedAttribute
+
+"""
+ObjectSnapshot keeps a detached copy of an object graph, e.g. the entities and
+items of a realm, to be restored any number of times.
+
+The graph is pickled in memory, which is much cheaper to load than deepcopy.
+Objects that live for the whole episode (env, realm, datastore, map, ...) are
+passed as the shared list, and are referenced rather than copied.
+The datastore records and serialized attributes are referenced as well,
+since their values are restored from the datastore snapshot: only the record
+and the python side value of each attribute are saved. Classes, functions and the ref_types
+instances are also referenced, which covers the dynamically created classes
+that cannot be pickled.
+"""
+
+REF_TYPES = (type, types.FunctionType, types.BuiltinFunctionType,
+             DatastoreRecord, SerializedAttribute)
+
+class _Pickler(pickle.Pickler):
+  def __init__(self, file, shared, ref_types):
+    super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+    self.shared = {id(obj): idx for idx, obj in enumerate(shared)}
+    self.ref_types = REF_TYPES + tuple(ref_types)
+    self.refs = []
+    self.ref_idx = {}
+
+  def persistent_id(self, obj):
+    idx = self.shared.get(id(obj))
+    if idx is not None:
+      return idx
+    if not isinstance(obj, self.ref_types):
+      return None
+    idx = self.ref_idx.get(id(obj))
+    if idx is None:
+      idx = self.ref_idx[id(obj)] = len(self.refs)
+      self.refs.append(obj)
+    return ('ref', idx)
+
+class _Unpickler(pickle.Unpickler):
+  def __init__(self, file, shared, refs):
+    super().__init__(file)
+    self.shared = shared
+    self.refs = refs
+
+  def persistent_load(self, pid):
+    if isinstance(pid, tuple):
+      return self.refs[pid[1]]
+    return self.shared[pid]
+
+class ObjectSnapshot:
+  '''Detached copy of obj, referencing the shared objects
+
+  Args:
+    obj: the object graph to copy
+    shared: objects to reference rather than copy
+    ref_types: additional types whose instances are referenced
+  '''
+  def __init__(self, obj, shared, ref_types=()):
+    buffer = io.BytesIO()
+    pickler = _Pickler(buffer, shared, ref_types)
+    pickler.dump(obj)
+    self._data = buffer.getvalue()
+    self._refs = pickler.refs
+    self._attrs = [ref for ref in self._refs if isinstance(ref, SerializedAttribute)]
+    # pylint: disable=protected-access
+    # attributes can be recycled for other records, see Config.FAST_RESET
+    self._attr_vals = [(attr.datastore_record, attr._val) for attr in self._attrs]
+
+  def restore(self, shared):
+    '''Returns a new copy of the object graph
+
+    Args:
+      shared: the objects to reference, in the same order as when saving
+    '''
+    for attr, (record, val) in zip(self._attrs, self._attr_vals):
+      attr.datastore_record = record
+      attr._val = val # pylint: disable=protected-access
+    return _Unpickler(io.BytesIO(self._data), shared, self._refs).load()
@@ -85,3 +85,15 @@ def in_bounds(r, c, shape, border=0):
     c < C - border
   )
 
+
+def space_buffers(space, batch_shape=(), alloc=np.zeros):
+  '''Allocate a (nested) dict of arrays matching a gym space
+
+  Args:
+    space: a gym space. Dict spaces are traversed recursively
+    batch_shape: leading dimensions prepended to each leaf shape
+    alloc: callable taking (shape, dtype) and returning an array
+  '''
+  if hasattr(space, 'spaces'): # gym.spaces.Dict
+    return {k: space_buffers(s, batch_shape, alloc) for k, s in space.spaces.items()}
+  return alloc(tuple(batch_shape) + tuple(space.shape), space.dtype)
@@ -5,12 +5,14 @@ import numpy as np
 from numpy import count_nonzero as count
 
 from nmmo.task.group import Group
-from nmmo.task.game_state import GameState
+from nmmo.task.game_state import GameState, EntityAttr
+from nmmo.task.predicate_api import batched_predicate, predicate_inputs
 from nmmo.systems import skill as nmmo_skill
 from nmmo.systems.skill import Skill
 from nmmo.systems.item import Item
 from nmmo.lib.material import Material
 from nmmo.lib import utils
+from nmmo.lib.log import EventCode
 
 def norm(progress):
   return max(min(progress, 1.0), 0.0)
@@ -59,14 +61,16 @@ def AllMembersWithinRange(gs: GameState, subject: Group, dist: int):
 def CanSeeAgent(gs: GameState, subject: Group, target: int):
   """True if obj_agent is present in the subjects' entities obs.
   """
-  return any(target in e.ids for e in subject.obs.entities)
+  return any(target in gs.visible_ids(agent) for agent in subject.agents)
 
 def CanSeeGroup(gs: GameState, subject: Group, target: Iterable[int]):
   """ Returns True if subject can see any of target
   """
   if target is None:
     return False
-  return any(CanSeeAgent(gs, subject, agent) for agent in target)
+  if isinstance(target, Group):
+    target = target.agents
+  return any(not gs.visible_ids(agent).isdisjoint(target) for agent in subject.agents)
 
 def DistanceTraveled(gs: GameState, subject: Group, dist: int):
   """True if the summed l-inf distance between each agent's current pos and spawn pos
@@ -99,14 +103,17 @@ def CountEvent(gs: GameState, subject: Group, event: str, N: int):
   """True if the number of events occured in subject corresponding
       to event >= N
   """
-  return norm(len(getattr(subject.event, event)) / N)
+  assert hasattr(EventCode, event), 'Invalid event code'
+  num_event, _, _ = gs.event_totals.get(subject.agents, getattr(EventCode, event))
+  return norm(num_event / N)
 
 def ScoreHit(gs: GameState, subject: Group, combat_style: type[Skill], N: int):
   """True if the number of hits scored in style
   combat_style >= count
   """
-  hits = subject.event.SCORE_HIT.combat_style == combat_style.SKILL_ID
-  return norm(count(hits) / N)
+  hits, _, _ = gs.event_totals.get(subject.agents, EventCode.SCORE_HIT,
+                                   type_id=combat_style.SKILL_ID)
+  return norm(hits / N)
 
 def DefeatEntity(gs: GameState, subject: Group, agent_type: str, level: int, num_agent: int):
   """True if the number of agents (agent_type, >= level) defeated
@@ -129,12 +136,14 @@ def HoardGold(gs: GameState, subject: Group, amount: int):
 def EarnGold(gs: GameState, subject: Group, amount: int):
   """ True if the total amount of gold earned is greater than or equal to amount.
   """
-  return norm(subject.event.EARN_GOLD.gold.sum() / amount)
+  _, _, gold = gs.event_totals.get(subject.agents, EventCode.EARN_GOLD)
+  return norm(gold / amount)
 
 def SpendGold(gs: GameState, subject: Group, amount: int):
   """ True if the total amount of gold spent is greater than or equal to amount.
   """
-  return norm(subject.event.BUY_ITEM.gold.sum() / amount)
+  _, _, gold = gs.event_totals.get(subject.agents, EventCode.BUY_ITEM)
+  return norm(gold / amount)
 
 def MakeProfit(gs: GameState, subject: Group, amount: int):
   """ True if the total amount of gold earned-spent is greater than or equal to amount.
@@ -196,27 +205,95 @@ def FullyArmed(gs: GameState, subject: Group,
 def ConsumeItem(gs: GameState, subject: Group, item: type[Item], level: int, quantity: int):
   """True if total quantity consumed of item type above level is >= quantity
   """
-  type_flt = subject.event.CONSUME_ITEM.type == item.ITEM_TYPE_ID
-  lvl_flt = subject.event.CONSUME_ITEM.level >= level
-  return norm(subject.event.CONSUME_ITEM.number[type_flt & lvl_flt].sum() / quantity)
+  _, number, _ = gs.event_totals.get(subject.agents, EventCode.CONSUME_ITEM,
+                                     type_id=item.ITEM_TYPE_ID, min_level=level)
+  return norm(number / quantity)
 
 def HarvestItem(gs: GameState, subject: Group, item: type[Item], level: int, quantity: int):
   """True if total quantity harvested of item type above level is >= quantity
   """
-  type_flt = subject.event.HARVEST_ITEM.type == item.ITEM_TYPE_ID
-  lvl_flt = subject.event.HARVEST_ITEM.level >= level
-  return norm(subject.event.HARVEST_ITEM.number[type_flt & lvl_flt].sum() / quantity)
+  _, number, _ = gs.event_totals.get(subject.agents, EventCode.HARVEST_ITEM,
+                                     type_id=item.ITEM_TYPE_ID, min_level=level)
+  return norm(number / quantity)
 
 def ListItem(gs: GameState, subject: Group, item: type[Item], level: int, quantity: int):
   """True if total quantity listed of item type above level is >= quantity
   """
-  type_flt = subject.event.LIST_ITEM.type == item.ITEM_TYPE_ID
-  lvl_flt = subject.event.LIST_ITEM.level >= level
-  return norm(subject.event.LIST_ITEM.number[type_flt & lvl_flt].sum() / quantity)
+  _, number, _ = gs.event_totals.get(subject.agents, EventCode.LIST_ITEM,
+                                     type_id=item.ITEM_TYPE_ID, min_level=level)
+  return norm(number / quantity)
 
 def BuyItem(gs: GameState, subject: Group, item: type[Item], level: int, quantity: int):
   """True if total quantity purchased of item type above level is >= quantity
   """
-  type_flt = subject.event.BUY_ITEM.type == item.ITEM_TYPE_ID
-  lvl_flt = subject.event.BUY_ITEM.level >= level
-  return norm(subject.event.BUY_ITEM.number[type_flt & lvl_flt].sum() / quantity)
+  _, number, _ = gs.event_totals.get(subject.agents, EventCode.BUY_ITEM,
+                                     type_id=item.ITEM_TYPE_ID, min_level=level)
+  return norm(number / quantity)
+
+
+################################################
+# The columns of the subject's rows that each predicate reads, see predicate_inputs()
+_SKILL_LEVELS = [attr for attr in EntityAttr if attr.endswith('_level')]
+_SKILL_EXPS = [attr for attr in EntityAttr if attr.endswith('_exp')]
+
+predicate_inputs(StayAlive, entity=['health'])
+predicate_inputs(AllDead, entity=['health'])
+predicate_inputs(OccupyTile, entity=['row', 'col'])
+predicate_inputs(AllMembersWithinRange, entity=['row', 'col'])
+predicate_inputs(DistanceTraveled, entity=['health', 'row', 'col'])
+predicate_inputs(AttainSkill, entity=_SKILL_LEVELS)
+predicate_inputs(GainExperience, entity=_SKILL_EXPS)
+predicate_inputs(HoardGold, entity=['gold'])
+predicate_inputs(OwnItem, item=['type_id', 'level', 'quantity'])
+predicate_inputs(EquipItem, item=['type_id', 'level', 'equipped'])
+predicate_inputs(FullyArmed, item=['type_id', 'level', 'equipped'])
+
+################################################
+# Batched versions of the common single-agent predicates, see batch_evaluate().
+#   Each gives the same progress as the predicate with Group(agent) as subject
+
+def _entity_rows(gs: GameState, agents: np.ndarray):
+  # rows of the agents in gs.entity_table, or the zeroed row 0 for the removed agents.
+  #   The ids are sorted once per gs, then all agents are looked up at once
+  k = ('entity_rows_by_id',)
+  if k not in gs.cache_result:
+    ids = gs.entity_table[:, EntityAttr['id']]
+    order = np.argsort(ids, kind='stable') # the lowest row first, as min(entity_rows[id])
+    gs.cache_result[k] = (ids[order], order)
+  sorted_ids, order = gs.cache_result[k]
+  pos = np.minimum(np.searchsorted(sorted_ids, agents), len(sorted_ids) - 1)
+  rows = np.where(sorted_ids[pos] == agents, order[pos], 0)
+  return rows, rows > 0
+
+def _entity_col(gs: GameState, agents: np.ndarray, attr: str):
+  rows, present = _entity_rows(gs, agents)
+  return np.where(present, gs.entity_table[rows, EntityAttr[attr]], 0), present
+
+@batched_predicate(StayAlive)
+def _batch_stay_alive(gs: GameState, agents: np.ndarray):
+  health, _ = _entity_col(gs, agents, 'health')
+  return health > 0
+
+@batched_predicate(AttainSkill)
+def _batch_attain_skill(gs: GameState, agents: np.ndarray,
+                        skill: type[Skill], level: int, num_agent: int):
+  if level <= 1:
+    return np.ones(len(agents))
+  attr = skill.__name__.lower() + '_level'
+  if attr not in EntityAttr or num_agent == 0:
+    return None
+  skill_level, present = _entity_col(gs, agents, attr)
+  return np.where(present, skill_level - 1, 0) / (num_agent * (level-1))
+
+@batched_predicate(HoardGold)
+def _batch_hoard_gold(gs: GameState, agents: np.ndarray, amount: int):
+  if amount == 0:
+    return None
+  gold, _ = _entity_col(gs, agents, 'gold')
+  return gold / amount
+
+@batched_predicate(CountEvent)
+def _batch_count_event(gs: GameState, agents: np.ndarray, event: str, N: int):
+  if not hasattr(EventCode, event) or N == 0:
+    return None
+  return gs.event_totals.counts(agents, getattr(EventCode, event)) / N
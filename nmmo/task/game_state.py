@@ -3,18 +3,19 @@ from typing import Dict, Iterable, Tuple, MutableMapping, Set, List
 from dataclasses import dataclass, field
 from copy import deepcopy
 from collections import defaultdict
+import functools
 import weakref
 
 from abc import ABC, abstractmethod
-import functools
 import numpy as np
 
 from nmmo.core.config import Config
 from nmmo.core.realm import Realm
 from nmmo.core.observation import Observation
+from nmmo.core.visibility import Visibility
 from nmmo.task.group import Group
 from nmmo.entity.entity import EntityState
-from nmmo.lib.event_log import EventState, ATTACK_COL_MAP, ITEM_COL_MAP, LEVEL_COL_MAP
+from nmmo.lib.event_log import EventState, EventTotals, ATTACK_COL_MAP, ITEM_COL_MAP, LEVEL_COL_MAP
 from nmmo.lib.log import EventCode
 from nmmo.systems.item import ItemState
 from nmmo.core.tile import TileState
@@ -28,6 +29,27 @@ EventAttr.update(ITEM_COL_MAP)
 EventAttr.update(ATTACK_COL_MAP)
 EventAttr.update(LEVEL_COL_MAP)
 
+def group_by(keys: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+  '''CSR group-by of the positions of keys
+
+  Returns:
+    unique keys, positions sorted by key, start and count of each key's positions.
+    The sort is stable, so the positions of each key stay in their original order
+  '''
+  order = np.argsort(keys, kind='stable')
+  unique, starts, counts = np.unique(keys[order], return_index=True, return_counts=True)
+  return unique, order, starts, counts
+
+def _gather_rows(index: Dict[int, Iterable], subject: Iterable[int], unordered=False):
+  # the rows of each subject, in the subject order then the row order. The hash
+  #   indexes of the tables keep unordered sets
+  groups = [index[sbj] for sbj in subject if sbj in index]
+  if unordered:
+    groups = [sorted(rows) for rows in groups]
+  if not groups:
+    return np.empty(0, dtype=np.int64)
+  return groups[0] if len(groups) == 1 else np.concatenate(groups)
+
 @dataclass(frozen=True) # make gs read-only, except cache_result
 class GameState:
   current_tick: int
@@ -36,24 +58,60 @@ class GameState:
 
   alive_agents: Set[int] # of alive agents' ent_id (for convenience)
   env_obs: Dict[int, Observation] # env passes the obs of only alive agents
-
-  entity_data: np.ndarray # a copied, whole Entity ds table
-  entity_index: Dict[int, Iterable] # precomputed index for where_in_1d
-  item_data: np.ndarray # a copied, whole Item ds table
-  item_index: Dict[int, Iterable]
-  event_data: np.ndarray # a copied, whole Event log table
-  event_index: Dict[int, Iterable]
+  visibility: Visibility # the entities seen by each alive agent
+
+  # read-only views of the whole ds tables, for the indexed lookups. They include
+  #   the padding row 0 and the zeroed free rows, and follow the next step, so
+  #   the rows are only looked up through the indexes. See also entity_data, etc.
+  entity_table: np.ndarray # Entity ds table
+  entity_rows: Dict[int, Iterable] # ent_id -> rows of entity_table, for where_in_id
+  item_table: np.ndarray # Item ds table
+  item_rows: Dict[int, Iterable] # owner_id -> rows of item_table
+  event_table: np.ndarray # Event log table
+  event_rows: Dict[int, np.ndarray] # ent_id -> rows of event_table, in row order
+  event_totals: EventTotals # running totals of the events by agent and event code
 
   cache_result: MutableMapping # cache for general memoization
   _group_view: List[GroupView] = field(default_factory=list) # cache for GroupView
 
+  # copies of the live rows of the ds tables, which stay valid after the next step,
+  #   and the indexes of their rows. Made on first access
+  @functools.cached_property
+  def entity_data(self) -> np.ndarray:
+    return self.entity_table[self.entity_table[:, EntityAttr["id"]] != 0]
+
+  @functools.cached_property
+  def entity_index(self) -> Dict[int, List[int]]:
+    return precompute_index(self.entity_data, EntityAttr["id"])
+
+  @functools.cached_property
+  def item_data(self) -> np.ndarray:
+    return self.item_table[self.item_table[:, ItemAttr["id"]] != 0]
+
+  @functools.cached_property
+  def item_index(self) -> Dict[int, List[int]]:
+    return precompute_index(self.item_data, ItemAttr["owner_id"])
+
+  @functools.cached_property
+  def event_data(self) -> np.ndarray:
+    return self.event_table[self.event_table[:, EventAttr["recorded"]] == 1]
+
+  @functools.cached_property
+  def event_index(self) -> Dict[int, List[int]]:
+    return precompute_index(self.event_data, EventAttr["ent_id"])
+
   # add helper functions below
-  @functools.lru_cache
   def entity_or_none(self, ent_id):
-    flt_ent = self.entity_data[:, EntityAttr['id']] == ent_id
-    if np.any(flt_ent):
-      return EntityState.parse_array(self.entity_data[flt_ent][0])
-    return None
+    k = ('entity_or_none', ent_id)
+    if k not in self.cache_result:
+      rows = self.entity_rows.get(ent_id)
+      self.cache_result[k] = EntityState.parse_array(self.entity_table[min(rows)]) \
+        if rows else None
+    return self.cache_result[k]
+
+  def visible_ids(self, agent_id) -> Set[int]:
+    '''Ids of the entities in the entity obs of the agent'''
+    return self.visibility.visible_ids(agent_id)
 
   def where_in_id(self, data_type, subject: Iterable[int]):
     k = (data_type, subject)
@@ -61,14 +119,11 @@ class GameState:
       return self.cache_result[k]
 
     if data_type == 'entity':
-      flt_idx = [row for sbj in subject for row in self.entity_index.get(sbj,[])]
-      self.cache_result[k] = self.entity_data[flt_idx]
+      self.cache_result[k] = self.entity_table[_gather_rows(self.entity_rows, subject, True)]
     if data_type == 'item':
-      flt_idx = [row for sbj in subject for row in self.item_index.get(sbj,[])]
-      self.cache_result[k] = self.item_data[flt_idx]
+      self.cache_result[k] = self.item_table[_gather_rows(self.item_rows, subject, True)]
     if data_type == 'event':
-      flt_idx = [row for sbj in subject for row in self.event_index.get(sbj,[])]
-      self.cache_result[k] = self.event_data[flt_idx]
+      self.cache_result[k] = self.event_table[_gather_rows(self.event_rows, subject)]
     if data_type in ['entity', 'item', 'event']:
       return self.cache_result[k]
 
@@ -81,9 +136,11 @@ class GameState:
 
   def clear_cache(self):
     # clear the cache, so that this object can be garbage collected
-    self.entity_or_none.cache_clear()  # pylint: disable=no-member
     self.cache_result.clear()
     self.alive_agents.clear()
+    for name in ['entity_data', 'entity_index', 'item_data', 'item_index',
+                 'event_data', 'event_index']:
+      self.__dict__.pop(name, None) # the cached copies
     while self._group_view:
       weakref.ref(self._group_view.pop())  # clear the cache
 
@@ -256,31 +313,77 @@ class GameStateGenerator:
     for ent_id, ent in realm.players.items():
       self.spawn_pos.update( {ent_id: ent.pos} )
 
-  def generate(self, realm: Realm, env_obs: Dict[int, Observation]) -> GameState:
-    # copy the datastore, by running astype
-    entity_all = EntityState.Query.table(realm.datastore).copy()
-    alive_agents = entity_all[:, EntityAttr["id"]]
-    alive_agents = set(alive_agents[alive_agents > 0])
-    item_data = ItemState.Query.table(realm.datastore).copy()
-    event_data = EventState.Query.table(realm.datastore).copy()
+    # ent_id -> rows of the Event table. The events are never modified or removed,
+    #   so only the rows recorded since the previous generate() are added, see delta_since().
+    #   The rows are views of per-agent buffers, which double their capacity when full
+    self._event_index: Dict[int, np.ndarray] = {}
+    self._event_buffers: Dict[int, np.ndarray] = {}
+    self._event_tick = None
+
+  def reset_event_index(self):
+    '''Index the whole Event table again on the next generate(). Must be called
+       when the table no longer extends the indexed one, e.g. after load_state()'''
+    self._event_index = {}
+    self._event_buffers = {}
+    self._event_tick = None
+
+  def _update_event_index(self, event_table, tick):
+    event_data = event_table.view()
+    if self._event_tick is None or tick <= self._event_tick:
+      # first call, or the ticks restarted
+      self.reset_event_index()
+      row_ids = np.flatnonzero(event_data[:, EventAttr["recorded"]])
+    else:
+      row_ids, _, _ = event_table.delta_since(self._event_tick)
+    self._event_tick = tick
+    if len(row_ids) == 0:
+      return
+
+    # the new rows come after the indexed ones, so the rows stay in row order
+    unique, order, starts, counts = group_by(event_data[row_ids, EventAttr["ent_id"]])
+    row_ids = row_ids[order]
+    for ent_id, start, count in zip(unique.tolist(), starts.tolist(), counts.tolist()):
+      buf = self._event_buffers.get(ent_id)
+      size = 0 if buf is None else len(self._event_index[ent_id])
+      if buf is None or size + count > len(buf):
+        grown = np.empty(max(2 * size, size + count, 16), dtype=row_ids.dtype)
+        if buf is not None:
+          grown[:size] = buf[:size]
+        buf = self._event_buffers[ent_id] = grown
+      buf[size:size+count] = row_ids[start:start+count]
+      self._event_index[ent_id] = buf[:size+count]
+
+  def generate(self, realm: Realm, env_obs: Dict[int, Observation],
+               visibility: Visibility = None) -> GameState:
+    # the Entity and Item tables keep hash indexes, see Realm
+    entity_table = EntityState.State.table(realm.datastore)
+    item_table = ItemState.State.table(realm.datastore)
+    event_table = EventState.State.table(realm.datastore)
+    self._update_event_index(event_table, realm.tick)
+
+    entity_view = entity_table.view()
+    alive_agents = entity_view[:, EntityAttr["id"]]
+    alive_agents = set(alive_agents[alive_agents > 0].tolist())
     return GameState(
       current_tick = realm.tick,
       config = self.config,
       spawn_pos = self.spawn_pos,
       alive_agents = alive_agents,
       env_obs = env_obs,
-      entity_data = entity_all,
-      entity_index = precompute_index(entity_all, EntityAttr["id"]),
-      item_data = item_data,
-      item_index = precompute_index(item_data, ItemAttr["owner_id"]),
-      event_data = event_data,
-      event_index = precompute_index(event_data, EventAttr['ent_id']),
+      visibility = visibility or Visibility.from_realm(realm),
+      entity_table = entity_view,
+      entity_rows = entity_table.get_index(EntityAttr["id"]),
+      item_table = item_table.view(),
+      item_rows = item_table.get_index(ItemAttr["owner_id"]),
+      event_table = event_table.view(),
+      event_rows = self._event_index,
+      event_totals = realm.event_log.totals,
       cache_result = {}
     )
 
 def precompute_index(table, id_col):
   index = defaultdict()
-  for row, id_ in enumerate(table[:,id_col]):
+  for row, id_ in enumerate(table[:,id_col].tolist()):
     if id_ in index:
       index[id_].append(row)
     else:
@@ -68,6 +68,8 @@ class Group(Sequence, Set):
     return self
   def __deepcopy__(self, memo):
     return Group(self.agents, self.name)
+  def __reduce__(self):
+    return (Group, (self.agents, self.name))
 
   def description(self) -> Dict:
     return {
@@ -85,6 +87,9 @@ class Group(Sequence, Set):
       self._sd = None
 
   def update(self, gs: GameState) -> None:
+    if gs is self._gs:
+      # e.g. a group shared by the predicates. Clearing would drop their cached progress
+      return
     self.clear_prev_state()
     self._gs = gs
     self._sd = gs.get_subject_view(self)
@@ -1,13 +1,20 @@
 from __future__ import annotations
-from typing import Callable, List, Optional, Tuple, Union, Iterable, Type, TYPE_CHECKING
+from typing import Callable, Dict, List, Optional, Tuple, Union, Iterable, Type, TYPE_CHECKING
 from types import FunctionType
 from abc import ABC, abstractmethod
+from collections import defaultdict
+import functools
 import inspect
 from numbers import Real
 
+import numpy as np
+
 from nmmo.core.config import Config
+from nmmo.datastore.datastore import Datastore
 from nmmo.task.group import Group, union
-from nmmo.task.game_state import GameState
+from nmmo.task.game_state import GameState, EntityAttr, ItemAttr
+from nmmo.entity.entity import EntityState
+from nmmo.systems.item import ItemState
 from nmmo.task.constraint import Constraint, GroupConstraint
 
 if TYPE_CHECKING:
@@ -46,16 +53,15 @@ class Predicate(ABC):
     Returns:
       progress: float bounded between [0, 1], 1 is considered to be true
     """
+    # Calculate score, e.g. already by batch_evaluate()
+    cache = gs.cache_result
+    if self.name in cache:
+      return cache[self.name]
     # Update views
     for group in self._groups:
       group.update(gs)
-    # Calculate score
-    cache = gs.cache_result
-    if self.name in cache:
-      progress = cache[self.name]
-    else:
-      progress = max(min(self._evaluate(gs)*1.0,1.0),0.0)
-      cache[self.name] = progress
+    progress = max(min(self._evaluate(gs)*1.0,1.0),0.0)
+    cache[self.name] = progress
     return progress
 
   def close(self):
@@ -70,6 +76,19 @@ class Predicate(ABC):
     """
     raise NotImplementedError
 
+  def batch_key(self):
+    """ The predicates with the same batch key only differ by their single-agent
+        subject, and can be evaluated at once, see batch_evaluate().
+        None if this predicate has no batched version
+    """
+    return None
+
+  def inputs(self) -> Optional[Dict[str, Tuple[str]]]:
+    """ {table: columns} of the rows of the subject this predicate only depends on,
+        see predicate_inputs(). None if unknown, so that it is evaluated every tick
+    """
+    return None
+
   def _make_name(self, class_name, args, kwargs) -> str:
     name = [class_name] + \
       list(map(arg_to_string, args)) + \
@@ -104,6 +123,12 @@ class Predicate(ABC):
   def subject(self):
     return self._subject
 
+  @property
+  def sub_predicates(self) -> List[Predicate]:
+    """ The predicates this predicate is computed from, see PredicateGraph
+    """
+    return []
+
   def create_task(self,
                   task_cls: Optional[Type[Task]]=None,
                   assignee: Union[Iterable[int], int]=None,
@@ -148,6 +173,181 @@ def arg_to_string(arg):
 
 ################################################
 
+# predicate function -> batched version, see batched_predicate()
+_BATCHED_FNS: Dict[Callable, Callable] = {}
+
+def batched_predicate(fn: Callable):
+  """ Registers the decorated function as the batched version of the predicate
+      function fn. It takes (gs, agents, *args, **kwargs), where agents is an
+      array of ent_ids and args, kwargs are those of fn after subject, and returns
+      the progress of fn for each agent alone, or None to evaluate them one by one
+  """
+  def register(batch_fn: Callable) -> Callable:
+    _BATCHED_FNS[fn] = batch_fn
+    return batch_fn
+  return register
+
+def batch_evaluate(eval_fns: Iterable, gs: GameState) -> None:
+  """ Evaluates at once the predicates in eval_fns that have the same batch key,
+      and caches their progress, so that calling them on gs is a lookup
+  """
+  batches = defaultdict(dict)
+  for pred in eval_fns:
+    if isinstance(pred, Predicate) and pred.name not in gs.cache_result:
+      key = pred.batch_key()
+      if key is not None:
+        batches[key][pred.name] = int(pred.subject)
+
+  for (fn, args, kwargs), agents in batches.items():
+    if len(agents) < 2:
+      continue # as fast one by one
+    progress = _BATCHED_FNS[fn](gs, np.array(list(agents.values())), *args, **dict(kwargs))
+    if progress is None:
+      continue
+    progress = np.clip(np.asarray(progress, dtype=np.float64), 0.0, 1.0)
+    gs.cache_result.update(zip(agents, progress.tolist()))
+
+# predicate function -> {table: columns}, see predicate_inputs()
+_FN_INPUTS: Dict[Callable, Dict[str, Tuple[str]]] = {}
+# table -> (its data in GameState, columns, column of the subject's ent_id, its state)
+_INPUT_TABLES = {
+  'entity': ('entity_table', EntityAttr, 'id', EntityState),
+  'item': ('item_table', ItemAttr, 'owner_id', ItemState),
+}
+
+def predicate_inputs(fn: Callable, **inputs: Iterable[str]) -> None:
+  """ Declares that the predicate function fn only depends on these columns of
+      the rows of its subject, e.g. entity=['gold'], or item=['type_id', 'level'].
+      The entity rows of the subject have the ids of its agents, and the item rows
+      are owned by them. PredicateGraph reuses the previous progress of the
+      predicates whose inputs did not change
+  """
+  for table, columns in inputs.items():
+    _, attrs, _, _ = _INPUT_TABLES[table]
+    assert all(col in attrs for col in columns), f"Unknown {table} columns: {columns}"
+  _FN_INPUTS[fn] = {table: tuple(columns) for table, columns in inputs.items()}
+
+class PredicateGraph:
+  """ The predicates of the tasks and their sub-predicates, compiled into a DAG.
+      The predicates with the same name have the same structure, and share their
+      cache_result entry, so they are one node.
+
+      Evaluating the graph computes each node once per tick, the leaves first and
+      in batches, see batch_evaluate(), then the operators from the cached values
+      of their sub-predicates. With the datastore of the game states, the leaves with
+      declared inputs, see predicate_inputs(), keep their previous progress until
+      these inputs change.
+  """
+  def __init__(self, eval_fns: Iterable, datastore: Datastore = None):
+    self._nodes: Dict[str, Predicate] = {} # name -> node, in topological order
+    self._deps: Dict[str, Tuple[str]] = {} # name -> names of the sub-predicates
+    for pred in eval_fns:
+      if isinstance(pred, Predicate):
+        self._add(pred)
+
+    self._datastore = datastore
+    # (table, column) -> ent_id -> names of the leaves with the column as input.
+    #   The changes are found through the datastore, so nothing is watched without it
+    self._watchers: Dict[Tuple[str, str], Dict[int, List[str]]] = defaultdict(dict)
+    for name, pred in self._nodes.items() if datastore is not None else ():
+      for table, columns in (pred.inputs() or {}).items():
+        for col in columns:
+          for ent_id in pred.subject.agents:
+            self._watchers[(table, col)].setdefault(ent_id, []).append(name)
+    self._reused = {name for watchers in self._watchers.values()
+                    for names in watchers.values() for name in names}
+    # table -> watched columns, the ent_id column first
+    self._columns: Dict[str, List[str]] = {}
+    for table, col in self._watchers:
+      self._columns.setdefault(table, [_INPUT_TABLES[table][2]]).append(col)
+    self._snapshots: Dict[str, np.ndarray] = {} # table -> watched columns, at _tick
+    self._tick = None
+    self._progress: Dict[str, float] = {} # name -> progress, while the inputs are the same
+
+  def _add(self, pred: Predicate):
+    if pred.name in self._nodes:
+      return
+    sub_predicates = pred.sub_predicates
+    for sub in sub_predicates:
+      self._add(sub)
+    self._deps[pred.name] = tuple(sub.name for sub in sub_predicates)
+    self._nodes[pred.name] = pred # after its sub-predicates
+
+  def __len__(self):
+    return len(self._nodes)
+
+  def evaluate(self, eval_fns: Iterable, gs: GameState) -> None:
+    """ Evaluates the predicates in eval_fns, and their sub-predicates, into
+        gs.cache_result. The predicates not in the graph are left to be called
+    """
+    needed = set()
+    names = [pred.name for pred in eval_fns
+             if isinstance(pred, Predicate) and pred.name in self._nodes]
+    while names:
+      name = names.pop()
+      if name not in needed:
+        needed.add(name)
+        names.extend(self._deps[name])
+
+    self._invalidate(gs)
+    for name in needed:
+      if name in self._progress:
+        gs.cache_result[name] = self._progress[name]
+
+    batch_evaluate([self._nodes[name] for name in needed if not self._deps[name]], gs)
+    for name, pred in self._nodes.items():
+      if name in needed:
+        progress = pred(gs)
+        if name in self._reused and name not in self._progress:
+          self._progress[name] = progress
+
+  def _invalidate(self, gs: GameState) -> None:
+    # only the rows stamped by the datastore since the last tick can differ. The rows
+    #   of the alive agents are modified every tick (e.g. food, water), so their
+    #   watched columns are compared with the snapshot
+    restart = self._tick is None or gs.current_tick < self._tick
+    for table, columns in self._columns.items():
+      data_name, attrs, _, state = _INPUT_TABLES[table]
+      data = getattr(gs, data_name)
+      col_idx = [attrs[col] for col in columns]
+      snapshot = self._snapshots.get(table)
+      if restart or snapshot is None or len(snapshot) > len(data):
+        # the first tick, or a new episode
+        self._snapshots[table] = data[:, col_idx]
+        self._progress.clear()
+        continue
+      if len(snapshot) < len(data):
+        # the table was expanded, and the new rows were free, i.e. zeroed
+        snapshot = np.concatenate((snapshot, np.zeros((len(data) - len(snapshot),
+                                                       len(columns)), dtype=snapshot.dtype)))
+        self._snapshots[table] = snapshot
+
+      row_ids, values, removed_ids = state.State.table(self._datastore).delta_since(self._tick)
+      if len(removed_ids) > 0:
+        # the removed rows are zeroed
+        row_ids = np.concatenate((row_ids, removed_ids))
+        values = np.concatenate((values, np.zeros((len(removed_ids), values.shape[1]),
+                                                  values.dtype)))
+      if len(row_ids) == 0:
+        continue
+      previous = snapshot[row_ids]
+      current = values[:, col_idx]
+      snapshot[row_ids] = current
+      rows, cols = np.nonzero(previous != current)
+      if len(rows) == 0:
+        continue
+      # both the previous and the current ent_ids of the changed rows
+      ent_ids = np.stack((previous[rows, 0], current[rows, 0]), axis=1)
+      moved = set(ent_ids[cols == 0].ravel().tolist()) # rows removed, added or given
+      for j, col in enumerate(columns[1:], 1):
+        watchers = self._watchers[(table, col)]
+        for ent_id in moved.union(ent_ids[cols == j].ravel().tolist()):
+          for name in watchers.get(ent_id, ()):
+            self._progress.pop(name, None)
+    self._tick = gs.current_tick
+
+# the same class for the same function, e.g. for every task sampled from a curriculum
+@functools.lru_cache(maxsize=1024)
 def make_predicate(fn: Callable) -> Type[Predicate]:
   """ Syntactic sugar API for defining predicates from function
   """
@@ -167,6 +367,21 @@ def make_predicate(fn: Callable) -> Type[Predicate]:
       self.name = self._make_name(fn.__name__, args, kwargs)
     def _evaluate(self, gs: GameState) -> float:
       return fn(gs, *self._args, **self._kwargs)
+    def batch_key(self):
+      if fn not in _BATCHED_FNS or not self._args or \
+         not isinstance(self._args[0], Group) or len(self._args[0]) != 1:
+        return None # the subject is not a positional single-agent group
+      key = (fn, self._args[1:], tuple(sorted(self._kwargs.items())))
+      try:
+        hash(key)
+      except TypeError:
+        return None
+      return key
+    def inputs(self):
+      if fn not in _FN_INPUTS or not self._args or not isinstance(self._args[0], Group) or \
+         len(self._groups) > 1:
+        return None # the subject is not the only, positional group
+      return _FN_INPUTS[fn]
     def get_source_code(self):
       return inspect.getsource(fn).strip()
     def get_signature(self) -> List:
@@ -195,6 +410,10 @@ class PredicateOperator(Predicate):
         predicates[i] = lambda _,v=predicates[i] : v
     self._predicates = predicates
 
+  @property
+  def sub_predicates(self) -> List[Predicate]:
+    return [p for p in self._predicates if isinstance(p, Predicate)]
+
   def check(self, config: Config) -> bool:
     return all((p.check(config) if isinstance(p, Predicate)
                 else True for p in self._predicates))
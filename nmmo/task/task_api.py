@@ -48,6 +48,10 @@ class Task(ABC):
         self._eval_fn.close()
       self._stop_eval = True
 
+  @property
+  def eval_fn(self) -> Callable:
+    return self._eval_fn
+
   @property
   def assignee(self) -> Tuple[int]:
     return self._assignee
@@ -56,6 +60,13 @@ class Task(ABC):
   def completed(self) -> bool:
     return self._completed_tick is not None
 
+  @property
+  def needs_eval(self) -> bool:
+    """Whether compute_rewards() calls eval_fn, i.e. until the task is completed.
+       Override it along with _map_progress_to_reward()
+    """
+    return not self.completed
+
   @property
   def reward_multiplier(self) -> float:
     return self._reward_multiplier
@@ -164,6 +175,10 @@ class Task(ABC):
     }
 
 class OngoingTask(Task):
+  @property
+  def needs_eval(self) -> bool:
+    return True
+
   def _map_progress_to_reward(self, gs: GameState) -> float:
     """Keep returning the progress reward after the task is completed.
        However, this task tracks the completion status in the same manner.
@@ -1,9 +1,11 @@
 import functools
+import os
 from dataclasses import dataclass, field
-from typing import Iterable, Dict, List, Union, Type
+from typing import Iterable, Dict, List, Tuple, Union, Type
 from types import FunctionType
 from copy import deepcopy
 
+import dill
 import numpy as np
 
 import nmmo
@@ -72,6 +74,59 @@ class TaskSpec:
     return "_".join([self.task_cls.__name__, pred_name,
                      kwargs_str, "reward_to:" + self.reward_to])
 
+class Curriculum:
+  """ The task specs of a curriculum file, with the alias table to sample them
+      by their sampling_weight in O(1) each, see load_curriculum()
+  """
+  def __init__(self, specs: List[TaskSpec]):
+    self.specs = list(specs)
+    assert len(self.specs) > 0, "Curriculum cannot be empty"
+    weights = [spec.sampling_weight for spec in self.specs]
+    assert all(w >= 0 for w in weights), "Sampling weights cannot be negative"
+    assert sum(weights) > 0, "At least one sampling weight must be positive"
+    self._prob, self._alias = _alias_table(weights)
+
+  def __len__(self):
+    return len(self.specs)
+
+  def sample(self, np_random: np.random.Generator, size: int) -> List[TaskSpec]:
+    idx = np_random.integers(len(self.specs), size=size)
+    idx = np.where(np_random.random(size) < self._prob[idx], idx, self._alias[idx])
+    return [self.specs[i] for i in idx.tolist()]
+
+def _alias_table(weights: List[float]) -> Tuple[np.ndarray, np.ndarray]:
+  # Vose's alias method: entry i is picked with prob[i], otherwise alias[i] is
+  num = len(weights)
+  total = sum(weights)
+  prob = [w * num / total for w in weights]
+  alias = list(range(num))
+  small = [i for i, p in enumerate(prob) if p < 1.0]
+  large = [i for i, p in enumerate(prob) if p >= 1.0]
+  while small and large:
+    less, more = small.pop(), large.pop()
+    alias[less] = more
+    prob[more] -= 1.0 - prob[less]
+    (small if prob[more] < 1.0 else large).append(more)
+  for i in small + large: # 1 up to the rounding errors
+    prob[i] = 1.0
+  return np.array(prob), np.array(alias)
+
+# file path -> ((mtime, size), curriculum)
+_CURRICULUM_CACHE: Dict[str, Tuple[Tuple[int, int], Curriculum]] = {}
+
+def load_curriculum(file_path: str) -> Curriculum:
+  """ The curriculum, a list of TaskSpec pickled with dill, in file_path.
+      The file is only read again when its modification time or size changes
+  """
+  stat = os.stat(file_path)
+  version = (stat.st_mtime_ns, stat.st_size)
+  cached = _CURRICULUM_CACHE.get(file_path)
+  if cached is None or cached[0] != version:
+    with open(file_path, 'rb') as f:
+      cached = (version, Curriculum(dill.load(f)))
+    _CURRICULUM_CACHE[file_path] = cached
+  return cached[1]
+
 def make_task_from_spec(assign_to: Union[Iterable[int], Dict],
                         task_spec: List[TaskSpec]) -> List[Task]:
   """
@@ -0,0 +1,59 @@
+import unittest
+
+import numpy as np
+
+import nmmo
+from nmmo.core import action_mask
+from nmmo.systems import item as Item
+from tests.testhelpers import ScriptedAgentTestConfig, provide_item
+
+RANDOM_SEED = 5
+TEST_HORIZON = 30
+
+class BatchedConfig(ScriptedAgentTestConfig):
+  BATCHED_OBS = True
+  PROVIDE_ACTION_TARGETS = True
+
+# pylint: disable=protected-access
+class TestActionMask(unittest.TestCase):
+  def _assert_same_masks(self, env, batch):
+    for agent_id, agent_obs in env.obs.items():
+      for atn, args in agent_obs._make_action_targets().items():
+        for arg, mask in args.items():
+          self.assertTrue(np.array_equal(batch["ActionTargets"][atn][arg][agent_id-1], mask),
+                          f"Mismatch for agent {agent_id}, {atn}/{arg}")
+
+  def test_batched_masks_match_observation(self):
+    env = nmmo.Env(BatchedConfig(), RANDOM_SEED)
+    batch = env.reset(seed=RANDOM_SEED)
+
+    # fill up the inventory of some agents with ammo, to exercise the full-inventory buy
+    capacity = env.config.ITEM_INVENTORY_CAPACITY
+    for ent_id, ammo in [(1, Item.Whetstone), (2, Item.Arrow), (3, Item.Runes)]:
+      for level in range(1, capacity + 1):
+        provide_item(env.realm, ent_id, ammo, level=level, quantity=1)
+    env.obs = env._compute_observations()
+    self._assert_same_masks(env, batch)
+
+    for _ in range(TEST_HORIZON):
+      batch, _, _, _ = env.step({})
+      self._assert_same_masks(env, batch)
+
+  def test_no_noop_shared_market(self):
+    config = BatchedConfig()
+    config.PROVIDE_NOOP_ACTION_TARGET = False
+    env = nmmo.Env(config, RANDOM_SEED)
+    env.reset(seed=RANDOM_SEED)
+    for _ in range(10):
+      batch, _, _, _ = env.step({})
+
+    # the market can be either shared or stacked per agent
+    batch_obs = {key: val for key, val in batch.items() if key != "ActionTargets"}
+    masks = action_mask.make_action_targets(env.config, env.realm.tick, batch_obs)
+    for agent_id, agent_obs in env.obs.items():
+      for atn, args in agent_obs._make_action_targets().items():
+        for arg, mask in args.items():
+          self.assertTrue(np.array_equal(masks[atn][arg][agent_id-1], mask))
+
+if __name__ == '__main__':
+  unittest.main()
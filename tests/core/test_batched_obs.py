@@ -0,0 +1,69 @@
+import unittest
+
+import numpy as np
+
+import nmmo
+from scripted import baselines
+
+RANDOM_SEED = 7
+TEST_HORIZON = 10
+
+class Config(nmmo.config.Small, nmmo.config.AllGameSystems):
+  PLAYER_N = 16
+  PLAYERS = [baselines.Random]
+
+class BatchedConfig(Config):
+  BATCHED_OBS = True
+
+class TestBatchedObs(unittest.TestCase):
+  @classmethod
+  def setUpClass(cls):
+    cls.config = Config()
+    cls.batched_config = BatchedConfig()
+
+  def _assert_same_obs(self, batch, ref_obs):
+    for agent_id in range(1, self.config.PLAYER_N + 1):
+      slot = agent_id - 1
+      if agent_id not in ref_obs:
+        self.assertEqual(batch['AgentId'][slot], 0)
+        self.assertFalse(np.any(batch['Entity'][slot]))
+        continue
+      for key, val in ref_obs[agent_id].items():
+        if key == 'ActionTargets':
+          for atn, args in val.items():
+            for arg, mask in args.items():
+              self.assertTrue(np.array_equal(batch[key][atn][arg][slot], mask))
+        else:
+          self.assertTrue(np.array_equal(batch[key][slot], val), key)
+
+  def test_matches_dict_obs(self):
+    env = nmmo.Env(self.batched_config, RANDOM_SEED)
+    ref_env = nmmo.Env(self.config, RANDOM_SEED)
+
+    batch = env.reset(seed=RANDOM_SEED)
+    ref_obs = ref_env.reset(seed=RANDOM_SEED)
+    self.assertEqual(batch['Tile'].shape,
+                     (self.config.PLAYER_N, self.config.MAP_N_OBS, 3))
+    self._assert_same_obs(batch, ref_obs)
+
+    for tick in range(TEST_HORIZON):
+      if tick == 3:
+        # kill agent 1 in both envs
+        env.realm.players[1].resources.health.update(0)
+        ref_env.realm.players[1].resources.health.update(0)
+
+      batch, rewards, dones, _ = env.step({})
+      ref_obs, ref_rewards, ref_dones, _ = ref_env.step({})
+      self._assert_same_obs(batch, ref_obs)
+      self.assertEqual(rewards.shape, (self.config.PLAYER_N,))
+      for agent_id in range(1, self.config.PLAYER_N + 1):
+        self.assertEqual(rewards[agent_id-1], ref_rewards.get(agent_id, 0))
+        self.assertEqual(dones[agent_id-1], ref_dones.get(agent_id, False))
+
+      if tick == 3:
+        self.assertTrue(dones[0])
+
+    self.assertNotIn(1, ref_obs)
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,92 @@
+import unittest
+
+import numpy as np
+
+import nmmo
+from tests.testhelpers import ScriptedAgentTestConfig
+
+RANDOM_SEED = 11
+SAVE_TICK = 20
+ROLLOUT_LEN = 20
+
+class TestEnvState(unittest.TestCase):
+  @classmethod
+  def setUpClass(cls):
+    cls.config = ScriptedAgentTestConfig()
+    cls.env = nmmo.Env(cls.config, RANDOM_SEED)
+
+  def _rollout(self):
+    steps = []
+    for _ in range(ROLLOUT_LEN):
+      obs, rewards, dones, _ = self.env.step({})
+      steps.append((obs, rewards, dones,
+                    self.env.realm.datastore.table('Entity')._data.copy()))
+    return steps
+
+  def _assert_same_rollout(self, steps, ref_steps):
+    for (obs, rewards, dones, ent_data), (ref_obs, ref_rewards, ref_dones, ref_ent_data) \
+        in zip(steps, ref_steps):
+      self.assertEqual(rewards, ref_rewards)
+      self.assertEqual(dones, ref_dones)
+      self.assertTrue(np.array_equal(ent_data, ref_ent_data))
+      self.assertEqual(obs.keys(), ref_obs.keys())
+      for agent_id, agent_obs in obs.items():
+        for key, val in agent_obs.items():
+          if key == 'ActionTargets':
+            for atn, args in val.items():
+              for arg, mask in args.items():
+                self.assertTrue(np.array_equal(mask, ref_obs[agent_id][key][atn][arg]))
+          else:
+            self.assertTrue(np.array_equal(val, ref_obs[agent_id][key]), key)
+
+  def test_load_state_replays_rollout(self):
+    self.env.reset(seed=RANDOM_SEED)
+    for _ in range(SAVE_TICK):
+      self.env.step({})
+    state = self.env.save_state()
+    ref_steps = self._rollout()
+    self.assertLess(len(self.env.realm.players), self.config.PLAYER_N)
+
+    # the same state can be loaded several times
+    for _ in range(2):
+      self.env.load_state(state)
+      self.assertEqual(self.env.realm.tick, SAVE_TICK)
+      self._assert_same_rollout(self._rollout(), ref_steps)
+
+    # including after the env was reset with another seed
+    self.env.reset(seed=RANDOM_SEED + 1)
+    self.env.step({})
+    self.env.load_state(state)
+    self._assert_same_rollout(self._rollout(), ref_steps)
+
+  def test_load_state_restores_obs(self):
+    self.env.reset(seed=RANDOM_SEED)
+    for _ in range(5):
+      obs, _, _, _ = self.env.step({})
+    state = self.env.save_state()
+    for _ in range(5):
+      self.env.step({})
+
+    self.env.load_state(state)
+    self.assertEqual(self.env.obs.keys(), obs.keys())
+    for agent_id, agent_obs in self.env.obs.items():
+      self.assertTrue(np.array_equal(agent_obs.entities.values,
+                                     obs[agent_id]['Entity'][:len(agent_obs.entities.values)]))
+  def test_delta_since(self):
+    self.env.reset(seed=RANDOM_SEED)
+    tables = {name: self.env.realm.datastore.table(name) for name in ['Entity', 'Item', 'Tile']}
+    mirrors = {name: table._data.copy() for name, table in tables.items()}
+    for _ in range(ROLLOUT_LEN):
+      tick = self.env.realm.tick
+      self.env.step({})
+      for name, table in tables.items():
+        row_ids, rows, removed_ids = table.delta_since(tick)
+        mirror = np.zeros_like(table._data)
+        mirror[:len(mirrors[name])] = mirrors[name]
+        mirror[removed_ids] = 0
+        mirror[row_ids] = rows
+        self.assertTrue(np.array_equal(mirror, table._data), name)
+        mirrors[name] = mirror
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,80 @@
+import unittest
+
+import numpy as np
+
+import nmmo
+from scripted import baselines
+
+RANDOM_SEED = 5
+TEST_HORIZON = 10
+
+class Config(nmmo.config.Small, nmmo.config.AllGameSystems):
+  PATH_MAPS = 'maps/fast_reset'
+  MAP_N = 2
+  PLAYER_N = 16
+  PLAYERS = [baselines.Fisher, baselines.Herbalist, baselines.Prospector,
+             baselines.Carver, baselines.Alchemist, baselines.Melee,
+             baselines.Range, baselines.Mage]
+
+class FastResetConfig(Config):
+  FAST_RESET = True
+
+class TestFastReset(unittest.TestCase):
+  @classmethod
+  def setUpClass(cls):
+    cls.env = nmmo.Env(Config(), RANDOM_SEED)
+    cls.fast_env = nmmo.Env(FastResetConfig(), RANDOM_SEED)
+
+  def _assert_same_env(self, obs, fast_obs):
+    self.assertEqual(obs.keys(), fast_obs.keys())
+    for agent_id, agent_obs in obs.items():
+      for key, val in agent_obs.items():
+        if key != 'ActionTargets':
+          self.assertTrue(np.array_equal(val, fast_obs[agent_id][key]), key)
+
+    realm, fast_realm = self.env.realm, self.fast_env.realm
+    for name in ['Tile', 'Entity', 'Item']:
+      self.assertTrue(np.array_equal(realm.datastore.table(name)._data,
+                                     fast_realm.datastore.table(name)._data), name)
+    self.assertTrue(np.array_equal(realm.map.habitable_tiles, fast_realm.map.habitable_tiles))
+    for tile, fast_tile in zip(realm.map.tiles.flat, fast_realm.map.tiles.flat):
+      self.assertEqual(tile.state.index, fast_tile.state.index)
+      self.assertEqual(tile.depleted, fast_tile.depleted)
+      self.assertEqual(list(tile.entities), list(fast_tile.entities))
+
+  def test_matches_cold_reset(self):
+    # the same and then another map, where the tiles were depleted
+    for seed, map_id in [(RANDOM_SEED, 1), (RANDOM_SEED + 1, 1), (RANDOM_SEED + 2, 2)]:
+      obs = self.env.reset(map_id=map_id, seed=seed)
+      fast_obs = self.fast_env.reset(map_id=map_id, seed=seed)
+      self._assert_same_env(obs, fast_obs)
+      for _ in range(TEST_HORIZON):
+        obs, _, _, _ = self.env.step({})
+        fast_obs, _, _, _ = self.fast_env.step({})
+      self.assertGreater(len(self.fast_env.realm.map.update_list), 0)
+      self._assert_same_env(obs, fast_obs)
+
+  def test_recycles_entity_attributes(self):
+    self.fast_env.reset(seed=RANDOM_SEED)
+    prev_attrs = {id(ent.health) for ent in self.fast_env.realm.players.values()}
+    self.fast_env.reset(seed=RANDOM_SEED)
+    attrs = {id(ent.health) for ent in self.fast_env.realm.players.values()}
+    self.assertTrue(attrs & prev_attrs)
+    self.assertEqual(self.fast_env.realm.entity_pool, [])
+
+  def test_load_state_from_another_map(self):
+    self.fast_env.reset(map_id=1, seed=RANDOM_SEED)
+    for _ in range(TEST_HORIZON):
+      self.fast_env.step({})
+    state = self.fast_env.save_state()
+    ref_obs, ref_rewards, _, _ = self.fast_env.step({})
+
+    self.fast_env.reset(map_id=2, seed=RANDOM_SEED)
+    self.fast_env.load_state(state)
+    obs, rewards, _, _ = self.fast_env.step({})
+    self.assertEqual(rewards, ref_rewards)
+    for agent_id, agent_obs in obs.items():
+      self.assertTrue(np.array_equal(agent_obs['Tile'], ref_obs[agent_id]['Tile']))
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,76 @@
+import unittest
+
+import numpy as np
+
+import nmmo
+from scripted import baselines
+
+RANDOM_SEED = 13
+TEST_HORIZON = 20
+
+class Config(nmmo.config.Small, nmmo.config.AllGameSystems):
+  PLAYER_N = 16
+
+class ScriptedConfig(Config):
+  PLAYERS = [nmmo.Agent, baselines.Melee]
+
+def sample_flat_actions(env, np_random):
+  # sample the valid targets of each head, and make some actions no-ops
+  heads = env.flat_action_heads
+  actions = np.full((env.config.PLAYER_N, len(heads)), -1, dtype=np.int32)
+  for agent_id, agent_obs in env.obs.items():
+    targets = agent_obs.action_targets
+    for col, (atn_str, arg_str) in enumerate(heads):
+      mask = targets[atn_str][arg_str]
+      if np_random.random() < 0.8:
+        actions[agent_id-1, col] = np_random.choice(np.flatnonzero(mask))
+  return actions
+
+def to_dict_actions(env, actions):
+  dict_actions = {}
+  for agent_id in env.realm.players:
+    agent_actions = dict_actions[agent_id] = {}
+    for col, (atn_str, arg_str) in enumerate(env.flat_action_heads):
+      agent_actions.setdefault(atn_str, {})[arg_str] = int(actions[agent_id-1, col])
+    for atn_str in list(agent_actions):
+      if min(agent_actions[atn_str].values()) < 0:
+        del agent_actions[atn_str]
+  return dict_actions
+
+class TestFlatActions(unittest.TestCase):
+  def _assert_same_step(self, step, ref_step):
+    obs, rewards, dones, _ = step
+    ref_obs, ref_rewards, ref_dones, _ = ref_step
+    self.assertEqual(rewards, ref_rewards)
+    self.assertEqual(dones, ref_dones)
+    for agent_id, agent_obs in obs.items():
+      for key in ['Entity', 'Inventory', 'Market']:
+        self.assertTrue(np.array_equal(agent_obs[key], ref_obs[agent_id][key]), key)
+
+  def _test_matches_dict_actions(self, config):
+    env = nmmo.Env(config, RANDOM_SEED)
+    ref_env = nmmo.Env(config, RANDOM_SEED)
+    env.reset(seed=RANDOM_SEED)
+    ref_env.reset(seed=RANDOM_SEED)
+    np_random = np.random.default_rng(RANDOM_SEED)
+
+    for _ in range(TEST_HORIZON):
+      actions = sample_flat_actions(env, np_random)
+      ref_step = ref_env.step(to_dict_actions(ref_env, actions))
+      self._assert_same_step(env.step(actions), ref_step)
+
+  def test_matches_dict_actions(self):
+    self._test_matches_dict_actions(Config())
+
+  def test_matches_dict_actions_with_scripted_agents(self):
+    self._test_matches_dict_actions(ScriptedConfig())
+
+  def test_flat_action_space(self):
+    env = nmmo.Env(Config(), RANDOM_SEED)
+    space = env.flat_action_space
+    self.assertEqual(len(space.nvec), len(env.flat_action_heads))
+    for (atn_str, arg_str), n in zip(env.flat_action_heads, space.nvec):
+      self.assertEqual(env.action_space(1)[atn_str][arg_str].n, n)
+
+if __name__ == '__main__':
+  unittest.main()
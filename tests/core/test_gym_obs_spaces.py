@@ -1,4 +1,7 @@
 import unittest
+from copy import copy
+
+import numpy as np
 
 import nmmo
 
@@ -16,7 +19,7 @@ class TestGymObsSpaces(unittest.TestCase):
       if 'ActionTargets' in agent_obs:
         val = agent_obs['ActionTargets']
         for atn in nmmo.Action.edges(env.config):
-          if atn.enabled(env.config):
+          if atn.enabled(env.config) and atn.__name__ in val:
             for arg in atn.edges: # pylint: disable=not-an-iterable
               mask_spec = obs_spec['ActionTargets'][atn.__name__][arg.__name__]
               mask_val = val[atn.__name__][arg.__name__]
@@ -44,5 +47,72 @@ class TestGymObsSpaces(unittest.TestCase):
 
     self._test_gym_obs_space(env)
 
+  def test_env_with_obs_buffers(self):
+    config = nmmo.config.Default()
+    config.REUSE_OBS_BUFFERS = True
+    env = nmmo.Env(config)
+    ref_env = nmmo.Env(nmmo.config.Default())
+
+    obs = env.reset(seed=1)
+    ref_obs = ref_env.reset(seed=1)
+    entity_buffers = {agent_id: agent_obs['Entity'] for agent_id, agent_obs in obs.items()}
+    for _ in range(3):
+      self._assert_same_obs(obs, ref_obs)
+      obs, _, _, _ = env.step({})
+      ref_obs, _, _, _ = ref_env.step({})
+
+    # the same arrays are overwritten in place
+    for agent_id, agent_obs in obs.items():
+      self.assertIs(agent_obs['Entity'], entity_buffers[agent_id])
+    self._test_gym_obs_space(env)
+
+    # dummy obs for the dead agents are written into the buffers too
+    # pylint: disable=protected-access
+    dummy_obs = env._dummy_obs.to_gym()
+    buffer_obs = env._dummy_obs.to_gym(env._agent_obs_buffers[1])
+    self._assert_same_obs({1: buffer_obs}, {1: dummy_obs})
+
+  def test_env_with_action_targets_heads(self):
+    config = nmmo.config.Default()
+    config.ACTION_TARGETS_HEADS = ['Move', 'Attack']
+    env = nmmo.Env(config)
+    env.reset(seed=1)
+    obs, _, _, _ = env.step({})
+
+    self.assertListEqual(list(env.observation_space(1)['ActionTargets']), ['Attack', 'Move'])
+    for agent_obs in obs.values():
+      self.assertSetEqual(set(agent_obs['ActionTargets']), {'Move', 'Attack'})
+    self._test_gym_obs_space(env)
+
+  def test_lazy_action_targets(self):
+    env = nmmo.Env(nmmo.config.Default())
+    env.reset(seed=1)
+
+    # the masks are only computed when accessed
+    # pylint: disable=protected-access
+    agent_obs = env._compute_observations()[1]
+    action_targets = agent_obs.action_targets
+    self.assertDictEqual(action_targets._masks, {})
+    move_mask = action_targets['Move']['Direction']
+    self.assertListEqual(list(action_targets._masks), ['Move'])
+    self.assertIs(agent_obs.to_gym()['ActionTargets']['Move']['Direction'], move_mask)
+
+    # the dead agents share the same read-only masks
+    dummy_obs = [copy(env._dummy_obs) for _ in range(2)]
+    masks = [obs.to_gym()['ActionTargets']['Attack']['Target'] for obs in dummy_obs]
+    self.assertIs(masks[0], masks[1])
+    self.assertFalse(masks[0].flags.writeable)
+
+  def _assert_same_obs(self, obs, ref_obs):
+    self.assertEqual(obs.keys(), ref_obs.keys())
+    for agent_id, agent_obs in obs.items():
+      for key, val in agent_obs.items():
+        if key == 'ActionTargets':
+          for atn, args in val.items():
+            for arg, mask in args.items():
+              self.assertTrue(np.array_equal(mask, ref_obs[agent_id][key][atn][arg]))
+        else:
+          self.assertTrue(np.array_equal(val, ref_obs[agent_id][key]), key)
+
 if __name__ == '__main__':
   unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+from time import perf_counter
+
+import nmmo
+from nmmo.lib.perf_stats import PerfStats
+
+class Config(nmmo.config.Small, nmmo.config.AllGameSystems):
+  PLAYER_N = 16
+  PERF_STATS_WINDOW = 8
+
+class TestPerfStats(unittest.TestCase):
+  def test_ring_buffer(self):
+    perf = PerfStats(window=4)
+    for tick in range(6):
+      perf.start_tick()
+      # record tick seconds, in two laps
+      perf.lap('first', perf.lap('first', perf_counter() - tick / 2) - tick / 2)
+      if tick == 5:
+        perf.lap('second', perf_counter() - 1)
+      perf.end_tick()
+    stats = perf.stats()
+    self.assertEqual(perf.num_ticks, 4)
+    # ticks 2 to 5 are in the window
+    self.assertAlmostEqual(stats['first']['mean'], 3.5 * 1000, delta=10)
+    self.assertAlmostEqual(stats['first']['max'], 5 * 1000, delta=10)
+    self.assertEqual(stats['second']['p50'], 0)
+    self.assertAlmostEqual(stats['second']['max'], 1000, delta=10)
+
+  def test_not_recorded_outside_of_ticks(self):
+    perf = PerfStats(window=4)
+    perf.lap('phase', perf_counter())
+    self.assertEqual(perf.stats(), {})
+
+  def test_env_perf_stats(self):
+    env = nmmo.Env(Config())
+    env.reset(seed=1)
+    self.assertEqual(env.perf_stats(), {})
+    for _ in range(10):
+      env.step({})
+
+    stats = env.perf_stats()
+    self.assertEqual(env.realm.perf.num_ticks, Config.PERF_STATS_WINDOW)
+    for phase in ['scripted_actions', 'validate_actions', 'npc_actions', 'action:Move',
+                  'cull', 'map', 'exchange', 'observations', 'action_targets',
+                  'game_state', 'tasks', 'step']:
+      self.assertIn(phase, stats)
+    total = sum(phase_stats['mean'] for phase, phase_stats in stats.items() if phase != 'step')
+    self.assertLessEqual(total, stats['step']['mean'])
+
+  def test_disabled(self):
+    class NoStatsConfig(Config):
+      PERF_STATS_WINDOW = 0
+    env = nmmo.Env(NoStatsConfig())
+    env.reset(seed=1)
+    env.step({})
+    self.assertEqual(env.perf_stats(), {})
+
+if __name__ == '__main__':
+  unittest.main()
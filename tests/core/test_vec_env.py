@@ -0,0 +1,124 @@
+import unittest
+
+import numpy as np
+
+import nmmo
+from nmmo.core.vec_env import VecEnv, _env_view, _make_buffers
+from scripted import baselines
+
+RANDOM_SEED = 3
+NUM_ENVS = 3
+
+class Config(nmmo.config.Small, nmmo.config.AllGameSystems):
+  PATH_MAPS = 'maps/vec_env'
+  MAP_FORCE_GENERATION = False
+  PLAYER_N = 8
+  PLAYERS = [baselines.Random]
+  HORIZON = 4
+
+def stack_obs(obs, num_agents):
+  # stack the dict obs of a single env into the [agent, ...] layout of VecEnv
+  def stack(key_fn, template):
+    arr = np.zeros((num_agents,) + np.shape(template), dtype=np.asarray(template).dtype)
+    for agent_id, agent_obs in obs.items():
+      arr[agent_id-1] = key_fn(agent_obs)
+    return arr
+  any_obs = next(iter(obs.values()))
+  stacked = {}
+  for key, val in any_obs.items():
+    if isinstance(val, dict):
+      stacked[key] = {
+        atn: {arg: stack(lambda o, a=atn, g=arg, k=key: o[k][a][g], mask)
+              for arg, mask in args.items()}
+        for atn, args in val.items()}
+    else:
+      stacked[key] = stack(lambda o, k=key: o[k], val)
+  return stacked
+
+class TestVecEnv(unittest.TestCase):
+  @classmethod
+  def setUpClass(cls):
+    cls.config = Config()
+    cls.vec_env = VecEnv(cls.config, NUM_ENVS, num_workers=2, seed=RANDOM_SEED)
+    cls.ref_envs = [nmmo.Env(cls.config) for _ in range(NUM_ENVS)]
+
+  @classmethod
+  def tearDownClass(cls):
+    cls.vec_env.close()
+
+  def _assert_same_obs(self, vec_obs, env_idx, ref_obs):
+    ref_stacked = stack_obs(ref_obs, self.config.PLAYER_N)
+    for key, val in ref_stacked.items():
+      if isinstance(val, dict):
+        for atn, args in val.items():
+          for arg, mask in args.items():
+            self.assertTrue(np.array_equal(vec_obs[key][atn][arg][env_idx], mask))
+      else:
+        self.assertTrue(np.array_equal(vec_obs[key][env_idx], val), key)
+
+  def test_matches_single_env(self):
+    vec_obs = self.vec_env.reset(seed=RANDOM_SEED)
+    ref_obs = [env.reset(seed=RANDOM_SEED+i) for i, env in enumerate(self.ref_envs)]
+    self.assertEqual(vec_obs['Tile'].shape,
+                     (NUM_ENVS, self.config.PLAYER_N, self.config.MAP_N_OBS, 3))
+    for i in range(NUM_ENVS):
+      self._assert_same_obs(vec_obs, i, ref_obs[i])
+      self.assertEqual(self.vec_env.mask[i].sum(), len(ref_obs[i]))
+
+    for _ in range(self.config.HORIZON - 1):
+      vec_obs, rewards, dones, infos = self.vec_env.step()
+      self.assertEqual(len(infos), NUM_ENVS)
+      for i, env in enumerate(self.ref_envs):
+        obs, ref_rewards, ref_dones, _ = env.step({})
+        self._assert_same_obs(vec_obs, i, obs)
+        for agent_id in obs:
+          self.assertEqual(rewards[i, agent_id-1], ref_rewards[agent_id])
+          self.assertEqual(dones[i, agent_id-1], ref_dones[agent_id])
+
+  def test_autoreset(self):
+    self.vec_env.reset(seed=RANDOM_SEED)
+    for _ in range(self.config.HORIZON - 1):
+      _, _, dones, _ = self.vec_env.step()
+      self.assertFalse(np.any(dones))
+
+    # the terminal step returns the dones, and the first obs of the next episode
+    vec_obs, _, dones, _ = self.vec_env.step()
+    self.assertTrue(np.all(dones[self.vec_env.mask]))
+    self.assertTrue(np.all(vec_obs['CurrentTick'][self.vec_env.mask] == 0))
+
+    vec_obs, _, dones, _ = self.vec_env.step()
+    self.assertFalse(np.any(dones))
+    self.assertTrue(np.all(vec_obs['CurrentTick'][self.vec_env.mask] == 1))
+
+  def test_env_writes_in_place(self):
+    # the envs write their obs straight into the [env, agent, ...] buffers
+    config = Config()
+    config.REUSE_OBS_BUFFERS = True
+    env = nmmo.Env(config)
+    buffers = _make_buffers(env.observation_space(1), NUM_ENVS, self.config.PLAYER_N,
+                            lambda shape, dtype: np.zeros(shape, dtype=dtype))
+    env._make_obs_buffers(_env_view(buffers['obs'], 1)) # pylint: disable=protected-access
+    obs = env.reset(seed=RANDOM_SEED)
+    for agent_id, agent_obs in obs.items():
+      self.assertTrue(np.shares_memory(agent_obs['Tile'], buffers['obs']['Tile'][1, agent_id-1]))
+      self.assertEqual(buffers['obs']['AgentId'][1, agent_id-1], agent_id)
+    self.assertFalse(np.any(buffers['obs']['AgentId'][[0, 2]]))
+
+  def test_batched_obs_config(self):
+    # the envs of a VecEnv return per-agent obs, whatever BATCHED_OBS
+    config = Config()
+    config.BATCHED_OBS = True
+    vec_env = VecEnv(config, 2, num_workers=1, seed=RANDOM_SEED)
+    try:
+      vec_obs = vec_env.reset(seed=RANDOM_SEED)
+      ref_obs = self.ref_envs[0].reset(seed=RANDOM_SEED)
+      self.assertEqual(vec_env.mask[0].sum(), len(ref_obs))
+      self._assert_same_obs(vec_obs, 0, ref_obs)
+      vec_obs, _, _, _ = vec_env.step()
+      self.assertTrue(np.all(vec_env.mask))
+      self.assertTrue(np.all(vec_obs['AgentId'][vec_env.mask] > 0))
+    finally:
+      vec_env.close()
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,62 @@
+import unittest
+
+import numpy as np
+
+import nmmo
+from nmmo.core.visibility import Visibility
+from nmmo.entity.entity import EntityState
+from scripted import baselines
+
+RANDOM_SEED = 5
+EntityAttr = EntityState.State.attr_name_to_col
+
+class Config(nmmo.config.Small, nmmo.config.AllGameSystems):
+  PLAYER_N = 32
+  PLAYERS = [baselines.Random]
+  PLAYER_N_OBS = 8 # to also check the truncation
+
+class TestVisibility(unittest.TestCase):
+  @classmethod
+  def setUpClass(cls):
+    cls.config = Config()
+    cls.env = nmmo.Env(cls.config, RANDOM_SEED)
+    cls.env.reset(seed=RANDOM_SEED)
+    for _ in range(5):
+      cls.env.step({})
+
+  def test_matches_window(self):
+    realm = self.env.realm
+    radius = self.config.PLAYER_VISION_RADIUS
+    vis = Visibility.from_realm(realm)
+    for agent_id, agent in realm.players.items():
+      expected = EntityState.Query.window(realm.datastore, agent.row.val, agent.col.val, radius)
+      expected = expected[:self.config.PLAYER_N_OBS]
+      np.testing.assert_array_equal(vis.visible_entities(agent_id), expected)
+
+      dist = np.maximum(np.abs(expected[:, EntityAttr["row"]].astype(int) - agent.row.val),
+                        np.abs(expected[:, EntityAttr["col"]].astype(int) - agent.col.val))
+      np.testing.assert_array_equal(vis.visible_distance(agent_id), dist)
+      self.assertSetEqual(vis.visible_ids(agent_id),
+                          set(expected[:, EntityAttr["id"]].tolist()))
+
+    # absent agents see nothing
+    self.assertEqual(len(vis.visible_entities(0)), 0)
+    self.assertSetEqual(vis.visible_ids(0), set())
+
+  def test_distance_matrix(self):
+    vis = Visibility.from_realm(self.env.realm)
+    agent_ids = self.env.possible_agents
+    dist = vis.distance_matrix(agent_ids, self.config.PLAYER_N_OBS)
+    for slot, agent_id in enumerate(agent_ids):
+      agent_dist = vis.visible_distance(agent_id)
+      np.testing.assert_array_equal(dist[slot, :len(agent_dist)], agent_dist)
+      self.assertFalse(np.any(dist[slot, len(agent_dist):]))
+
+  def test_empty(self):
+    entities = np.zeros((0, len(EntityAttr)), dtype=np.int16)
+    vis = Visibility(entities, [], 7, 100)
+    self.assertEqual(len(vis.visible_entities(1)), 0)
+    self.assertEqual(vis.distance_matrix([1, 2], 100).shape, (2, 100))
+
+if __name__ == '__main__':
+  unittest.main()
@@ -60,5 +60,25 @@ class TestIdAllocator(unittest.TestCase):
     id_allocator.remove(10)
     self.assertEqual(id_allocator.allocate(), 10)
 
+  def test_allocate_many(self):
+    id_allocator = IdAllocator(10)
+    self.assertListEqual(id_allocator.allocate_many(4), [1, 2, 3, 4])
+
+    # freed ids are handed out first-in, first-out, after the initial ids
+    id_allocator.free_many([3, 1])
+    id_allocator.remove(3) # already free
+    self.assertListEqual(id_allocator.allocate_many(7), [5, 6, 7, 8, 9, 3, 1])
+    self.assertTrue(id_allocator.full())
+
+    with self.assertRaises(KeyError):
+      id_allocator.allocate_many(1)
+
+    id_allocator.free_many([2, 4])
+    state = id_allocator.save_state()
+    self.assertEqual(id_allocator.allocate(), 2)
+    id_allocator.load_state(state)
+    self.assertListEqual(id_allocator.allocate_many(2), [2, 4])
+    self.assertTrue(id_allocator.full())
+
 if __name__ == '__main__':
   unittest.main()
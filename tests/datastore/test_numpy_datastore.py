@@ -43,5 +43,118 @@ class TestNumpyTable(unittest.TestCase):
       np.array([[10.1, 0, 0], [2.1, 0, 0]], dtype=np.float32)
     )
 
+  def test_col_dtypes(self):
+    table = NumpyTable(3, 100, col_dtypes=[np.int8, np.int16, np.int32])
+    # the widest column sets the storage of the whole table
+    self.assertEqual(table.storage_dtype, np.int32)
+    self.assertEqual(table.view().dtype, np.int32)
+
+    row_id = table.add_row()
+    # the writes saturate to the column dtype, instead of wrapping around
+    for value, expected in [(200, [127, 200, 200]),
+                            (-40000, [-128, -32768, -40000]),
+                            (100000, [127, 32767, 100000])]:
+      for col in range(3):
+        table.update(row_id, col, value)
+      np.testing.assert_array_equal(table.get([row_id])[0], expected)
+
+  def test_add_remove_rows(self):
+    table = NumpyTable(3, 100, np.int16)
+    ref_table = NumpyTable(3, 100, np.int16)
+    table.enable_index(1)
+
+    row_ids = table.add_rows(150) # expands the table
+    self.assertListEqual(row_ids, [ref_table.add_row() for _ in range(150)])
+    for row_id in row_ids:
+      table.update(row_id, 1, row_id % 3)
+      ref_table.update(row_id, 1, row_id % 3)
+
+    removed = row_ids[10:60]
+    table.remove_rows(removed)
+    for row_id in removed:
+      ref_table.remove_row(row_id)
+    np.testing.assert_array_equal(table._data, ref_table._data)
+    np.testing.assert_array_equal(table.where_eq(1, 2), ref_table.where_eq(1, 2))
+
+    self.assertListEqual(table.add_rows(60), [ref_table.add_row() for _ in range(60)])
+
+  def test_delta_since(self):
+    rng = np.random.default_rng(0)
+    table = NumpyTable(3, 100, np.int16)
+    table.write_tick = 1
+    row_ids = table.add_rows(120)
+    for row_id in row_ids:
+      table.update(row_id, 0, row_id)
+
+    mirror = {} # row id -> row, as kept by a consumer
+    for tick in range(1, 20):
+      # apply the changes since the mirror was taken
+      changed_ids, rows, removed_ids = table.delta_since(tick - 1)
+      for row_id in removed_ids.tolist():
+        del mirror[row_id]
+      mirror.update(zip(changed_ids.tolist(), rows.tolist()))
+      live = sorted(set(range(1, table._max_rows)) - set(table._id_allocator.free))
+      self.assertListEqual(sorted(mirror), live)
+      for row_id in live:
+        self.assertListEqual(mirror[row_id], table._data[row_id].tolist())
+
+      # the next tick, which only touches a few rows
+      table.write_tick = tick + 1
+      for row_id in rng.choice(live, size=5, replace=False).tolist():
+        if rng.random() < 0.5:
+          table.remove_row(row_id)
+        else:
+          table.update(row_id, rng.integers(3), rng.integers(100))
+      for _ in range(3):
+        table.update(table.add_row(), 1, tick)
+
+      _, rows, _ = table.delta_since(tick)
+      self.assertLessEqual(len(rows), 8)
+
+    # the stamps are part of the state
+    state = table.save_state()
+    expected = table.delta_since(10)
+    table.reset()
+    table.load_state(state)
+    for arr, expected_arr in zip(table.delta_since(10), expected):
+      np.testing.assert_array_equal(arr, expected_arr)
+
+  def test_hash_index(self):
+    rng = np.random.default_rng(0)
+    table = NumpyTable(3, 100, np.int16)
+    scan_table = NumpyTable(3, 100, np.int16)
+    table.enable_index(1)
+
+    def check_queries():
+      for value in range(-1, 8):
+        np.testing.assert_array_equal(table.where_eq(1, value), scan_table.where_eq(1, value))
+      for values in [[1, 2], [3, 5, 9], [], [0, 4]]:
+        np.testing.assert_array_equal(table.where_in(1, values),
+                                      scan_table.where_in(1, values))
+
+    row_ids = []
+    for step in range(200):
+      if step % 5 == 0 or not row_ids:
+        row_ids.append(table.add_row())
+        self.assertEqual(scan_table.add_row(), row_ids[-1])
+      row_id = row_ids[rng.integers(len(row_ids))]
+      if step % 11 == 0:
+        table.remove_row(row_id)
+        scan_table.remove_row(row_id)
+        row_ids.remove(row_id)
+      else:
+        value = rng.integers(-1, 8)
+        for tbl in (table, scan_table):
+          tbl.update(row_id, 1, value)
+          tbl.update(row_id, 2, row_id)
+      check_queries()
+
+    # the index is rebuilt from the loaded data
+    state = table.save_state()
+    table.reset()
+    self.assertEqual(len(table.where_eq(1, 3)), 0)
+    table.load_state(state)
+    check_queries()
+
 if __name__ == '__main__':
   unittest.main()
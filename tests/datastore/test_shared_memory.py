@@ -0,0 +1,74 @@
+import os
+import unittest
+
+import numpy as np
+
+import nmmo
+from nmmo.datastore.shared_memory import SharedMemoryDatastore, SharedMemoryReader
+
+# pylint: disable=protected-access
+
+def unique_name(tag):
+  return f"nmmo_test_{tag}_{os.getpid()}"
+
+class TestSharedMemory(unittest.TestCase):
+  def test_datastore(self):
+    name = unique_name("ds")
+    datastore = SharedMemoryDatastore(name)
+    datastore.register_object_type("Foo", 3, [np.int16, np.int16, np.int32])
+    table = datastore.table("Foo")
+    reader = SharedMemoryReader(name, ["Foo"])
+
+    # the tables are being written until the first end_write()
+    with self.assertRaises(TimeoutError):
+      reader.read(timeout=0.01)
+
+    row_id = table.add_row()
+    table.update(row_id, 2, 100000)
+    datastore.end_write(1)
+    tick, tables = reader.read(timeout=1)
+    self.assertEqual(tick, 1)
+    self.assertEqual(tables["Foo"].dtype, np.int32)
+    np.testing.assert_array_equal(tables["Foo"], table._data)
+
+    # the reader follows the table to its new segment
+    datastore.begin_write(2)
+    with self.assertRaises(TimeoutError):
+      reader.read(timeout=0.01)
+    row_ids = table.add_rows(150)
+    table.update(row_ids[-1], 0, 7)
+    datastore.end_write(2)
+    tick, tables = reader.read(timeout=1)
+    self.assertEqual(tick, 2)
+    self.assertEqual(len(tables["Foo"]), len(table._data))
+    np.testing.assert_array_equal(tables["Foo"], table._data)
+
+    reader.close()
+    datastore.close()
+    self.assertFalse([f for f in os.listdir("/dev/shm") if f.startswith(name)])
+
+  def test_env(self):
+    config = nmmo.config.Small()
+    config.SHARED_MEMORY_NAME = unique_name("env")
+    env = nmmo.Env(config, seed=0)
+    env.reset(seed=0)
+    reader = SharedMemoryReader(config.SHARED_MEMORY_NAME, ["Entity", "Item", "Tile"])
+    for _ in range(3):
+      env.step({})
+      tick, tables = reader.read(timeout=1)
+      self.assertEqual(tick, env.realm.tick)
+      for name, data in tables.items():
+        np.testing.assert_array_equal(data, env.realm.datastore.table(name)._data)
+
+    # the state is the same as with the in-process datastore
+    ref_env = nmmo.Env(nmmo.config.Small(), seed=0)
+    ref_env.reset(seed=0)
+    for _ in range(3):
+      ref_env.step({})
+    np.testing.assert_array_equal(tables["Entity"], ref_env.realm.datastore.table("Entity")._data)
+
+    reader.close()
+    env.close()
+
+if __name__ == '__main__':
+  unittest.main()
@@ -2,6 +2,7 @@ import unittest
 import numpy as np
 
 import nmmo
+from nmmo.core.observation import fill_rows
 from nmmo.entity.entity import Entity, EntityState
 from nmmo.datastore.numpy_datastore import NumpyDatastore
 
@@ -10,8 +11,10 @@ class MockRealm:
     self.config = nmmo.config.Default()
     self.config.PLAYERS = range(100)
     self.datastore = NumpyDatastore()
-    self.datastore.register_object_type("Entity", EntityState.State.num_attributes)
+    self.datastore.register_object_type("Entity", EntityState.State.num_attributes,
+                                        EntityState.State.dtypes)
     self._np_random = np.random
+    self.entity_pool = []
 
 # pylint: disable=no-member
 class TestEntity(unittest.TestCase):
@@ -57,6 +60,27 @@ class TestEntity(unittest.TestCase):
     e_row = EntityState.Query.by_id(realm.datastore, entity_id)
     self.assertEqual(e_row[Entity.State.attr_name_to_col["food"]], 11)
 
+  def test_wide_columns(self):
+    realm = MockRealm()
+    entity = Entity(realm, (10,20), 123, "name")
+    gold_col = Entity.State.attr_name_to_col["gold"]
+    exp_col = Entity.State.attr_name_to_col["melee_exp"]
+
+    # gold and exp do not fit in int16
+    entity.gold.update(100000)
+    entity.melee_exp.update(2**31)
+    self.assertEqual(entity.gold.val, 100000)
+    self.assertEqual(entity.melee_exp.val, 2**31 - 1)
+    e_row = EntityState.Query.by_id(realm.datastore, 123)
+    self.assertEqual(e_row[gold_col], 100000)
+    self.assertEqual(e_row[exp_col], 2**31 - 1)
+
+    # the int16 obs saturate
+    buffer = np.ones((2, EntityState.State.num_attributes), dtype=np.int16)
+    fill_rows(buffer, e_row[None, :])
+    self.assertEqual(buffer[0, gold_col], 2**15 - 1)
+    self.assertEqual(buffer[0, Entity.State.attr_name_to_col["row"]], 10)
+    self.assertFalse(np.any(buffer[1]))
 
 if __name__ == '__main__':
   unittest.main()
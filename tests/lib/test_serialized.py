@@ -3,7 +3,7 @@ import unittest
 
 from nmmo.datastore.serialized import SerializedState
 
-# pylint: disable=no-member,unused-argument,unsubscriptable-object
+# pylint: disable=no-member,unused-argument,unsubscriptable-object,protected-access
 
 FooState = SerializedState.subclass("FooState", [
   "a", "b", "col"
@@ -13,15 +13,23 @@ FooState.Limits = {
   "a": (-10, 10),
 }
 
-class MockDatastoreRecord():
+class MockTable():
   def __init__(self):
     self._data = defaultdict(lambda: 0)
 
-  def get(self, name):
-    return self._data[name]
+  def update(self, row_id, col, value):
+    self._data[(row_id, col)] = value
+
+class MockDatastoreRecord():
+  def __init__(self):
+    self.table = MockTable()
+    self.id = 1
+
+  def get(self, col):
+    return self.table._data[(self.id, col)]
 
-  def update(self, name, value):
-    self._data[name] = value
+  def update(self, col, value):
+    self.table.update(self.id, col, value)
 
 class MockDatastore():
   def create_record(self, name):
@@ -52,5 +60,20 @@ class TestSerialized(unittest.TestCase):
     state.a.update(a_max + 100)
     self.assertEqual(state.a.val, a_max)
 
+    # the clamped value is written to the record
+    self.assertEqual(state.datastore_record.get(FooState.State.attr_name_to_col["a"]), a_max)
+
+  def test_rebind(self):
+    state = FooState(MockDatastore(), FooState.Limits)
+    state.b.update(3)
+    self.assertFalse(hasattr(state.b, "__dict__"))
+
+    record = MockDatastoreRecord()
+    state.b.rebind(record)
+    self.assertEqual(state.b.val, 0)
+    self.assertIs(state.b.datastore_record, record)
+    state.b.update(5)
+    self.assertEqual(record.get(FooState.State.attr_name_to_col["b"]), 5)
+
 if __name__ == '__main__':
   unittest.main()
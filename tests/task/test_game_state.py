@@ -0,0 +1,111 @@
+import unittest
+
+import numpy as np
+
+import nmmo
+from nmmo.entity.entity import EntityState
+from nmmo.lib.event_log import EventState
+from nmmo.lib.log import EventCode
+from nmmo.systems.item import ItemState
+from nmmo.task.game_state import group_by
+from tests.testhelpers import ScriptedAgentTestConfig
+
+RANDOM_SEED = 3
+
+EntityAttr = EntityState.State.attr_name_to_col
+EventAttr = EventState.State.attr_name_to_col
+ItemAttr = ItemState.State.attr_name_to_col
+
+class TestGameState(unittest.TestCase):
+  def _assert_matches_tables(self, env):
+    '''The game state gives the same rows as filtering the whole tables'''
+    gs = env.game_state
+    datastore = env.realm.datastore
+    entities = EntityState.Query.table(datastore)
+    items = ItemState.Query.table(datastore)
+    events = EventState.Query.table(datastore)
+    self.assertSetEqual(gs.alive_agents, set(entities[:, EntityAttr["id"]].tolist()) - {0} \
+                        - set(entities[entities[:, EntityAttr["id"]] < 0, EntityAttr["id"]]))
+
+    subjects = [(1,), (2, 3), tuple(env.possible_agents), (-1, -2)]
+    for subject in subjects:
+      for data_type, data, col in [('entity', entities, EntityAttr["id"]),
+                                   ('item', items, ItemAttr["owner_id"]),
+                                   ('event', events, EventAttr["ent_id"])]:
+        expected = np.concatenate([data[data[:, col] == sbj] for sbj in subject])
+        np.testing.assert_array_equal(gs.where_in_id(data_type, subject), expected)
+
+    # the running event totals match the recorded events
+    for ent_id in env.possible_agents:
+      agent_events = gs.where_in_id('event', (ent_id,))
+      for event_code in set(agent_events[:, EventAttr["event"]].tolist()):
+        rows = agent_events[agent_events[:, EventAttr["event"]] == event_code]
+        self.assertListEqual(gs.event_totals.get((ent_id,), event_code),
+                             [len(rows), rows[:, EventAttr["number"]].sum(),
+                              rows[:, EventAttr["gold"]].sum()])
+
+    for ent_id in [1, 2, -1, 0, 10**4]:
+      expected = entities[entities[:, EntityAttr["id"]] == ent_id]
+      ent = gs.entity_or_none(ent_id)
+      if len(expected) == 0:
+        self.assertIsNone(ent)
+      else:
+        self.assertEqual(ent.row, expected[0, EntityAttr["row"]])
+
+  def test_group_by(self):
+    keys = np.array([3, 1, 3, 2, 1, 3])
+    unique, order, starts, counts = group_by(keys)
+    np.testing.assert_array_equal(unique, [1, 2, 3])
+    np.testing.assert_array_equal(counts, [2, 1, 3])
+    for key, start, count in zip(unique, starts, counts):
+      # the positions of each key are in their original order
+      np.testing.assert_array_equal(order[start:start+count], np.flatnonzero(keys == key))
+
+  def test_incremental_indexes(self):
+    env = nmmo.Env(ScriptedAgentTestConfig(), RANDOM_SEED)
+    env.reset(seed=RANDOM_SEED)
+    for _ in range(10):
+      env.step({})
+      self._assert_matches_tables(env)
+    state = env.save_state()
+
+    for _ in range(5):
+      env.step({})
+      self._assert_matches_tables(env)
+    later_state = env.save_state()
+
+    # the event index is rebuilt after loading an earlier state
+    env.load_state(state)
+    for _ in range(3):
+      # make this branch record other events than the first one
+      for agent_id in list(env.realm.players)[:3]:
+        env.realm.event_log.record(EventCode.EAT_FOOD, env.realm.players[agent_id])
+      env.step({})
+      self._assert_matches_tables(env)
+
+    # and after loading a later state, from another branch
+    env.load_state(later_state)
+    for _ in range(2):
+      env.step({})
+      self._assert_matches_tables(env)
+
+    # the raw tables are read-only views
+    gs = env.game_state
+    with self.assertRaises(ValueError):
+      gs.entity_table[1, 0] = 1
+
+    # the data are copies of the live rows, which outlive the step
+    entity_data = gs.entity_data
+    np.testing.assert_array_equal(entity_data,
+                                  EntityState.Query.table(env.realm.datastore))
+    for data, index, col in [(gs.entity_data, gs.entity_index, EntityAttr["id"]),
+                             (gs.item_data, gs.item_index, ItemAttr["owner_id"]),
+                             (gs.event_data, gs.event_index, EventAttr["ent_id"])]:
+      for ent_id, rows in index.items():
+        self.assertTrue(np.all(data[rows, col] == ent_id))
+    expected = entity_data.copy()
+    env.step({})
+    np.testing.assert_array_equal(entity_data, expected)
+
+if __name__ == '__main__':
+  unittest.main()
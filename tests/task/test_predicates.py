@@ -15,8 +15,8 @@ from nmmo.lib.log import EventCode
 
 # pylint: disable=import-error
 from nmmo.core.env import Env
-from nmmo.task.predicate_api import Predicate, make_predicate
-from nmmo.task.task_api import OngoingTask
+from nmmo.task.predicate_api import Predicate, make_predicate, batch_evaluate, predicate_inputs
+from nmmo.task.task_api import OngoingTask, make_same_task
 from nmmo.task.group import Group
 import nmmo.task.base_predicates as bp
 
@@ -799,5 +799,82 @@ class TestBasePredicate(unittest.TestCase):
 
     # DONE
 
+  def _make_same_tasks(self, pred_specs):
+    config = ScriptedAgentTestConfig()
+    config.IMMORTAL = True
+    config.ALLOW_MULTI_TASKS_PER_AGENT = True
+    env = Env(config)
+    tasks = []
+    for pred_fn, pred_kwargs in pred_specs:
+      tasks += make_same_task(pred_fn, env.possible_agents, pred_kwargs=pred_kwargs)
+    return env, tasks
+
+  def _assert_cached_progress(self, gs, tasks):
+    for task in tasks:
+      # the same progress as the predicate evaluated alone
+      cached = gs.cache_result.pop(task.eval_fn.name)
+      self.assertEqual(task.eval_fn(gs), cached)
+
+  def test_batch_evaluate(self):
+    env, tasks = self._make_same_tasks([
+      (bp.StayAlive, {}),
+      (bp.HoardGold, {'amount': 3}),
+      (bp.AttainSkill, {'skill': Skill.Fishing, 'level': 2, 'num_agent': 1}),
+      (bp.CountEvent, {'event': 'EAT_FOOD', 'N': 5}),
+      (bp.CountEvent, {'event': 'DRINK_WATER', 'N': 5})])
+    # the removed agents are batched with the others
+    tasks += make_same_task(bp.StayAlive, [1000, 1001])
+    env.reset(make_task_fn=lambda: tasks)
+
+    for _ in range(10):
+      env.step({})
+      gs = env.game_state
+      # the env skips the completed tasks, so evaluate all the predicates again
+      for task in tasks:
+        self.assertIsNotNone(task.eval_fn.batch_key())
+        gs.cache_result.pop(task.eval_fn.name, None)
+      batch_evaluate([task.eval_fn for task in tasks], gs)
+      self._assert_cached_progress(gs, tasks)
+
+  def test_reuse_unchanged_progress(self):
+    env, tasks = self._make_same_tasks([
+      (bp.HoardGold, {'amount': 30}),
+      (bp.AttainSkill, {'skill': Skill.Fishing, 'level': 3, 'num_agent': 1}),
+      (bp.OccupyTile, {'row': 80, 'col': 80}),
+      (bp.OwnItem, {'item': Item.Ration, 'level': 0, 'quantity': 3}),
+      (bp.EquipItem, {'item': Item.Hat, 'level': 0, 'num_agent': 1})])
+    # the teams are watched for each of their agents
+    agents = env.possible_agents
+    tasks += [make_predicate(bp.HoardGold)(Group(agents[i:i+4]), 100).create_task()
+              for i in range(0, len(agents), 4)]
+    # only the predicates whose inputs changed are evaluated again
+    tasks += make_same_task(CountedGold, agents, pred_kwargs={'amount': 100})
+    env.reset(make_task_fn=lambda: tasks)
+
+    gold = {}
+    for tick in range(20):
+      if tick == 10:
+        env.realm.players[1].gold.update(env.realm.players[1].gold.val + 5)
+        env.realm.players[2].gold.update(env.realm.players[2].gold.val + 7)
+      GOLD_CALLS.clear()
+      env.step({})
+      # all in the first tick, then only those whose gold changed
+      new_gold = {agent_id: env.realm.players[agent_id].gold.val for agent_id in agents}
+      self.assertListEqual(sorted(GOLD_CALLS), [(agent_id,) for agent_id in agents
+                                                if gold.get(agent_id) != new_gold[agent_id]])
+      if tick == 10:
+        self.assertTrue({(1,), (2,)}.issubset(GOLD_CALLS))
+      gold = new_gold
+      # the tasks completed before are no longer evaluated
+      self._assert_cached_progress(env.game_state, [
+        task for task in tasks if task.progress_info['completed_tick'] in (None, tick + 1)])
+
+# records its subject for test_reuse_unchanged_progress
+GOLD_CALLS = []
+def CountedGold(gs, subject, amount): # pylint: disable=invalid-name
+  GOLD_CALLS.append(subject.agents)
+  return bp.HoardGold(gs, subject, amount)
+predicate_inputs(CountedGold, entity=['gold'])
+
 if __name__ == '__main__':
   unittest.main()
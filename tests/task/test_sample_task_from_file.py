@@ -1,6 +1,14 @@
+import os
+import shutil
+import tempfile
 import unittest
 
+import dill
+import numpy as np
+
 import nmmo
+from nmmo.task import base_predicates as bp
+from nmmo.task.task_spec import TaskSpec, Curriculum, load_curriculum
 from tests.testhelpers import ScriptedAgentTestConfig
 
 class TestSampleTaskFromFile(unittest.TestCase):
@@ -19,5 +27,33 @@ class TestSampleTaskFromFile(unittest.TestCase):
     for task in env.tasks:
       self.assertEqual(task.assignee, task.subject)
 
+  def test_curriculum_cache(self):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+      file_path = os.path.join(tmp_dir, 'curriculum.pkl')
+      shutil.copy('tests/task/sample_curriculum.pkl', file_path)
+      curriculum = load_curriculum(file_path)
+      # the file is not read again, until it changes
+      self.assertIs(load_curriculum(file_path), curriculum)
+
+      with open(file_path, 'wb') as f:
+        dill.dump(curriculum.specs[:1], f)
+      os.utime(file_path, ns=(0, 0))
+      self.assertEqual(len(load_curriculum(file_path)), 1)
+
+  def test_weighted_sampling(self):
+    weights = [1, 3, 0, 6]
+    curriculum = Curriculum([TaskSpec(eval_fn=bp.StayAlive, eval_fn_kwargs={},
+                                      sampling_weight=w) for w in weights])
+    sampled = curriculum.sample(np.random.default_rng(0), 100000)
+    counts = [sum(spec is s for s in sampled) for spec in curriculum.specs]
+    np.testing.assert_allclose(np.array(counts) / len(sampled),
+                               np.array(weights) / sum(weights), atol=0.01)
+
+  def test_invalid_weights(self):
+    for weights in [[1, -1, 3], [0, 0], [float('nan'), 1]]:
+      with self.assertRaises(AssertionError):
+        Curriculum([TaskSpec(eval_fn=bp.StayAlive, eval_fn_kwargs={},
+                             sampling_weight=w) for w in weights])
+
 if __name__ == '__main__':
   unittest.main()
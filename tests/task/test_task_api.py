@@ -5,7 +5,7 @@ import numpy as np
 
 import nmmo
 from nmmo.core.env import Env
-from nmmo.task.predicate_api import make_predicate, Predicate
+from nmmo.task.predicate_api import make_predicate, Predicate, PredicateGraph
 from nmmo.task.task_api import Task, OngoingTask, HoldDurationTask
 from nmmo.task.task_spec import TaskSpec, make_task_from_spec
 from nmmo.task.group import Group
@@ -111,6 +111,57 @@ class TestTaskAPI(unittest.TestCase):
     pred6 = 0.3 * SUCCESS + 1
     self.assertEqual(pred6(mock_gs), 1.0) # cannot go over 1
 
+  def test_predicate_graph(self):
+    # pylint: disable=no-value-for-parameter
+    num_calls = []
+    def Counted(gs, subject: Group, value: float):
+      num_calls.append(value)
+      return value
+
+    counted_pred_cls = make_predicate(Counted)
+    # the same sub-predicates, as different objects, are shared across the tasks
+    tasks = [(counted_pred_cls(Group(1), 0.5) & counted_pred_cls(Group(2), 1.0)) * 0.5
+             for _ in range(3)]
+    tasks.append(counted_pred_cls(Group(1), 0.5) | counted_pred_cls(Group(3), 0.2))
+    graph = PredicateGraph(tasks)
+    # Counted(1), Counted(2), AND, MUL, Counted(3), OR
+    self.assertEqual(len(graph), 6)
+
+    mock_gs = MockGameState()
+    graph.evaluate(tasks, mock_gs)
+    self.assertListEqual(sorted(num_calls), [0.2, 0.5, 1.0])
+    # the tasks get the cached progress
+    self.assertListEqual([task(mock_gs) for task in tasks], [0.25, 0.25, 0.25, 0.5])
+    self.assertEqual(len(num_calls), 3)
+
+    # only the predicates of the given tasks are evaluated
+    num_calls.clear()
+    graph.evaluate(tasks[:1], MockGameState())
+    self.assertListEqual(sorted(num_calls), [0.5, 1.0])
+
+  def test_skip_completed_tasks(self):
+    # pylint: disable=no-value-for-parameter
+    num_calls = []
+    def Completed(gs, subject: Group):
+      num_calls.append(subject.agents)
+      return 1.0
+
+    config = ScriptedAgentTestConfig()
+    config.PLAYERS = [Sleeper]
+    config.IMMORTAL = True
+    config.ALLOW_MULTI_TASKS_PER_AGENT = True
+    env = Env(config)
+    completed_pred_cls = make_predicate(Completed)
+    env.reset(make_task_fn=lambda: [Task(completed_pred_cls(Group(agent_id)), agent_id)
+                                    for agent_id in env.possible_agents] +
+                                   [OngoingTask(completed_pred_cls(Group(1)), 1)])
+    for _ in range(5):
+      env.step({})
+
+    # the tasks are completed in the first step, then only the ongoing task evaluates
+    self.assertEqual(len(num_calls), len(env.possible_agents) + 4)
+    self.assertTrue(all(task.completed for task in env.tasks))
+
   def test_team_assignment(self):
     team =  Group([1, 2, 8, 9], "TeamFoo")
 
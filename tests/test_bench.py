@@ -0,0 +1,37 @@
+import unittest
+
+from nmmo import bench
+
+MAPS_DIR = 'maps/bench_test'
+
+class TestBench(unittest.TestCase):
+  def test_run_case(self):
+    case = {'map': 'small', 'players': 4, 'systems': 'all', 'action_targets': True,
+            'tasks': 2, 'steps': 4, 'resets': 1, 'seed': 0}
+    result = bench.run_case(case, MAPS_DIR)
+    self.assertEqual(result['name'], 'small_all_p4_at1_t2')
+    self.assertGreater(result['steps_per_sec'], 0)
+    self.assertGreater(result['reset_ms'], 0)
+    self.assertGreater(result['peak_rss_mb'], 0)
+    for phase in ['step', 'observations', 'action_targets', 'tasks']:
+      self.assertIn(phase, result['phases'])
+
+  def test_compare(self):
+    baseline = {'cases': [
+      {'name': 'a', 'steps_per_sec': 100, 'reset_ms': 10, 'peak_rss_mb': 100},
+      {'name': 'b', 'steps_per_sec': 100, 'reset_ms': 10, 'peak_rss_mb': 100},
+    ]}
+    results = {'cases': [
+      {'name': 'a', 'steps_per_sec': 95, 'reset_ms': 9, 'peak_rss_mb': 100},
+      {'name': 'b', 'steps_per_sec': 80, 'reset_ms': 10, 'peak_rss_mb': 120},
+      {'name': 'c', 'steps_per_sec': 1, 'reset_ms': 1000, 'peak_rss_mb': 1000},
+    ]}
+    diffs = bench.compare(results, baseline, tolerance=0.1)
+
+    # case c is not in the baseline
+    self.assertEqual(len(diffs), 6)
+    regressed = {(d['name'], d['metric']) for d in diffs if d['regressed']}
+    self.assertEqual(regressed, {('b', 'steps_per_sec'), ('b', 'peak_rss_mb')})
+
+if __name__ == '__main__':
+  unittest.main()
@@ -1,8 +1,10 @@
 import unittest
 
+import numpy as np
+
 import nmmo
 from nmmo.datastore.numpy_datastore import NumpyDatastore
-from nmmo.lib.event_log import EventState, EventLogger
+from nmmo.lib.event_log import EventState, EventLogger, EventAttr
 from nmmo.lib.log import EventCode
 from nmmo.entity.entity import Entity
 from nmmo.systems.item import ItemState
@@ -116,6 +118,46 @@ class TestEventLog(unittest.TestCase):
     empty_log = event_log.get_data(tick = 10)
     self.assertTrue(empty_log.shape[0] == 0)
 
+  def test_event_totals(self):
+    mock_realm = MockRealm()
+    event_log = EventLogger(mock_realm)
+    totals = event_log.totals
+
+    event_log.record(EventCode.EAT_FOOD, MockEntity(1))
+    event_log.record(EventCode.EAT_FOOD, MockEntity(1))
+    event_log.record(EventCode.EAT_FOOD, MockEntity(2))
+    event_log.record(EventCode.HARVEST_ITEM, MockEntity(1), item=Whetstone(mock_realm, 3))
+    event_log.record(EventCode.HARVEST_ITEM, MockEntity(1), item=Whetstone(mock_realm, 5))
+    event_log.record(EventCode.HARVEST_ITEM, MockEntity(2), item=Ration(mock_realm, 5))
+    event_log.record(EventCode.EARN_GOLD, MockEntity(2), amount=15)
+    event_log.record(EventCode.EARN_GOLD, MockEntity(2), amount=10**6) # saturates
+    state = event_log.save_state()
+
+    # [count, sum of number, sum of gold]
+    self.assertListEqual(totals.get([1], EventCode.EAT_FOOD), [2, 0, 0])
+    self.assertListEqual(totals.get([1, 2], EventCode.EAT_FOOD), [3, 0, 0])
+    self.assertListEqual(totals.get([3], EventCode.EAT_FOOD), [0, 0, 0])
+    self.assertListEqual(totals.get([1, 2], EventCode.HARVEST_ITEM), [3, 3, 0])
+    self.assertListEqual(totals.get([1, 2], EventCode.HARVEST_ITEM,
+                                    type_id=Whetstone.ITEM_TYPE_ID, min_level=4), [1, 1, 0])
+    # the same as the recorded events
+    gold = event_log.get_data(EventCode.EARN_GOLD, agents=[2])[:, EventAttr['gold']].sum()
+    self.assertListEqual(totals.get([2], EventCode.EARN_GOLD), [2, 0, gold])
+    # the counts of many agents at once
+    np.testing.assert_array_equal(totals.counts(np.array([1, 2, 3, 1000]), EventCode.EAT_FOOD),
+                                  [2, 1, 0, 0])
+    np.testing.assert_array_equal(totals.counts(np.array([1, 2]), EventCode.GO_FARTHEST), [0, 0])
+
+    # the totals are restored with the state
+    event_log.record(EventCode.EAT_FOOD, MockEntity(1))
+    self.assertListEqual(event_log.totals.get([1], EventCode.EAT_FOOD), [3, 0, 0])
+    event_log.load_state(state)
+    self.assertListEqual(event_log.totals.get([1], EventCode.EAT_FOOD), [2, 0, 0])
+    np.testing.assert_array_equal(event_log.totals.counts([1], EventCode.EAT_FOOD), [2])
+
+    event_log.reset()
+    self.assertListEqual(event_log.totals.get([1], EventCode.EAT_FOOD), [0, 0, 0])
+
 if __name__ == '__main__':
   unittest.main()
 